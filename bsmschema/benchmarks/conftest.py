@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from bsmschema.models import BIDSStatsModel
+
+from .synthetic import SIZES, generate_model
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.fixture(scope='session', params=list(SIZES))
+def document(request):
+    return generate_model(**SIZES[request.param])
+
+
+@pytest.fixture(scope='session')
+def raw(document):
+    return json.dumps(document).encode()
+
+
+@pytest.fixture(scope='session')
+def model(document):
+    return BIDSStatsModel.model_validate(document)
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    # Keep saved results (including the baseline) small by dropping per-round timings
+    for bench in output_json['benchmarks']:
+        bench['stats'].pop('data', None)
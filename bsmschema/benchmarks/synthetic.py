@@ -0,0 +1,152 @@
+"""Seeded generator of synthetic BIDS Stats Models documents for benchmarking.
+
+>>> from bsmschema.models import BIDSStatsModel
+>>> doc = generate_model(nodes=3, contrasts=2, seed=1)
+>>> [node['Level'] for node in doc['Nodes']]
+['Run', 'Session', 'Dataset']
+>>> BIDSStatsModel.model_validate(doc).Name
+'synthetic'
+"""
+
+import random
+from typing import Any
+
+__all__ = ['SIZES', 'generate_model']
+
+LEVELS = ['Run', 'Session', 'Subject', 'Dataset']
+
+SIZES: dict[str, dict[str, int]] = {
+    'small': {'nodes': 4, 'contrasts': 4, 'weights': 4, 'filter_size': 2, 'payload_size': 4},
+    'medium': {'nodes': 32, 'contrasts': 16, 'weights': 8, 'filter_size': 8, 'payload_size': 32},
+    'large': {
+        'nodes': 256,
+        'contrasts': 64,
+        'weights': 16,
+        'filter_size': 32,
+        'payload_size': 256,
+    },
+}
+"""Named combinations of :py:func:`generate_model` arguments used by the benchmarks."""
+
+
+def _weight(rng: random.Random) -> Any:
+    kind = rng.randrange(3)
+    if kind == 0:
+        return rng.choice([-1, 1, 2])
+    if kind == 1:
+        return round(rng.uniform(-1, 1), 3)
+    return f'{rng.choice([-1, 1])}/{rng.randrange(2, 9)}'
+
+
+def _node(
+    rng: random.Random,
+    index: int,
+    level: str,
+    contrasts: int,
+    weights: int,
+    payload_size: int,
+) -> dict[str, Any]:
+    conditions = [f'trial_type.cond{k:03d}' for k in range(max(weights, 1))]
+    node_contrasts = []
+    for j in range(contrasts):
+        width = rng.randint(1, len(conditions))
+        condition_list = rng.sample(conditions, width)
+        if j % 4 == 3:
+            rows = rng.randint(1, width)
+            node_contrasts.append(
+                {
+                    'Name': f'f{j:03d}',
+                    'ConditionList': condition_list,
+                    'Weights': [[_weight(rng) for _ in range(width)] for _ in range(rows)],
+                    'Test': 'F',
+                }
+            )
+        else:
+            node_contrasts.append(
+                {
+                    'Name': f'c{j:03d}',
+                    'ConditionList': condition_list,
+                    'Weights': [_weight(rng) for _ in range(width)],
+                    'Test': 't',
+                }
+            )
+    return {
+        'Level': level,
+        'Name': f'node{index:04d}',
+        'GroupBy': ['run', 'subject'] if level == 'Run' else ['subject', 'contrast'],
+        'Transformations': {
+            'Transformer': 'pybids-transforms-v1',
+            'Instructions': [
+                {'Name': 'Scale', 'Input': [rng.choice(conditions)], 'Demean': bool(k % 2)}
+                for k in range(payload_size)
+            ],
+        },
+        'Model': {
+            'Type': 'glm' if level == 'Run' else 'meta',
+            'X': [1, *conditions],
+            'HRF': {'Variables': conditions, 'Model': 'spm'},
+            'Options': {'HighPassFilterCutoffHz': 0.008, 'Mask': {'desc': ['brain']}},
+            'Software': {
+                'FSL': {f'param{k:03d}': rng.random() for k in range(payload_size)},
+            },
+        },
+        'Contrasts': node_contrasts,
+        'DummyContrasts': {'Contrasts': conditions[: max(1, weights // 2)], 'Test': 't'},
+    }
+
+
+def generate_model(
+    nodes: int = 4,
+    contrasts: int = 4,
+    weights: int = 4,
+    filter_size: int = 2,
+    payload_size: int = 4,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """Generate a valid BIDS Stats Model document.
+
+    Parameters
+    ----------
+    nodes
+        Number of nodes. The first node is at the Run level and the last at the
+        Dataset level; edges chain consecutive nodes, with additional forward edges.
+    contrasts
+        Number of contrasts per node. Every fourth contrast is an F contrast.
+    weights
+        Number of conditions in ``Model.X`` besides the intercept, which bounds the
+        width of weight matrices.
+    filter_size
+        Number of contrast names in each edge filter.
+    payload_size
+        Number of transformation instructions and software parameters per node.
+    seed
+        Seed of the random number generator; equal arguments produce equal documents.
+    """
+    rng = random.Random(seed)
+    levels = ['Run'] + sorted(rng.choices(LEVELS[1:3], k=max(nodes - 2, 0)), key=LEVELS.index)
+    levels = (levels + ['Dataset'])[:nodes]
+    node_list = [
+        _node(rng, i, level, contrasts, weights, payload_size) for i, level in enumerate(levels)
+    ]
+
+    edges = []
+    for i in range(1, nodes):
+        sources = {i - 1} | ({rng.randrange(i)} if i > 1 else set())
+        for src in sorted(sources):
+            names = [c['Name'] for c in node_list[src]['Contrasts'] if c['Test'] == 't']
+            edges.append(
+                {
+                    'Source': node_list[src]['Name'],
+                    'Destination': node_list[i]['Name'],
+                    'Filter': {'contrast': names[:filter_size]} if names else None,
+                }
+            )
+
+    return {
+        'Name': 'synthetic',
+        'BIDSModelVersion': '1.0.0',
+        'Description': f'Synthetic model (seed {seed})',
+        'Input': {'subject': [f'{s:03d}' for s in range(filter_size)], 'task': ['synthetic']},
+        'Nodes': node_list,
+        'Edges': edges,
+    }
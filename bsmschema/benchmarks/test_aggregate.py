@@ -0,0 +1,18 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.aggregate import aggregate
+
+
+@pytest.fixture(scope='module')
+def images():
+    """400 labels over a 40x25x20 image of 200 time points."""
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 401, (40, 25, 20))
+    return labels, rng.standard_normal((40, 25, 20, 200))
+
+
+@pytest.mark.parametrize('method', ['mean', 'pca', 'none'])
+def test_aggregate(benchmark, images, method):
+    benchmark(aggregate, *images, method)
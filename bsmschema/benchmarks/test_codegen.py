@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+from bsmschema.codegen import compile_validator
+from bsmschema.models import BIDSStatsModel
+
+
+@pytest.fixture(scope='session')
+def validator():
+    return compile_validator(BIDSStatsModel.model_json_schema())
+
+
+def test_generated_validate_python(benchmark, validator, document):
+    assert benchmark(validator.is_valid, document)
+
+
+def test_generated_validate_json(benchmark, validator, raw):
+    assert benchmark(lambda: validator.is_valid(json.loads(raw)))
+
+
+def test_generate_validator(benchmark):
+    benchmark(compile_validator, BIDSStatsModel.model_json_schema())
@@ -0,0 +1,60 @@
+import pytest
+
+from bsmschema.models import Node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.design import Run, _kernel, _kernel_spectrum, design_matrices
+
+CONDITIONS = [f'cond{k:02d}' for k in range(24)]
+
+
+@pytest.fixture(scope='module')
+def node():
+    return Node.model_validate(
+        {
+            'Level': 'Run',
+            'Name': 'run',
+            'GroupBy': ['run', 'subject'],
+            'Model': {
+                'Type': 'glm',
+                'X': [1, 'cond*', 'rot_*'],
+                'HRF': {'Variables': ['cond*'], 'Model': 'spm + derivative'},
+            },
+        }
+    )
+
+
+@pytest.fixture(scope='module')
+def runs():
+    """Four runs of 300 scans, with 24 conditions and 6 motion regressors."""
+    rng = np.random.default_rng(0)
+    runs = []
+    for _ in range(4):
+        onsets = rng.uniform(0, 580, size=(len(CONDITIONS), 10))
+        runs.append(
+            Run(
+                n_scans=300,
+                tr=2.0,
+                events={
+                    name: np.column_stack([np.sort(row), np.full(10, 3.0), np.ones(10)])
+                    for name, row in zip(CONDITIONS, onsets)
+                },
+                regressors={f'rot_{k}': rng.standard_normal(300) for k in range(6)},
+            )
+        )
+    return runs
+
+
+def test_design_matrices(benchmark, node, runs):
+    designs = benchmark(design_matrices, node, runs)
+    assert designs[0].matrix.shape == (300, 1 + 2 * len(CONDITIONS) + 6)
+
+
+def test_design_matrices_uncached(benchmark, node, runs):
+    def build():
+        _kernel.cache_clear()
+        _kernel_spectrum.cache_clear()
+        return design_matrices(node, runs)
+
+    benchmark(build)
@@ -0,0 +1,55 @@
+import pytest
+
+from bsmschema.models import Node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.design import DesignMatrix
+from bsmschema.glm import fit_glm, fit_glm_groups
+
+COLUMNS = (1, *(f'cond{k:02d}' for k in range(29)))
+
+
+@pytest.fixture(scope='module')
+def node():
+    return Node.model_validate(
+        {
+            'Level': 'Run',
+            'Name': 'run',
+            'GroupBy': ['run', 'subject'],
+            'Model': {'Type': 'glm', 'X': list(COLUMNS)},
+            'Contrasts': [
+                {
+                    'Name': 'any',
+                    'ConditionList': list(COLUMNS[1:5]),
+                    'Weights': np.eye(4).tolist(),
+                    'Test': 'F',
+                }
+            ],
+            'DummyContrasts': {'Test': 't'},
+        }
+    )
+
+
+@pytest.fixture(scope='module')
+def design():
+    rng = np.random.default_rng(0)
+    return DesignMatrix(COLUMNS, np.column_stack([np.ones(300), rng.standard_normal((300, 29))]))
+
+
+@pytest.fixture(scope='module')
+def data():
+    """300 scans of 20000 voxels."""
+    return np.random.default_rng(1).standard_normal((300, 20000))
+
+
+def test_fit_glm(benchmark, node, design, data):
+    result = benchmark(fit_glm, node, design, data)
+    assert result.betas.shape == (30, 20000)
+
+
+def test_fit_glm_groups(benchmark, node, design, data):
+    """Eight groups sharing one design."""
+    groups = [np.ascontiguousarray(data[:, k::8]) for k in range(8)]
+    results = benchmark(fit_glm_groups, node, [design] * 8, groups)
+    assert len(results) == 8
@@ -0,0 +1,62 @@
+import pytest
+
+from bsmschema.graph import ModelGraph
+from bsmschema.semantics import check_model
+from bsmschema.wildcards import expand_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.contrasts import _compile, compile_contrasts
+from bsmschema.filters import IndexedTable, select
+from bsmschema.groupby import partition
+
+
+def test_graph(benchmark, model):
+    graph = benchmark(ModelGraph, model)
+    assert graph.is_acyclic
+
+
+def test_check_model(benchmark, model):
+    assert benchmark(check_model, model) == []
+
+
+def test_compile_contrasts(benchmark, model):
+    def compile_all():
+        _compile.cache_clear()
+        for node in model.Nodes:
+            compile_contrasts(node)
+
+    benchmark(compile_all)
+
+
+def test_expand_node(benchmark, model):
+    columns = [f'trial_type.cond{k:03d}' for k in range(256)] + ['rot_x', 'rot_y']
+
+    def expand_all():
+        for node in model.Nodes:
+            expand_node(node, columns)
+
+    benchmark(expand_all)
+
+
+@pytest.fixture(scope='module')
+def table():
+    rng = np.random.default_rng(0)
+    rows = 200_000
+    return {
+        'subject': rng.integers(0, 2000, rows).astype(str),
+        'run': rng.integers(1, 5, rows),
+        'contrast': rng.choice([f'c{j:03d}' for j in range(50)], rows),
+    }
+
+
+def test_filter(benchmark, table):
+    filter = {'contrast': ['c001', 'c002'], 'run': [1, 2]}
+    benchmark(lambda: select(IndexedTable(table), filter))
+
+
+def test_partition(benchmark, table):
+    indexed = IndexedTable(table)
+    indexed.index('subject')
+    indexed.index('contrast')
+    benchmark(partition, indexed, ['subject', 'contrast'])
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    'statement',
+    [
+        'import bsmschema',
+        'import bsmschema.models',
+        'from bsmschema.models import BIDSStatsModel; '
+        "BIDSStatsModel.model_validate({'Name': 'x', 'BIDSModelVersion': '1.0.0', 'Nodes': []})",
+    ],
+    ids=['package', 'models', 'first-validation'],
+)
+def test_import(benchmark, statement):
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, '-c', statement],),
+        kwargs={'check': True},
+        rounds=10,
+    )
@@ -0,0 +1,44 @@
+import pytest
+
+from bsmschema.models import Node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.meta import MetaEstimator
+
+
+@pytest.fixture(scope='module')
+def node():
+    return Node.model_validate(
+        {
+            'Level': 'Dataset',
+            'Name': 'group',
+            'GroupBy': ['contrast'],
+            'Model': {'Type': 'meta', 'X': [1, 'age']},
+            'DummyContrasts': {'Test': 't'},
+        }
+    )
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    """Effect and variance maps of 20 inputs with 50000 voxels."""
+    rng = np.random.default_rng(0)
+    return (
+        rng.standard_normal((20, 50000)),
+        rng.uniform(0.5, 2, (20, 50000)),
+        rng.uniform(20, 40, 20),
+    )
+
+
+@pytest.mark.parametrize('method', ['fixed', 'mixed'])
+def test_meta_streaming(benchmark, node, inputs, method):
+    effects, variances, age = inputs
+
+    def estimate():
+        estimator = MetaEstimator(node, method=method)
+        for effect, variance, value in zip(effects, variances, age):
+            estimator.add(effect, variance, {'age': value})
+        return estimator.result()
+
+    assert benchmark(estimate).count == 20
@@ -0,0 +1,25 @@
+from bsmschema.models import BIDSStatsModel, Node
+
+
+def test_validate_json(benchmark, raw):
+    benchmark(BIDSStatsModel.model_validate_json, raw)
+
+
+def test_validate_python(benchmark, document):
+    benchmark(BIDSStatsModel.model_validate, document)
+
+
+def test_dump_json(benchmark, model):
+    benchmark(model.model_dump_json)
+
+
+def test_dump_python(benchmark, model):
+    benchmark(model.model_dump)
+
+
+def test_json_schema(benchmark):
+    benchmark(BIDSStatsModel.model_json_schema)
+
+
+def test_node_json_schema(benchmark):
+    benchmark(Node.model_json_schema)
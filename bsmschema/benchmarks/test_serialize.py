@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from bsmschema.models import BIDSStatsModel
+from bsmschema.serialize import ModelWriter, dumps, dumps_json, loads, read_models
+
+
+@pytest.fixture(scope='session')
+def binary(model):
+    return dumps(model)
+
+
+@pytest.fixture(scope='session')
+def pretty(model):
+    return model.model_dump_json(indent=2).encode()
+
+
+def test_dump_pretty_json(benchmark, model):
+    benchmark(model.model_dump_json, indent=2)
+
+
+def test_dump_canonical_json(benchmark, model):
+    benchmark(dumps_json, model)
+
+
+def test_dump_binary(benchmark, model):
+    benchmark(dumps, model)
+
+
+def test_load_pretty_json(benchmark, pretty):
+    benchmark(BIDSStatsModel.model_validate_json, pretty)
+
+
+def test_load_binary(benchmark, binary):
+    benchmark(loads, binary)
+
+
+def test_read_stream(benchmark, model):
+    stream = io.BytesIO()
+    ModelWriter(stream).write_all([model] * 3)
+
+    def read():
+        stream.seek(0)
+        return sum(1 for _ in read_models(stream))
+
+    assert benchmark(read) == 3
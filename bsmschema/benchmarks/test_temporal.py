@@ -0,0 +1,27 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.temporal import _basis, filter_basis
+
+
+def test_filter_basis(benchmark):
+    """1000 runs of the same acquisition."""
+    assert benchmark(lambda: [filter_basis(300, 2.0, 1 / 128) for _ in range(1000)])
+
+
+def test_filter_basis_uncached(benchmark):
+    def build():
+        _basis.cache_clear()
+        return filter_basis(300, 2.0, 1 / 128, 0.1)
+
+    benchmark(build)
+
+
+@pytest.mark.parametrize('low_pass', [None, 0.1])
+def test_apply(benchmark, low_pass):
+    """300 scans of 20000 voxels."""
+    data = np.random.default_rng(0).standard_normal((300, 20000))
+    basis = filter_basis(300, 2.0, 1 / 128, low_pass)
+    out = np.empty_like(data)
+    benchmark(basis.apply, data, out=out)
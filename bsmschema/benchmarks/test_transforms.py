@@ -0,0 +1,74 @@
+import json
+import random
+
+import pytest
+
+from bsmschema.lazy import validate_json
+from bsmschema.models import Node
+from bsmschema.transforms import compile_transformations, parse_instructions
+
+COLUMNS = (
+    ['trial_type', 'response_time']
+    + [f'confound_{k:03d}' for k in range(400)]
+    + [f'motion_{k:02d}' for k in range(24)]
+)
+
+
+def _instructions(n):
+    """A long list of instructions, most of whose outputs are unused."""
+    rng = random.Random(0)
+    instructions = [
+        {'Name': 'Factor', 'Input': ['trial_type']},
+        {'Name': 'Convolve', 'Input': ['trial_type.*', 'response_time'], 'Model': 'spm'},
+    ]
+    for k in range(n):
+        column = rng.choice(COLUMNS[2:])
+        kind = rng.randrange(4)
+        if kind == 0:
+            instructions.append({'Name': 'Scale', 'Input': [column]})
+        elif kind == 1:
+            instructions.append(
+                {'Name': 'Threshold', 'Input': [column], 'Threshold': 0.5, 'Output': [f'out_{k}']}
+            )
+        elif kind == 2:
+            other = rng.choice(COLUMNS[2:])
+            instructions.append({'Name': 'Sum', 'Input': [column, other], 'Output': [f'sum_{k}']})
+        else:
+            instructions.append({'Name': 'Demean', 'Input': ['motion_*']})
+    return instructions
+
+
+@pytest.fixture(scope='module', params=[200, 2000])
+def node(request):
+    return Node.model_validate(
+        {
+            'Level': 'Run',
+            'Name': 'run',
+            'GroupBy': ['run', 'subject'],
+            'Transformations': {
+                'Transformer': 'pybids-transforms-v1',
+                'Instructions': _instructions(request.param),
+            },
+            'Model': {
+                'Type': 'glm',
+                'X': [1, 'trial_type.*', 'response_time', 'motion_*', 'confound_00?'],
+            },
+        }
+    )
+
+
+def test_parse_instructions(benchmark, node):
+    raw = json.dumps({'Instructions': node.Transformations.Instructions}).encode()
+    model = validate_json(
+        b'{"Name": "bench", "BIDSModelVersion": "1.0.0", "Nodes": [{"Level": "Run", '
+        b'"Name": "run", "GroupBy": [], "Model": {"Type": "glm", "X": [1]}, '
+        b'"Transformations": {"Transformer": "pybids-transforms-v1", ' + raw[1:-1] + b'}}]}'
+    )
+    instructions = model.Nodes[0].Transformations.Instructions
+    assert benchmark(parse_instructions, instructions)
+
+
+def test_compile_transformations(benchmark, node):
+    compiled = benchmark(compile_transformations, node, COLUMNS)
+    assert compiled.pruned
+    assert not compiled.errors
@@ -1,3 +1,22 @@
-from . import models
+"""A Pydantic schema for BIDS Stats Models.
+
+Submodules are imported on first access, so that ``import bsmschema`` does not
+import pydantic or define the schema models until they are needed.
+"""
+
+import importlib
+from types import ModuleType
 
 __all__ = ['models']
+
+
+def __getattr__(name: str) -> ModuleType:
+    if name in __all__:
+        module = importlib.import_module(f'.{name}', __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
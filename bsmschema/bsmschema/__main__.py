@@ -1,18 +1,221 @@
+import argparse
 import json
+import os
 import sys
+import time
+from collections.abc import Sequence
 from pathlib import Path
-from bsmschema import models
+from typing import Optional, TextIO, Union
 
-if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print('Usage: python -m bsmschema /path/to/schemadir')
-        sys.exit(1)
-
-    schemadir = Path(sys.argv[1])
-    schemadir.mkdir(parents=True, exist_ok=True)
-    for mname in models.__all__:
-        model = getattr(models, mname)
-        Path.write_text(
-            schemadir / f'{mname}.json',
-            json.dumps(model.model_json_schema(), indent=2),
+COMMANDS = ('schema', 'validate', 'serve', 'client')
+
+
+def run_schema(opts: argparse.Namespace) -> int:
+    from bsmschema.export import export_schemas
+
+    result = export_schemas(opts.schemadir, bundle=opts.bundle, check=opts.check)
+    if opts.check:
+        for name in result.changed:
+            print(f'Out of date: {opts.schemadir / name}', file=sys.stderr)
+        for name in result.removed:
+            print(f'No longer generated: {opts.schemadir / name}', file=sys.stderr)
+        return 0 if result.current else 1
+    print(
+        f'{len(result.changed)} files written, {len(result.unchanged)} unchanged, '
+        f'{len(result.removed)} removed',
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_validate(opts: argparse.Namespace, out: TextIO) -> int:
+    from bsmschema.batch import validate_paths
+
+    start = time.perf_counter()
+    total = invalid = cached = 0
+    unmatched: list[Union[str, os.PathLike[str]]] = []
+    for result in validate_paths(
+        opts.paths,
+        workers=opts.jobs,
+        chunksize=opts.chunksize,
+        ordered=opts.ordered,
+        pattern=opts.pattern,
+        cache=opts.cache,
+        cache_max_entries=opts.cache_max_entries,
+        cache_max_age=None if opts.cache_max_age is None else opts.cache_max_age * 86400,
+        unmatched=unmatched,
+    ):
+        total += 1
+        invalid += not result.ok
+        cached += result.cached
+        if not (opts.quiet and result.ok):
+            out.write(result.model_dump_json() + '\n')
+    elapsed = time.perf_counter() - start
+    summary = f'{total} files, {total - invalid} valid, {invalid} invalid'
+    if opts.cache is not None:
+        summary += f', {cached} cached'
+    print(f'{summary} ({elapsed:.2f}s)', file=sys.stderr)
+    for target in unmatched:
+        print(f'No files match: {target}', file=sys.stderr)
+    return 1 if invalid or unmatched else 0
+
+
+def run_client(opts: argparse.Namespace, out: TextIO) -> int:
+    from bsmschema.client import request
+    from bsmschema.paths import iter_model_paths
+
+    requests: list[dict[str, object]] = []
+    if '-' in opts.paths:
+        requests.append({'text': sys.stdin.read()})
+    unmatched: list[Union[str, os.PathLike[str]]] = []
+    files = iter_model_paths([path for path in opts.paths if path != '-'], opts.pattern, unmatched)
+    requests.extend({'path': str(path.absolute())} for path in files)
+    for target in unmatched:
+        print(f'No files match: {target}', file=sys.stderr)
+    if opts.semantic:
+        for req in requests:
+            req['semantic'] = True
+
+    try:
+        results = request(requests, opts.socket, opts.host, opts.port, opts.timeout)
+    except OSError as e:
+        print(f'Could not reach validation server: {e}', file=sys.stderr)
+        return 2
+
+    invalid = 0
+    for result in results:
+        invalid += not result['ok']
+        if not (opts.quiet and result['ok']):
+            out.write(json.dumps(result) + '\n')
+    return 1 if invalid or unmatched else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    from bsmschema.cache import default_cache_path
+    from bsmschema.paths import DEFAULT_PATTERN
+
+    parser = argparse.ArgumentParser(prog='python -m bsmschema')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    schema = subparsers.add_parser(
+        'schema', help='Write JSON schemas and a standalone validator to a directory'
+    )
+    schema.add_argument('schemadir', type=Path)
+    schema.add_argument(
+        '--bundle',
+        action='store_true',
+        default=None,
+        help='Also write all schemas as one, with shared definitions, in bundle.json '
+        'and bundle.min.json (default: if the last export wrote them)',
+    )
+    schema.add_argument(
+        '--no-bundle',
+        action='store_false',
+        dest='bundle',
+        help='Remove bundle.json and bundle.min.json, if the last export wrote them',
+    )
+    schema.add_argument(
+        '--check',
+        action='store_true',
+        help='Write nothing, and exit with an error if any files are out of date',
+    )
+
+    validate = subparsers.add_parser(
+        'validate',
+        help='Validate BIDS Stats Models files, writing one JSON result per line',
+    )
+    validate.add_argument('paths', nargs='+', help='Files, directories or glob patterns')
+    validate.add_argument(
+        '-j', '--jobs', type=int, default=None, help='Number of worker processes (default: #CPUs)'
+    )
+    validate.add_argument(
+        '--chunksize', type=int, default=16, help='Files dispatched to a worker at a time'
+    )
+    validate.add_argument(
+        '--pattern', default=DEFAULT_PATTERN, help='Filename pattern for directory searches'
+    )
+    validate.add_argument('--ordered', action='store_true', help='Report results in input order')
+    validate.add_argument(
+        '-o', '--output', type=Path, default=None, help='Write results to file (default: stdout)'
+    )
+    validate.add_argument('-q', '--quiet', action='store_true', help='Only report invalid files')
+    validate.add_argument(
+        '--cache',
+        type=Path,
+        nargs='?',
+        const=default_cache_path(),
+        default=None,
+        help='Reuse results for unchanged files from a cache database '
+        '(default location: %(const)s)',
+    )
+    validate.add_argument(
+        '--cache-max-entries', type=int, default=None, help='Number of cached results to keep'
+    )
+    validate.add_argument(
+        '--cache-max-age',
+        type=float,
+        default=None,
+        help='Evict cached results unused for this many days',
+    )
+
+    serve = subparsers.add_parser(
+        'serve', help='Run a validation server on a Unix socket or localhost port'
+    )
+    client = subparsers.add_parser(
+        'client', help='Validate files with a running server, writing one JSON result per line'
+    )
+    for subparser in (serve, client):
+        subparser.add_argument(
+            '--socket', type=Path, default=None, help='Unix socket path (default: per-user)'
+        )
+        subparser.add_argument('--host', default='127.0.0.1', help='Host, if --port is given')
+        subparser.add_argument('--port', type=int, default=None, help='Use TCP on this port')
+        subparser.add_argument(
+            '--semantic', action='store_true', help='Also check cross-field rules'
         )
+    serve.add_argument(
+        '-j', '--jobs', type=int, default=None, help='Number of worker processes (default: #CPUs)'
+    )
+    client.add_argument(
+        'paths', nargs='+', help='Files, directories or glob patterns, or - to read stdin'
+    )
+    client.add_argument(
+        '--pattern', default=DEFAULT_PATTERN, help='Filename pattern for directory searches'
+    )
+    client.add_argument('--timeout', type=float, default=None, help='Timeout in seconds')
+    client.add_argument('-q', '--quiet', action='store_true', help='Only report invalid files')
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    # Backwards compatibility: python -m bsmschema /path/to/schemadir
+    if len(args) == 1 and args[0] not in COMMANDS and not args[0].startswith('-'):
+        args.insert(0, 'schema')
+
+    opts = get_parser().parse_args(args)
+
+    if opts.command == 'schema':
+        return run_schema(opts)
+
+    if opts.command == 'serve':
+        from bsmschema.server import ValidationServer
+
+        try:
+            ValidationServer(opts.jobs, opts.semantic).run(opts.socket, opts.host, opts.port)
+        except FileExistsError as e:
+            print(f'Could not start validation server: {e}', file=sys.stderr)
+            return 2
+        return 0
+
+    if opts.command == 'client':
+        return run_client(opts, sys.stdout)
+
+    if opts.output is None:
+        return run_validate(opts, sys.stdout)
+    with opts.output.open('w') as out:
+        return run_validate(opts, out)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Aggregation of time series within the labels of a mask, for :py:attr:`Options.Aggregate
+<bsmschema.models.Options.Aggregate>`.
+
+:py:func:`aggregate` combines the voxels of a time series image within each non-zero
+value of a label image, such as an atlas given by :py:attr:`Options.Mask
+<bsmschema.models.Options.Mask>`:
+
+* ``"mean"`` averages the voxels of each label, with a single weighted ``bincount``
+  over chunks of the flattened data.
+* ``"pca"`` returns the first principal component of the voxels of each label,
+  computed exactly for small labels and by a randomized SVD for large labels, with
+  labels processed on a pool of threads.
+* ``"none"`` returns the time series of each labelled voxel that has at least one
+  non-zero value, as views of the data.
+
+Images are arrays, possibly memory-mapped, with time along the last dimension of the
+data, as in NIfTI files; the label image has the shape of the other dimensions.
+Voxels are flattened in the memory order of the data, so that Fortran-ordered arrays,
+such as the memory maps of NIfTI files, are not copied.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> labels = np.array([[1, 1], [2, 0]])
+>>> data = np.arange(16.0).reshape(2, 2, 4)
+>>> result = aggregate(labels, data, 'mean')
+>>> result.labels
+array([1, 2])
+>>> result.values
+array([[ 2.,  8.],
+       [ 3.,  9.],
+       [ 4., 10.],
+       [ 5., 11.]])
+>>> voxels = aggregate(labels, data, 'none')
+>>> voxels.labels
+array([1, 1, 2])
+>>> np.shares_memory(voxels[2], data)
+True
+"""
+
+import os
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import numpy as np
+
+from .glm import CHUNK_BYTES, _memory_order
+
+__all__ = [
+    'LabelTimeseries',
+    'VoxelTimeseries',
+    'aggregate',
+]
+
+# Labels with fewer voxels or time points than this are decomposed exactly
+_EXACT_SIZE = 64
+_OVERSAMPLES = 10
+_POWER_ITERATIONS = 7
+
+
+@dataclass(frozen=True, eq=False)
+class LabelTimeseries:
+    """One time series per label."""
+
+    labels: np.ndarray
+    """Label values, in ascending order."""
+    values: np.ndarray
+    """Time series with shape ``(time points, labels)``."""
+
+
+@dataclass(frozen=True, eq=False)
+class VoxelTimeseries:
+    """The time series of individual voxels, as views of the data.
+
+    Indexing and iteration yield the time series of single voxels without copying.
+    """
+
+    labels: np.ndarray
+    """Label of each voxel."""
+    voxels: np.ndarray
+    """Positions of the voxels in the label image, flattened in the memory order of the
+    data."""
+    data: np.ndarray
+    """The data, with shape ``(voxels, time points)``; a view where possible."""
+
+    def __len__(self) -> int:
+        return len(self.voxels)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        row: np.ndarray = self.data[self.voxels[index]]
+        return row
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for voxel in self.voxels:
+            yield self.data[voxel]
+
+    @property
+    def values(self) -> np.ndarray:
+        """A copy of the time series, with shape ``(time points, voxels)``."""
+        values: np.ndarray = self.data[self.voxels].T
+        return values
+
+
+def _flatten(labels: np.ndarray, data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if data.shape[:-1] != labels.shape:
+        raise ValueError(f'Labels of shape {labels.shape} do not match data of shape {data.shape}')
+    # Time is the slowest axis of Fortran-ordered data, so its voxels flatten to a view
+    order = _memory_order(data)
+    return labels.reshape(-1, order=order), data.reshape(-1, data.shape[-1], order=order)
+
+
+def _chunks(n_voxels: int, n_times: int, chunk_size: Optional[int]) -> Iterator[slice]:
+    size = chunk_size or max(1, CHUNK_BYTES // (8 * max(n_times, 1)))
+    for start in range(0, n_voxels, size):
+        yield slice(start, start + size)
+
+
+def _means(
+    flat_labels: np.ndarray, flat: np.ndarray, chunk_size: Optional[int]
+) -> LabelTimeseries:
+    values, codes = np.unique(flat_labels, return_inverse=True)
+    n_labels, n_times = len(values), flat.shape[1]
+    sums = np.zeros(n_labels * n_times)
+    offsets = np.arange(n_times)
+    for voxels in _chunks(len(flat), n_times, chunk_size):
+        # Index (label, time) pairs, so one bincount sums all labels at all times
+        index = (codes[voxels, None] * n_times + offsets).ravel()
+        chunk = np.asarray(flat[voxels], dtype=float)
+        sums += np.bincount(index, weights=chunk.ravel(), minlength=len(sums))
+    counts = np.bincount(codes, minlength=n_labels)
+    means = sums.reshape(n_labels, n_times) / counts[:, None]
+    keep = values != 0
+    return LabelTimeseries(labels=values[keep], values=means[keep].T)
+
+
+def _first_component(matrix: np.ndarray) -> np.ndarray:
+    """The first principal component of the columns of a ``(time points, voxels)`` matrix."""
+    centered = matrix - matrix.mean(axis=0)
+    n_times, n_voxels = centered.shape
+    # Small labels use the eigendecomposition of the smaller Gram matrix
+    if n_voxels <= _EXACT_SIZE:
+        loadings = np.linalg.eigh(centered.T @ centered)[1][:, -1]
+        component: np.ndarray = centered @ loadings
+    elif n_times <= _EXACT_SIZE:
+        eigenvalues, vectors = np.linalg.eigh(centered @ centered.T)
+        component = vectors[:, -1] * np.sqrt(max(eigenvalues[-1], 0))
+        loadings = centered.T @ vectors[:, -1]
+    else:
+        # Randomized subspace iteration (Halko, Martinsson and Tropp, 2011)
+        rng = np.random.default_rng(0)
+        basis = centered @ rng.standard_normal((centered.shape[1], 1 + _OVERSAMPLES))
+        for _ in range(_POWER_ITERATIONS):
+            basis = np.linalg.qr(basis)[0]
+            basis = np.linalg.qr(centered.T @ basis)[0]
+            basis = centered @ basis
+        basis = np.linalg.qr(basis)[0]
+        u, s, vt = np.linalg.svd(basis.T @ centered, full_matrices=False)
+        component = basis @ u[:, 0] * s[0]
+        loadings = vt[0]
+    # Components are positively correlated with the mean of the voxels
+    if loadings.sum() < 0:
+        component = -component
+    return component
+
+
+def _components(
+    flat_labels: np.ndarray, flat: np.ndarray, max_workers: Optional[int]
+) -> LabelTimeseries:
+    mask = np.flatnonzero(flat_labels)
+    order = mask[np.argsort(flat_labels[mask], kind='stable')]
+    values, starts = np.unique(flat_labels[order], return_index=True)
+    groups = np.split(order, starts[1:]) if len(order) else []
+
+    def component(voxels: np.ndarray) -> np.ndarray:
+        return _first_component(np.asarray(flat[voxels], dtype=float).T)
+
+    if max_workers == 1 or len(groups) <= 1:
+        columns = [component(voxels) for voxels in groups]
+    else:
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as pool:
+            columns = list(pool.map(component, groups))
+    matrix = np.column_stack(columns) if columns else np.zeros((flat.shape[1], 0))
+    return LabelTimeseries(labels=values, values=matrix)
+
+
+def _voxels(
+    flat_labels: np.ndarray, flat: np.ndarray, chunk_size: Optional[int]
+) -> VoxelTimeseries:
+    signal = np.zeros(len(flat), dtype=bool)
+    for chunk in _chunks(len(flat), flat.shape[1], chunk_size):
+        signal[chunk] = (flat[chunk] != 0).any(axis=1)
+    voxels = np.flatnonzero(signal & (flat_labels != 0))
+    return VoxelTimeseries(labels=flat_labels[voxels], voxels=voxels, data=flat)
+
+
+def aggregate(
+    labels: np.ndarray,
+    data: np.ndarray,
+    method: str = 'none',
+    chunk_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> Union[LabelTimeseries, VoxelTimeseries]:
+    """Aggregate the time series of the voxels within each non-zero label.
+
+    Parameters
+    ----------
+    labels
+        Label image, where zero is background.
+    data
+        Time series image, with the dimensions of ``labels`` followed by time.
+    method
+        ``"none"``, ``"mean"`` or ``"pca"``, as in :py:attr:`Options.Aggregate
+        <bsmschema.models.Options.Aggregate>`.
+    chunk_size
+        Number of voxels read at once by ``"mean"`` and ``"none"``. Defaults to the number
+        of voxels whose data fits in :py:data:`bsmschema.glm.CHUNK_BYTES`.
+    max_workers
+        Number of threads used by ``"pca"``. Defaults to the number of CPUs.
+
+    Returns a :py:class:`LabelTimeseries` for ``"mean"`` and ``"pca"``, and a
+    :py:class:`VoxelTimeseries` for ``"none"``.
+    Raises :py:class:`ValueError` if the shapes of the images do not match, or if the
+    method is unknown.
+    """
+    flat_labels, flat = _flatten(np.asarray(labels), data)
+    if method == 'mean':
+        return _means(flat_labels, flat, chunk_size)
+    if method == 'pca':
+        return _components(flat_labels, flat, max_workers)
+    if method == 'none':
+        return _voxels(flat_labels, flat, chunk_size)
+    raise ValueError(f'Unknown aggregation method: {method!r}')
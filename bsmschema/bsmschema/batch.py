@@ -0,0 +1,160 @@
+"""Bulk validation of BIDS Stats Models files.
+
+Large collections of ``*_smdl.json`` files can be validated with a pool of worker
+processes, producing one :py:class:`ValidationResult` per file.
+
+Examples
+--------
+
+>>> from bsmschema.batch import validate_paths
+>>> for result in validate_paths(['specification/examples'], workers=4):  # doctest: +SKIP
+...     print(result.model_dump_json())
+"""
+
+import os
+import time
+from collections.abc import Iterable, Iterator
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from pydantic import BaseModel, ValidationError
+
+from .models import BIDSStatsModel
+from .paths import DEFAULT_PATTERN, iter_model_paths
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .cache import ValidationCache
+
+__all__ = [
+    'ValidationResult',
+    'iter_model_paths',
+    'validate_path',
+    'validate_paths',
+]
+
+PathLike = Union[str, 'os.PathLike[str]']
+
+
+class ValidationResult(BaseModel):
+    """Outcome of validating a single file."""
+
+    path: str
+    """Path of the validated file."""
+    ok: bool
+    """Whether the file is a valid BIDS Stats Model."""
+    errors: list[dict[str, Any]] = []
+    """Errors encountered, each with ``loc``, ``msg`` and ``type`` keys."""
+    elapsed: float = 0.0
+    """Time spent reading and validating the file, in seconds."""
+    cached: bool = False
+    """Whether the result was retrieved from a :py:class:`~bsmschema.cache.ValidationCache`."""
+
+
+def _format_errors(exc: ValidationError) -> list[dict[str, Any]]:
+    return [
+        {'loc': list(err['loc']), 'msg': err['msg'], 'type': err['type']}
+        for err in exc.errors(include_url=False)
+    ]
+
+
+def validate_path(path: PathLike, cache: Optional['ValidationCache'] = None) -> ValidationResult:
+    """Validate a single file as a :py:class:`~bsmschema.models.BIDSStatsModel`.
+
+    Errors are collected into the result rather than raised.
+    If a ``cache`` is given, unchanged files are not revalidated.
+    """
+    start = time.perf_counter()
+    errors: list[dict[str, Any]] = []
+    cached = False
+    try:
+        data = Path(path).read_bytes()
+        if cache is None:
+            BIDSStatsModel.model_validate_json(data)
+        else:
+            entry = cache.validate(data)
+            errors = list(entry.errors)
+            cached = entry.cached
+    except ValidationError as e:
+        errors = _format_errors(e)
+    except OSError as e:
+        errors = [{'loc': [], 'msg': str(e), 'type': 'os_error'}]
+    return ValidationResult(
+        path=str(path),
+        ok=not errors,
+        errors=errors,
+        elapsed=time.perf_counter() - start,
+        cached=cached,
+    )
+
+
+# One cache connection per worker process, keyed by database path and settings
+_caches: dict[tuple[str, int, float], 'ValidationCache'] = {}
+
+
+def _validate_cached(settings: tuple[str, int, float], path: PathLike) -> ValidationResult:
+    cache = _caches.get(settings)
+    if cache is None:
+        from .cache import ValidationCache
+
+        cache = _caches[settings] = ValidationCache(*settings)
+    return validate_path(path, cache)
+
+
+def validate_paths(
+    paths: Iterable[PathLike],
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+    ordered: bool = False,
+    pattern: str = DEFAULT_PATTERN,
+    cache: Optional[PathLike] = None,
+    cache_max_entries: Optional[int] = None,
+    cache_max_age: Optional[float] = None,
+    unmatched: Optional[list[PathLike]] = None,
+) -> Iterator[ValidationResult]:
+    """Validate many files, fanning out over a pool of worker processes.
+
+    Results are yielded as soon as they are available.
+
+    Parameters
+    ----------
+    paths
+        Files, directories or globs to validate (see :py:func:`iter_model_paths`).
+    workers
+        Number of worker processes. Defaults to the number of CPUs.
+        With a single worker, files are validated in the calling process.
+    chunksize
+        Number of files sent to a worker at a time.
+    ordered
+        Yield results in input order, rather than order of completion.
+    pattern
+        Filename pattern used when searching directories.
+    cache
+        Path of a :py:class:`~bsmschema.cache.ValidationCache` database, shared by
+        all workers.
+    cache_max_entries, cache_max_age
+        Eviction settings of the cache (see :py:class:`~bsmschema.cache.ValidationCache`).
+    unmatched
+        If given, targets of ``paths`` that match no files are appended to it.
+    """
+    files = iter_model_paths(paths, pattern, unmatched)
+    validate: Any = validate_path
+    if cache is not None:
+        from .cache import DEFAULT_MAX_AGE, DEFAULT_MAX_ENTRIES
+
+        settings = (
+            str(cache),
+            DEFAULT_MAX_ENTRIES if cache_max_entries is None else cache_max_entries,
+            DEFAULT_MAX_AGE if cache_max_age is None else cache_max_age,
+        )
+        validate = partial(_validate_cached, settings)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        yield from map(validate, files)
+        return
+
+    with Pool(workers) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        yield from imap(validate, files, chunksize=max(chunksize, 1))
@@ -0,0 +1,213 @@
+"""On-disk cache of :py:class:`~bsmschema.models.BIDSStatsModel` validation results.
+
+Results are keyed by a hash of the raw file contents together with the versions of
+``bsmschema`` and ``pydantic``, so that a change to either the file or the schema
+invalidates the entry.
+A valid file is stored as its normalized JSON serialization; an invalid file is stored
+as its list of errors.
+Entries are held in a SQLite database, and the least recently used entries are evicted
+when the cache grows beyond ``max_entries`` or when they have not been used for
+``max_age`` seconds.
+
+Examples
+--------
+
+>>> from bsmschema.cache import ValidationCache
+>>> with ValidationCache('/tmp/bsmschema-cache.sqlite') as cache:  # doctest: +SKIP
+...     entry = cache.validate(open('model_smdl.json', 'rb').read())
+...     print(entry.ok, entry.cached, cache.hits, cache.misses)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Union
+
+__all__ = [
+    'CacheEntry',
+    'ValidationCache',
+    'default_cache_path',
+]
+
+PathLike = Union[str, 'os.PathLike[str]']
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+# Number of stores between evictions
+EVICT_INTERVAL = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    ok INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+def _versions() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    from pydantic import __version__ as pydantic_version
+
+    try:
+        bsmschema_version = version('bsmschema')
+    except PackageNotFoundError:  # pragma: no cover
+        bsmschema_version = '0+unknown'
+    return f'bsmschema={bsmschema_version};pydantic={pydantic_version}'
+
+
+def default_cache_path() -> Path:
+    """Default location of the cache database, under ``$XDG_CACHE_HOME``."""
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'bsmschema' / 'validation.sqlite'
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """The outcome of validating a file, possibly retrieved from the cache."""
+
+    ok: bool
+    """Whether the contents are a valid BIDS Stats Model."""
+    normalized: Optional[str] = None
+    """JSON serialization of the validated model, if valid."""
+    errors: tuple[dict[str, Any], ...] = ()
+    """Errors encountered, each with ``loc``, ``msg`` and ``type`` keys, if invalid."""
+    cached: bool = False
+    """Whether the entry was retrieved from the cache."""
+
+
+class ValidationCache:
+    """A SQLite store of validation results, with least-recently-used eviction.
+
+    Parameters
+    ----------
+    path
+        Location of the database, which is created if absent.
+    max_entries
+        Number of entries retained after eviction.
+    max_age
+        Entries that have not been used for this many seconds are evicted.
+
+    Eviction runs on the first store and then every :py:data:`EVICT_INTERVAL` stores,
+    so ``max_entries`` may be briefly exceeded.
+    The database may be shared by several processes.
+    """
+
+    hits: int
+    """Number of lookups answered from the cache by this instance."""
+    misses: int
+    """Number of lookups that required validation by this instance."""
+
+    def __init__(
+        self,
+        path: PathLike,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_age: float = DEFAULT_MAX_AGE,
+    ) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._stores = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        self._salt = f'{_versions()}\n'.encode()
+
+    def __enter__(self) -> 'ValidationCache':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return int(self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0])
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    def key(self, data: bytes) -> str:
+        """Cache key of the raw contents of a file."""
+        return hashlib.sha256(self._salt + data).hexdigest()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Look up an entry, marking it as recently used."""
+        with self._conn:
+            row = self._conn.execute(
+                'SELECT ok, payload FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        ok, payload = row
+        if ok:
+            return CacheEntry(ok=True, normalized=payload, cached=True)
+        return CacheEntry(ok=False, errors=tuple(json.loads(payload)), cached=True)
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry, evicting old entries periodically."""
+        payload = entry.normalized if entry.ok else json.dumps(list(entry.errors))
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, ok, payload, accessed) VALUES (?, ?, ?, ?)',
+                (key, int(entry.ok), payload, time.time()),
+            )
+        if not self._stores % EVICT_INTERVAL:
+            self.evict()
+        self._stores += 1
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Remove expired and least recently used entries.
+
+        Returns the number of entries removed.
+        """
+        if now is None:
+            now = time.time()
+        with self._conn:
+            removed = self._conn.execute(
+                'DELETE FROM results WHERE accessed < ?', (now - self.max_age,)
+            ).rowcount
+            removed += self._conn.execute(
+                'DELETE FROM results WHERE accessed <= ('
+                ' SELECT accessed FROM results ORDER BY accessed DESC LIMIT 1 OFFSET ?)',
+                (self.max_entries,),
+            ).rowcount
+        return int(removed)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._conn:
+            self._conn.execute('DELETE FROM results')
+
+    def validate(self, data: bytes) -> CacheEntry:
+        """Validate the raw contents of a file, consulting the cache first."""
+        key = self.key(data)
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        from pydantic import ValidationError
+
+        from .batch import _format_errors
+        from .models import BIDSStatsModel
+
+        try:
+            model = BIDSStatsModel.model_validate_json(data)
+        except ValidationError as e:
+            entry = CacheEntry(ok=False, errors=tuple(_format_errors(e)))
+        else:
+            entry = CacheEntry(ok=True, normalized=model.model_dump_json(exclude_unset=True))
+        self.put(key, entry)
+        return entry
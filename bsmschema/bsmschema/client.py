@@ -0,0 +1,72 @@
+"""A thin client for :py:mod:`bsmschema.server`.
+
+This module imports neither pydantic nor the schema models, so that a client process
+starts in milliseconds and leaves validation to a warm server.
+
+Examples
+--------
+
+>>> from bsmschema.client import request
+>>> request([{'path': '/data/model-example_smdl.json'}])  # doctest: +SKIP
+[{'path': '/data/model-example_smdl.json', 'ok': True, 'errors': [], ...}]
+"""
+
+import json
+import os
+import socket
+import tempfile
+from pathlib import Path
+from typing import Any, Optional, Union
+
+__all__ = ['connect', 'default_socket_path', 'request']
+
+PathLike = Union[str, 'os.PathLike[str]']
+
+
+def default_socket_path() -> Path:
+    """Default location of the server socket, under ``$XDG_RUNTIME_DIR`` if set."""
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return Path(base) / f'bsmschema-{uid}.sock'
+
+
+def connect(
+    socket_path: Optional[PathLike] = None,
+    host: str = '127.0.0.1',
+    port: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> socket.socket:
+    """Connect to a server on a Unix socket or, if ``port`` is given, over TCP.
+
+    The socket defaults to :py:func:`default_socket_path`.
+    """
+    if port is not None:
+        return socket.create_connection((host, port), timeout=timeout)
+    if socket_path is None:
+        socket_path = default_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(os.fspath(socket_path))
+    return sock
+
+
+def request(
+    requests: list[dict[str, Any]],
+    socket_path: Optional[PathLike] = None,
+    host: str = '127.0.0.1',
+    port: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> list[dict[str, Any]]:
+    """Send a batch of requests to a server, returning the results in order.
+
+    Raises :py:class:`OSError` if the server cannot be reached.
+    """
+    with connect(socket_path, host, port, timeout) as sock:
+        sock.sendall(json.dumps(requests).encode() + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError('Server closed the connection without responding')
+    results: list[dict[str, Any]] = json.loads(line)
+    return results
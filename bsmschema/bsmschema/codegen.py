@@ -0,0 +1,497 @@
+"""Generate standalone validators from JSON schemas.
+
+:py:func:`generate_validator` compiles a JSON schema, such as those exported by
+``python -m bsmschema schema``, into the source of a Python module that validates
+documents against it.
+The module depends only on the standard library, so services that only need to check
+documents can do so without importing pydantic or bsmschema.
+Each schema keyword becomes inline Python code, in the spirit of
+`fastjsonschema <https://horejsek.github.io/python-fastjsonschema/>`_,
+and each definition in ``$defs`` becomes a function.
+
+The generated module provides:
+
+``validation_errors(data)``
+    A list of errors, each with ``loc``, ``msg`` and ``type`` keys, as in
+    :py:mod:`bsmschema.batch`.
+``is_valid(data)``
+    Whether ``data`` is valid.
+``validate(data)``
+    Returns ``data`` if valid, or raises its ``ValidationError``, a subclass of
+    :py:class:`ValueError` with the list of errors as ``errors``.
+
+Validation follows the JSON schema, which is stricter than pydantic in a few places:
+pydantic accepts numeric strings and booleans for floats, and ``true`` for the
+intercept ``1``.
+Documents accepted by the generated validator are always accepted by pydantic.
+
+The keywords used by pydantic for the models of this package are supported:
+``type``, ``enum``, ``const``, ``anyOf``, ``$ref`` (to ``#/$defs``), ``properties``,
+``required``, ``additionalProperties`` and ``items``.
+Other keywords raise :py:class:`NotImplementedError`.
+
+Examples
+--------
+
+>>> from bsmschema.models import Contrast
+>>> validator = compile_validator(Contrast.model_json_schema())
+>>> validator.is_valid({'Name': 'c', 'ConditionList': ['A'], 'Weights': [1], 'Test': 't'})
+True
+>>> validator.validation_errors({'Name': 'c', 'ConditionList': [2], 'Weights': [1]})
+... # doctest: +NORMALIZE_WHITESPACE
+[{'loc': ['ConditionList', 0], 'msg': 'Input should be 1 or a valid string', 'type': 'any_of'},
+ {'loc': ['Test'], 'msg': 'Field required', 'type': 'missing'}]
+"""
+
+import re
+import types
+from pathlib import Path
+from typing import Any, Optional, Union
+
+__all__ = [
+    'compile_validator',
+    'generate_validator',
+    'write_validator',
+]
+
+Schema = dict[str, Any]
+
+# Keywords that do not affect validation
+_ANNOTATIONS = {
+    '$comment',
+    '$id',
+    '$schema',
+    '$defs',
+    'default',
+    'deprecated',
+    'description',
+    'examples',
+    'readOnly',
+    'title',
+    'writeOnly',
+}
+
+_TYPE_CHECKS = {
+    'string': 'isinstance({v}, str)',
+    'integer': (
+        '(isinstance({v}, int) and not isinstance({v}, bool)'
+        ' or isinstance({v}, float) and {v}.is_integer())'
+    ),
+    'number': '(isinstance({v}, (int, float)) and not isinstance({v}, bool))',
+    'boolean': 'isinstance({v}, bool)',
+    'null': '{v} is None',
+    'array': 'isinstance({v}, list)',
+    'object': 'isinstance({v}, dict)',
+}
+_TYPE_ERRORS = {
+    'string': ('a valid string', 'string_type'),
+    'integer': ('a valid integer', 'int_type'),
+    'number': ('a valid number', 'float_type'),
+    'boolean': ('a valid boolean', 'bool_type'),
+    'null': ('null', 'none_required'),
+    'array': ('a valid list', 'list_type'),
+    'object': ('a valid dictionary', 'dict_type'),
+}
+
+_HEADER = '''\
+"""Validator for the {title} JSON schema.
+
+Generated by bsmschema.codegen; do not edit.
+This module depends only on the Python standard library.
+"""
+
+__all__ = ['ValidationError', 'is_valid', 'validate', 'validation_errors']
+
+_MISSING = object()
+
+
+class ValidationError(ValueError):
+    """A document is invalid. The errors found are listed in ``errors``."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        first = errors[0]
+        super().__init__(
+            f'{{len(errors)}} validation error(s), first at {{first["loc"]}}: {{first["msg"]}}'
+        )
+
+
+def validation_errors(data):
+    """List the errors of a document, each with ``loc``, ``msg`` and ``type`` keys."""
+    errors = []
+    {root}(data, (), errors)
+    return [{{'loc': list(loc), 'msg': msg, 'type': type_}} for loc, msg, type_ in errors]
+
+
+def is_valid(data):
+    """Whether a document is valid."""
+    errors = []
+    {root}(data, (), errors)
+    return not errors
+
+
+def validate(data):
+    """Return a document if valid, or raise :py:class:`ValidationError`."""
+    errors = validation_errors(data)
+    if errors:
+        raise ValidationError(errors)
+    return data
+'''
+
+
+class _Loc:
+    """A location as code: a tuple variable and the code of further path elements."""
+
+    def __init__(self, base: str, parts: tuple[str, ...] = ()) -> None:
+        self.base = base
+        self.parts = parts
+
+    def __truediv__(self, part: str) -> '_Loc':
+        return _Loc(self.base, (*self.parts, part))
+
+    def __str__(self) -> str:
+        if not self.parts:
+            return self.base
+        return f'(*{self.base}, {", ".join(self.parts)})'
+
+
+def _keywords(schema: Union[Schema, bool]) -> Schema:
+    if schema is True:
+        return {}
+    if schema is False:
+        return {'not': {}}
+    keywords = {key: value for key, value in schema.items() if key not in _ANNOTATIONS}
+    if isinstance(keywords.get('type'), list):
+        # A list of types is a union of single types
+        branches = [{'type': type_} for type_ in keywords.pop('type')]
+        keywords = {'allOf': [keywords, {'anyOf': branches}]} if keywords else {'anyOf': branches}
+    for key in keywords:
+        if key not in (
+            'allOf',
+            'not',
+            'type',
+            'enum',
+            'const',
+            'anyOf',
+            '$ref',
+            'properties',
+            'required',
+            'additionalProperties',
+            'items',
+        ):
+            raise NotImplementedError(f'Unsupported JSON schema keyword: {key}')
+    return keywords
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return repr(value)
+    raise NotImplementedError(f'Unsupported constant: {value!r}')
+
+
+def _const_check(value: Any, v: str) -> str:
+    """Test for equality in the JSON data model, in which ``true`` is not ``1``."""
+    if isinstance(value, bool) or value is None:
+        return f'{v} is {value!r}'
+    if isinstance(value, str):
+        return f'{v} == {_literal(value)}'
+    return f'({_TYPE_CHECKS["number"].format(v=v)} and {v} == {_literal(value)})'
+
+
+def _literal_type(value: Any) -> Optional[str]:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return 'integer'
+    return 'number'
+
+
+def _describe_value(value: Any) -> str:
+    return repr(value) if isinstance(value, str) else _literal(value)
+
+
+def _join(descriptions: list[str]) -> str:
+    descriptions = list(dict.fromkeys(descriptions))
+    if len(descriptions) == 1:
+        return descriptions[0]
+    return f'{", ".join(descriptions[:-1])} or {descriptions[-1]}'
+
+
+class _Generator:
+    def __init__(self, schema: Schema) -> None:
+        self.defs: dict[str, Schema] = schema.get('$defs', {})
+        self.names = {name: '_validate_' + re.sub(r'\W', '_', name) for name in sorted(self.defs)}
+        self.counter = 0
+
+    def var(self, prefix: str) -> str:
+        self.counter += 1
+        return f'_{prefix}{self.counter}'
+
+    def resolve(self, ref: str) -> str:
+        prefix = '#/$defs/'
+        if not ref.startswith(prefix) or ref[len(prefix) :] not in self.defs:
+            raise NotImplementedError(f'Unsupported reference: {ref}')
+        return ref[len(prefix) :]
+
+    def declared_type(self, schema: Schema) -> Optional[str]:
+        """The single JSON type accepted by a schema, if known."""
+        keywords = _keywords(schema)
+        if '$ref' in keywords:
+            return self.declared_type(self.defs[self.resolve(keywords['$ref'])])
+        if isinstance(keywords.get('type'), str):
+            return str(keywords['type'])
+        return None
+
+    def condition(self, schema: Schema, v: str) -> Optional[str]:
+        """A boolean expression for schemas simple enough to check inline."""
+        keywords = _keywords(schema)
+        if not keywords:
+            return 'True'
+        if keywords.keys() == {'anyOf'}:
+            options = keywords['anyOf']
+            if {'type': 'number'} in options:
+                # Integers are numbers
+                options = [option for option in options if option != {'type': 'integer'}]
+            branches = [self.condition(branch, v) for branch in options]
+            if any(branch is None for branch in branches):
+                return None
+            return ' or '.join(f'({branch})' for branch in branches)
+        type_ = keywords.get('type')
+        if type_ == 'array' and keywords.keys() <= {'type', 'items'}:
+            item = self.var('x')
+            items = self.condition(keywords.get('items', {}), item)
+            if items is None:
+                return None
+            check = _TYPE_CHECKS['array'].format(v=v)
+            return check if items == 'True' else f'{check} and all({items} for {item} in {v})'
+        if keywords.keys() <= {'type', 'enum', 'const'} and type_ not in ('array', 'object'):
+            checks = []
+            literals = [keywords['const']] if 'const' in keywords else keywords.get('enum', [])
+            # Literals of the declared type imply the type check
+            if type_ is not None and not (
+                literals and all(_literal_type(value) == type_ for value in literals)
+            ):
+                checks.append(_TYPE_CHECKS[type_].format(v=v))
+            if 'const' in keywords:
+                checks.append(_const_check(keywords['const'], v))
+            if 'enum' in keywords:
+                checks.append(
+                    '(' + ' or '.join(_const_check(value, v) for value in keywords['enum']) + ')'
+                )
+            return ' and '.join(checks)
+        return None
+
+    def describe(self, schema: Schema) -> str:
+        """What a simple schema expects, for error messages."""
+        keywords = _keywords(schema)
+        if 'anyOf' in keywords:
+            return _join([self.describe(branch) for branch in keywords['anyOf']])
+        if 'const' in keywords:
+            return _describe_value(keywords['const'])
+        if 'enum' in keywords:
+            return _join([_describe_value(value) for value in keywords['enum']])
+        if 'type' in keywords:
+            return _TYPE_ERRORS[keywords['type']][0]
+        return 'valid'
+
+    def error_type(self, schema: Schema) -> str:
+        keywords = _keywords(schema)
+        if 'anyOf' in keywords:
+            return 'any_of'
+        if 'const' in keywords or 'enum' in keywords:
+            return 'literal_error'
+        return _TYPE_ERRORS[keywords['type']][1] if 'type' in keywords else 'invalid'
+
+    def emit(self, schema: Schema, v: str, loc: _Loc, errors: str, indent: int) -> list[str]:
+        """Statements appending the errors of ``v`` to the list ``errors``."""
+        pad = '    ' * indent
+        keywords = _keywords(schema)
+        if not keywords:
+            return []
+
+        def error(message: str, error_type: str, at: _Loc = loc, extra: str = '') -> str:
+            return f'{pad}{extra}{errors}.append(({at}, {message!r}, {error_type!r}))'
+
+        type_ = keywords.get('type')
+        if '$ref' in keywords:
+            lines = [f'{pad}{self.names[self.resolve(keywords["$ref"])]}({v}, {loc}, {errors})']
+            rest = {key: value for key, value in keywords.items() if key != '$ref'}
+            return lines + self.emit(rest, v, loc, errors, indent)
+        if 'allOf' in keywords:
+            return [
+                line
+                for branch in keywords['allOf']
+                for line in self.emit(branch, v, loc, errors, indent)
+            ]
+        if type_ not in ('array', 'object'):
+            condition = self.condition(keywords, v)
+            if condition is not None:
+                return [
+                    f'{pad}if not ({condition}):',
+                    error(
+                        f'Input should be {self.describe(keywords)}',
+                        self.error_type(keywords),
+                        extra='    ',
+                    ),
+                ]
+        if 'anyOf' in keywords:
+            return self.emit_any_of(keywords['anyOf'], v, loc, errors, indent)
+        if type_ == 'array':
+            return self.emit_array(keywords, v, loc, errors, indent)
+        if type_ == 'object':
+            return self.emit_object(keywords, v, loc, errors, indent)
+        raise NotImplementedError(f'Unsupported schema: {schema!r}')
+
+    def emit_any_of(
+        self, branches: list[Schema], v: str, loc: _Loc, errors: str, indent: int
+    ) -> list[str]:
+        pad = '    ' * indent
+        simple = [self.condition(branch, v) for branch in branches]
+        complex_ = [branch for branch, check in zip(branches, simple) if check is None]
+        checks = [check for check in simple if check is not None]
+        lines = []
+        if checks:
+            lines.append(f'{pad}if not ({" or ".join(f"({check})" for check in checks)}):')
+            indent += 1
+            pad += '    '
+        # Each branch is only tried if the ones before it failed
+        lists = []
+        for branch in complex_:
+            branch_errors = self.var('e')
+            lists.append(branch_errors)
+            lines.append(f'{pad}{branch_errors} = []')
+            lines.extend(self.emit(branch, v, loc, branch_errors, indent))
+            lines.append(f'{pad}if {branch_errors}:')
+            indent += 1
+            pad += '    '
+        # Report the errors of the only branch of the right type, if there is one
+        types = [self.declared_type(branch) for branch in branches]
+        keyword = 'if'
+        for branch, branch_errors in zip(complex_, lists):
+            type_ = self.declared_type(branch)
+            if type_ is not None and types.count(type_) == 1:
+                lines.append(f'{pad}{keyword} {_TYPE_CHECKS[type_].format(v=v)}:')
+                lines.append(f'{pad}    {errors}.extend({branch_errors})')
+                keyword = 'elif'
+        message = f'Input should be {_join([self.describe_branch(branch) for branch in branches])}'
+        if keyword == 'elif':
+            lines.append(f'{pad}else:')
+            pad += '    '
+        lines.append(f'{pad}{errors}.append(({loc}, {message!r}, {"any_of"!r}))')
+        return lines
+
+    def describe_branch(self, schema: Schema) -> str:
+        keywords = _keywords(schema)
+        if '$ref' in keywords:
+            return f'a valid {self.resolve(keywords["$ref"])}'
+        return self.describe(keywords)
+
+    def emit_array(
+        self, keywords: Schema, v: str, loc: _Loc, errors: str, indent: int
+    ) -> list[str]:
+        pad = '    ' * indent
+        index, item = self.var('i'), self.var('x')
+        body = self.emit(keywords.get('items', {}), item, loc / index, errors, indent + 2)
+        lines = [f'{pad}if not {_TYPE_CHECKS["array"].format(v=v)}:']
+        lines.append(
+            f"{pad}    {errors}.append(({loc}, 'Input should be a valid list', 'list_type'))"
+        )
+        if body:
+            lines.append(f'{pad}else:')
+            lines.append(f'{pad}    for {index}, {item} in enumerate({v}):')
+            lines.extend(body)
+        return lines
+
+    def emit_object(
+        self, keywords: Schema, v: str, loc: _Loc, errors: str, indent: int
+    ) -> list[str]:
+        pad = '    ' * indent
+        inner = pad + '    '
+        properties: dict[str, Schema] = keywords.get('properties', {})
+        required: list[str] = keywords.get('required', [])
+        body = []
+        for key in required:
+            if key not in properties:
+                body.append(f'{inner}if {key!r} not in {v}:')
+                body.append(
+                    f"{inner}    {errors}.append(({loc / repr(key)}, 'Field required', 'missing'))"
+                )
+        for key, subschema in properties.items():
+            value = self.var('v')
+            checks = self.emit(subschema, value, loc / repr(key), errors, indent + 2)
+            if key in required:
+                body.append(f'{inner}{value} = {v}.get({key!r}, _MISSING)')
+                body.append(f'{inner}if {value} is _MISSING:')
+                body.append(
+                    f"{inner}    {errors}.append(({loc / repr(key)}, 'Field required', 'missing'))"
+                )
+                if checks:
+                    body.append(f'{inner}else:')
+                    body.extend(checks)
+            elif checks:
+                body.append(f'{inner}{value} = {v}.get({key!r}, _MISSING)')
+                body.append(f'{inner}if {value} is not _MISSING:')
+                body.extend(checks)
+
+        additional = keywords.get('additionalProperties', True)
+        if additional is not True and _keywords(additional):
+            key, value = self.var('k'), self.var('v')
+            known = f'{set(properties)!r}' if properties else None
+            if _keywords(additional).keys() == {'not'}:
+                checks = [
+                    f'{"    " * (indent + 2)}{errors}.append(({loc / key}, '
+                    "'Extra inputs are not permitted', 'extra_forbidden'))"
+                ]
+            else:
+                checks = self.emit(additional, value, loc / key, errors, indent + 2)
+            body.append(f'{inner}for {key}, {value} in {v}.items():')
+            if known:
+                body.append(f'{inner}    if {key} in {known}:')
+                body.append(f'{inner}        continue')
+            body.extend(checks)
+
+        lines = [f'{pad}if not {_TYPE_CHECKS["object"].format(v=v)}:']
+        lines.append(
+            f"{pad}    {errors}.append(({loc}, 'Input should be a valid dictionary', 'dict_type'))"
+        )
+        if body:
+            lines.append(f'{pad}else:')
+            lines.extend(body)
+        return lines
+
+    def function(self, name: str, schema: Schema) -> str:
+        body = self.emit(schema, 'data', _Loc('loc'), 'errors', 1) or ['    pass']
+        return '\n'.join([f'def {name}(data, loc, errors):', *body])
+
+
+def generate_validator(schema: Schema) -> str:
+    """Generate the source of a module that validates documents against a JSON schema."""
+    generator = _Generator(schema)
+    functions = [
+        generator.function(generator.names[name], generator.defs[name])
+        for name in sorted(generator.defs)
+    ]
+    functions.append(generator.function('_validate_root', schema))
+    header = _HEADER.format(title=schema.get('title', 'given'), root='_validate_root')
+    return header + ''.join(f'\n\n{function}\n' for function in functions)
+
+
+def compile_validator(schema: Schema, name: str = 'bsmschema_validator') -> types.ModuleType:
+    """Generate a validator module for a JSON schema, and load it without writing a file."""
+    module = types.ModuleType(name)
+    source = generate_validator(schema)
+    exec(compile(source, f'<{name}>', 'exec'), module.__dict__)
+    return module
+
+
+def write_validator(path: Union[str, Path], schema: Optional[Schema] = None) -> None:
+    """Write a validator module for a JSON schema, by default that of
+    :py:class:`~bsmschema.models.BIDSStatsModel`.
+    """
+    if schema is None:
+        from .models import BIDSStatsModel
+
+        schema = BIDSStatsModel.model_json_schema()
+    Path(path).write_text(generate_validator(schema))
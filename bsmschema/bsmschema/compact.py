@@ -0,0 +1,437 @@
+r"""Compact, immutable representations of :py:class:`~bsmschema.models.BIDSStatsModel`.
+
+Applications that hold many models in memory pay for a pydantic instance per object,
+and for a separate string per occurrence of each variable name.
+The classes in this module mirror the pydantic models, with fields of the same names,
+and reduce this overhead:
+
+* Objects are frozen dataclasses with ``__slots__``.
+* Lists are tuples, and objects without a fixed structure (such as
+  :py:attr:`Transformations.Instructions <bsmschema.models.Transformations.Instructions>`)
+  are :py:class:`FrozenDict`\s.
+* Strings are interned, and lists of names are shared between equal lists.
+* Numeric :py:attr:`Contrast.Weights <bsmschema.models.Contrast.Weights>` are packed
+  into a :py:class:`WeightArray`.
+
+Compact objects are hashable and compare by value, so they may be used as dictionary keys
+to deduplicate models.
+Absent fields are ``None``, so fields explicitly set to ``null`` are dropped when
+converting back with :py:meth:`~CompactBIDSStatsModel.to_model`.
+
+Examples
+--------
+
+>>> from bsmschema.models import BIDSStatsModel
+>>> model = BIDSStatsModel.model_validate({
+...     'Name': 'example',
+...     'BIDSModelVersion': '1.0.0',
+...     'Nodes': [
+...         {'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...          'Model': {'Type': 'glm', 'X': [1, 'A', 'B']},
+...          'Contrasts': [{'Name': 'AvB', 'ConditionList': ['A', 'B'],
+...                         'Weights': [1, -1], 'Test': 't'}]},
+...     ],
+... })
+>>> frozen = compact(model)
+>>> frozen.Nodes[0].GroupBy
+('run', 'subject')
+>>> frozen.Nodes[0].Contrasts[0].Weights
+WeightArray('q', (2,), [1, -1])
+>>> frozen == compact(model.model_copy(deep=True))
+True
+>>> len({frozen, compact(model)})
+1
+>>> frozen.to_model() == model
+True
+"""
+
+import sys
+from array import array
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, Optional, TypeVar, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pydantic import BaseModel
+
+    from .models import BIDSStatsModel
+
+__all__ = [
+    'CompactBIDSStatsModel',
+    'CompactContrast',
+    'CompactDummyContrasts',
+    'CompactEdge',
+    'CompactHRF',
+    'CompactModel',
+    'CompactNode',
+    'FrozenDict',
+    'WeightArray',
+    'compact',
+    'freeze',
+    'thaw',
+]
+
+Names = tuple[Union[int, str], ...]
+C = TypeVar('C', bound='_Compact')
+
+
+def freeze(value: Any) -> Any:
+    """Convert a JSON value to an immutable equivalent, interning strings."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return FrozenDict(value)
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Convert an immutable value back to JSON types."""
+    if isinstance(value, FrozenDict):
+        return value.todict()
+    if isinstance(value, WeightArray):
+        return value.tolist()
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    if isinstance(value, _Compact):
+        return value.to_dict()
+    return value
+
+
+@lru_cache(maxsize=65536)
+def _shared(names: tuple[Any, ...]) -> tuple[Any, ...]:
+    return names
+
+
+def _names(values: Optional[list[Any]]) -> Optional[Names]:
+    """Intern a list of names, sharing the tuple with equal lists."""
+    if values is None:
+        return None
+    return _shared(tuple(sys.intern(v) if isinstance(v, str) else v for v in values))
+
+
+class FrozenDict(Mapping[str, Any]):
+    """An immutable, hashable mapping preserving insertion order.
+
+    Values are frozen with :py:func:`freeze`.
+    Equality, like that of :py:class:`dict`, ignores order.
+    """
+
+    __slots__ = ('_keys', '_values', '_hash')
+
+    def __init__(self, mapping: Mapping[str, Any]) -> None:
+        self._keys: tuple[str, ...] = _shared(tuple(sys.intern(key) for key in mapping))
+        self._values = tuple(freeze(value) for value in mapping.values())
+        self._hash: Optional[int] = None
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, FrozenDict) and self._keys == other._keys:
+            return self._values == other._values
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(frozenset(zip(self._keys, self._values)))
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f'FrozenDict({dict(self)!r})'
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # String hashes, and so the cached hash, differ between processes
+        return FrozenDict, (dict(self),)
+
+    def todict(self) -> dict[str, Any]:
+        """Convert to a :py:class:`dict`, thawing values."""
+        return {key: thaw(value) for key, value in zip(self._keys, self._values)}
+
+
+@dataclass(frozen=True)
+class WeightArray:
+    """A 1D or 2D array of numeric weights, packed as machine values.
+
+    Integers are stored as 64-bit integers (typecode ``'q'``) and floats as 64-bit
+    floats (``'d'``).
+    Weights mixing integers and floats, such as ``[1, -0.5, -0.5]``, are stored as floats,
+    with the positions of the integers in :py:attr:`ints`, so that :py:meth:`tolist`
+    returns the original values.
+    """
+
+    __slots__ = ('typecode', 'shape', 'data', 'ints')
+
+    typecode: str
+    """Typecode of the :py:class:`array.array` holding the values."""
+    shape: tuple[int, ...]
+    """``(n,)`` for 1D weights, ``(rows, n)`` for 2D weights."""
+    data: bytes
+    """Packed values, in row-major order."""
+    ints: tuple[int, ...]
+    """Positions, in :py:attr:`data`, of the integers among floats."""
+
+    @classmethod
+    def pack(cls, weights: list[Any]) -> Union['WeightArray', tuple[Any, ...]]:
+        """Pack weights, or freeze them if they are not uniformly integers or floats."""
+        rows = weights if weights and isinstance(weights[0], list) else None
+        shape: tuple[int, ...]
+        if rows is None:
+            values, shape = weights, (len(weights),)
+        elif all(isinstance(row, list) and len(row) == len(rows[0]) for row in rows):
+            values, shape = [w for row in rows for w in row], (len(rows), len(rows[0]))
+        else:
+            return freeze(weights)  # type: ignore[no-any-return]
+        types = {type(w) for w in values}
+        ints: tuple[int, ...] = ()
+        if types <= {int}:
+            typecode = 'q'
+        elif types == {float}:
+            typecode = 'd'
+        elif types == {int, float}:
+            typecode = 'd'
+            ints = tuple(i for i, w in enumerate(values) if type(w) is int)
+            # Integers are only restored exactly if a double holds them exactly
+            if any(abs(values[i]) > 2**53 for i in ints):
+                return freeze(weights)  # type: ignore[no-any-return]
+        else:
+            return freeze(weights)  # type: ignore[no-any-return]
+        try:
+            return cls(typecode, shape, array(typecode, values).tobytes(), ints)
+        except OverflowError:
+            return freeze(weights)  # type: ignore[no-any-return]
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return WeightArray, (self.typecode, self.shape, self.data, self.ints)
+
+    def __repr__(self) -> str:
+        return f'WeightArray({self.typecode!r}, {self.shape!r}, {self.tolist()!r})'
+
+    def values(self) -> 'array[Any]':
+        """The flattened values, as an :py:class:`array.array`."""
+        values = array(self.typecode)
+        values.frombytes(self.data)
+        return values
+
+    def tolist(self) -> list[Any]:
+        """Unpack to a list, or a list of lists for 2D weights."""
+        values = self.values().tolist()
+        for i in self.ints:
+            values[i] = int(values[i])
+        if len(self.shape) == 1:
+            return values
+        rows, width = self.shape
+        return [values[i * width : (i + 1) * width] for i in range(rows)]
+
+
+class _Compact:
+    """Conversion to and from dictionaries and pydantic models, and cached hashing."""
+
+    __slots__ = ('_hash',)
+    _hash: int
+
+    _model: ClassVar[str]
+    # Conversions of fields that are not frozen with freeze()
+    _convert: ClassVar[dict[str, Callable[[Any], Any]]] = {}
+
+    @classmethod
+    def from_dict(cls: type[C], data: Mapping[str, Any]) -> C:
+        """Build from a dictionary with the fields of the pydantic model."""
+        kwargs = {}
+        for field in fields(cls):  # type: ignore[arg-type]
+            value = data.get(field.name)
+            if value is not None:
+                value = cls._convert.get(field.name, freeze)(value)
+            kwargs[field.name] = value
+        return cls(**kwargs)
+
+    @classmethod
+    def from_model(cls: type[C], model: 'BaseModel') -> C:
+        """Build from a pydantic model."""
+        return cls.from_dict(model.model_dump())
+
+    def _values(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, field.name) for field in fields(self))  # type: ignore[arg-type]
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self is other or self._values() == other._values()
+
+    def __hash__(self) -> int:
+        # Models are hashed repeatedly when used as dictionary keys
+        try:
+            return self._hash
+        except AttributeError:
+            object.__setattr__(self, '_hash', hash(self._values()))
+            return self._hash
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Frozen instances with __slots__ cannot restore their state by assignment,
+        # and string hashes differ between processes
+        return type(self), self._values()
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert to a dictionary, omitting absent fields."""
+        return {
+            field.name: thaw(value)
+            for field in fields(self)  # type: ignore[arg-type]
+            if (value := getattr(self, field.name)) is not None
+        }
+
+    def to_model(self) -> Any:
+        """Convert to the equivalent pydantic model."""
+        from . import models
+
+        return getattr(models, self._model).model_validate(self.to_dict())
+
+
+def _each(cls: type[C]) -> Callable[[list[Any]], tuple[C, ...]]:
+    return lambda values: tuple(cls.from_dict(value) for value in values)
+
+
+@dataclass(frozen=True, eq=False)
+class CompactEdge(_Compact):
+    """Compact :py:class:`~bsmschema.models.Edge`."""
+
+    __slots__ = ('Source', 'Destination', 'Filter', 'Description')
+    _model = 'Edge'
+
+    Source: str
+    Destination: str
+    Filter: Optional[FrozenDict]
+    Description: Optional[str]
+
+
+@dataclass(frozen=True, eq=False)
+class CompactHRF(_Compact):
+    """Compact :py:class:`~bsmschema.models.HRF`."""
+
+    __slots__ = ('Variables', 'Model', 'Parameters', 'Description')
+    _model = 'HRF'
+    _convert = {'Variables': _names}
+
+    Variables: Names
+    Model: str
+    Parameters: Optional[FrozenDict]
+    Description: Optional[str]
+
+
+@dataclass(frozen=True, eq=False)
+class CompactModel(_Compact):
+    r"""Compact :py:class:`~bsmschema.models.Model`.
+
+    :py:attr:`~bsmschema.models.Model.Options` and :py:attr:`~bsmschema.models.Model.Software`
+    are held as :py:class:`FrozenDict`\s.
+    """
+
+    __slots__ = ('Type', 'X', 'Formula', 'HRF', 'Options', 'Software', 'Description')
+    _model = 'Model'
+    _convert = {'X': _names, 'HRF': CompactHRF.from_dict}
+
+    Type: str
+    X: Names
+    Formula: Optional[str]
+    HRF: Optional[CompactHRF]
+    Options: Optional[FrozenDict]
+    Software: Optional[FrozenDict]
+    Description: Optional[str]
+
+
+@dataclass(frozen=True, eq=False)
+class CompactContrast(_Compact):
+    """Compact :py:class:`~bsmschema.models.Contrast`."""
+
+    __slots__ = ('Name', 'ConditionList', 'Weights', 'Test', 'Description')
+    _model = 'Contrast'
+    _convert = {'ConditionList': _names, 'Weights': WeightArray.pack}
+
+    Name: str
+    ConditionList: Names
+    Weights: Union[WeightArray, tuple[Any, ...]]
+    Test: str
+    Description: Optional[str]
+
+
+@dataclass(frozen=True, eq=False)
+class CompactDummyContrasts(_Compact):
+    """Compact :py:class:`~bsmschema.models.DummyContrasts`."""
+
+    __slots__ = ('Contrasts', 'Test', 'Description')
+    _model = 'DummyContrasts'
+    _convert = {'Contrasts': _names}
+
+    Contrasts: Optional[Names]
+    Test: str
+    Description: Optional[str]
+
+
+@dataclass(frozen=True, eq=False)
+class CompactNode(_Compact):
+    """Compact :py:class:`~bsmschema.models.Node`.
+
+    :py:attr:`~bsmschema.models.Node.Transformations` is held as a :py:class:`FrozenDict`.
+    """
+
+    __slots__ = (
+        'Level',
+        'Name',
+        'GroupBy',
+        'Transformations',
+        'Model',
+        'Contrasts',
+        'DummyContrasts',
+        'Description',
+    )
+    _model = 'Node'
+    _convert = {
+        'GroupBy': _names,
+        'Model': CompactModel.from_dict,
+        'Contrasts': _each(CompactContrast),
+        'DummyContrasts': CompactDummyContrasts.from_dict,
+    }
+
+    Level: str
+    Name: str
+    GroupBy: Names
+    Transformations: Optional[FrozenDict]
+    Model: CompactModel
+    Contrasts: Optional[tuple[CompactContrast, ...]]
+    DummyContrasts: Optional[CompactDummyContrasts]
+    Description: Optional[str]
+
+
+@dataclass(frozen=True, eq=False)
+class CompactBIDSStatsModel(_Compact):
+    """Compact :py:class:`~bsmschema.models.BIDSStatsModel`."""
+
+    __slots__ = ('Name', 'BIDSModelVersion', 'Description', 'Input', 'Nodes', 'Edges')
+    _model = 'BIDSStatsModel'
+    _convert = {'Nodes': _each(CompactNode), 'Edges': _each(CompactEdge)}
+
+    Name: str
+    BIDSModelVersion: str
+    Description: Optional[str]
+    Input: Optional[FrozenDict]
+    Nodes: tuple[CompactNode, ...]
+    Edges: Optional[tuple[CompactEdge, ...]]
+
+    def to_model(self) -> 'BIDSStatsModel':
+        """Convert to the equivalent :py:class:`~bsmschema.models.BIDSStatsModel`."""
+        return super().to_model()  # type: ignore[no-any-return]
+
+
+def compact(model: 'BIDSStatsModel') -> CompactBIDSStatsModel:
+    """Convert a :py:class:`~bsmschema.models.BIDSStatsModel` to its compact form."""
+    return CompactBIDSStatsModel.from_model(model)
@@ -0,0 +1,236 @@
+"""Compile the contrasts of a :py:class:`~bsmschema.models.Node` into NumPy arrays.
+
+:py:func:`compile_contrasts` expands :py:attr:`Node.DummyContrasts
+<bsmschema.models.Node.DummyContrasts>` and combines them with :py:attr:`Node.Contrasts
+<bsmschema.models.Node.Contrasts>` into dense weight matrices whose columns follow the
+design matrix, with one stacked matrix per statistical test.
+All contrasts of a test may then be estimated with a single matrix product.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> from bsmschema.models import Node
+>>> node = Node.model_validate({
+...     'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...     'Model': {'Type': 'glm', 'X': [1, 'A', 'B', 'C']},
+...     'Contrasts': [
+...         {'Name': 'a_vs_other', 'ConditionList': ['A', 'B', 'C'],
+...          'Weights': [1, '-1/2', '-1/2'], 'Test': 't'},
+...         {'Name': 'any', 'ConditionList': ['A', 'B'], 'Weights': [[1, 0], [0, 1]],
+...          'Test': 'F'},
+...     ],
+...     'DummyContrasts': {'Contrasts': ['A'], 'Test': 't'},
+... })
+>>> compiled = compile_contrasts(node)
+>>> compiled.columns
+(1, 'A', 'B', 'C')
+>>> compiled['t'].names
+('a_vs_other', 'A')
+>>> compiled['t'].matrix
+array([[ 0. ,  1. , -0.5, -0.5],
+       [ 0. ,  1. ,  0. ,  0. ]])
+>>> compiled['F']['any']
+array([[0., 1., 0., 0.],
+       [0., 0., 1., 0.]])
+"""
+
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import numpy as np
+
+from .wildcards import expand
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import Node
+
+__all__ = [
+    'INTERCEPT_NAME',
+    'CompiledContrasts',
+    'ContrastSet',
+    'compile_contrasts',
+    'parse_weight',
+]
+
+INTERCEPT_NAME = 'intercept'
+"""Name given to a dummy contrast of the literal intercept ``1``."""
+
+Column = Union[int, str]
+
+# (name, condition list, weight rows, test), with weights as a tuple of tuples
+_ContrastKey = tuple[str, tuple[Column, ...], tuple[tuple[Any, ...], ...], str]
+
+
+@lru_cache(maxsize=4096)
+def _parse_string(value: str) -> float:
+    try:
+        return float(Fraction(value))
+    except (ValueError, ZeroDivisionError) as e:
+        raise ValueError(f'Invalid contrast weight: {value!r}') from e
+
+
+def parse_weight(value: Union[int, float, str]) -> float:
+    """Convert a contrast weight to a float.
+
+    Fractional values may be passed as strings, which are parsed once and memoized.
+
+    >>> parse_weight('-1/3')
+    -0.3333333333333333
+    >>> parse_weight(2)
+    2.0
+    """
+    if isinstance(value, str):
+        return _parse_string(value)
+    return float(value)
+
+
+@dataclass(frozen=True, eq=False)
+class ContrastSet:
+    """Contrasts sharing a statistical test, stacked into a single weight matrix.
+
+    Each contrast occupies one row (1D weights) or several consecutive rows (2D weights).
+    """
+
+    test: str
+    """Statistical test shared by the contrasts."""
+    names: tuple[str, ...]
+    """Names of the contrasts, in order."""
+    matrix: np.ndarray
+    """Read-only weight matrix with shape ``(rows, columns)``."""
+    slices: tuple[slice, ...]
+    """Rows of :py:attr:`matrix` belonging to each contrast."""
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[tuple[str, np.ndarray]]:
+        for name, rows in zip(self.names, self.slices):
+            yield name, self.matrix[rows]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return the weight rows of the named contrast."""
+        return self.matrix[self.slices[self.names.index(name)]]
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledContrasts:
+    """All contrasts of a node, grouped by statistical test."""
+
+    columns: tuple[Column, ...]
+    """Design matrix columns that weight matrix columns correspond to."""
+    groups: dict[str, ContrastSet]
+    """Contrast sets, keyed by test (``"t"``, ``"F"`` or ``"pass"``)."""
+
+    @property
+    def names(self) -> list[str]:
+        """Names of all contrasts."""
+        return [name for group in self.groups.values() for name in group.names]
+
+    def __getitem__(self, test: str) -> ContrastSet:
+        return self.groups[test]
+
+    def __contains__(self, test: object) -> bool:
+        return test in self.groups
+
+
+def _freeze_weights(weights: Any) -> tuple[tuple[Any, ...], ...]:
+    if weights and isinstance(weights[0], list):
+        return tuple(tuple(row) for row in weights)
+    return (tuple(weights),)
+
+
+def _contrast_keys(node: 'Node', columns: Sequence[Column]) -> tuple[_ContrastKey, ...]:
+    keys: list[_ContrastKey] = [
+        (
+            contrast.Name,
+            tuple(contrast.ConditionList),
+            _freeze_weights(contrast.Weights),
+            contrast.Test,
+        )
+        for contrast in node.Contrasts or ()
+    ]
+    dummy = node.DummyContrasts
+    if dummy is not None:
+        conditions = columns if dummy.Contrasts is None else expand(dummy.Contrasts, columns)
+        keys.extend(
+            (INTERCEPT_NAME if cond == 1 else str(cond), (cond,), ((1,),), dummy.Test)
+            for cond in conditions
+        )
+    return tuple(keys)
+
+
+@lru_cache(maxsize=256)
+def _compile(
+    columns: tuple[Column, ...],
+    contrasts: tuple[_ContrastKey, ...],
+) -> CompiledContrasts:
+    index = {col: i for i, col in enumerate(columns)}
+    by_test: dict[str, list[tuple[str, list[int], tuple[tuple[Any, ...], ...]]]] = {}
+    for name, conditions, weights, test in contrasts:
+        missing = [cond for cond in conditions if cond not in index]
+        if missing:
+            raise ValueError(f'Contrast {name!r}: conditions {missing} not found in {columns}')
+        if test == 't' and len(weights) > 1:
+            raise ValueError(f'Contrast {name!r}: t contrasts must have 1D weights')
+        if any(len(row) != len(conditions) for row in weights):
+            raise ValueError(
+                f'Contrast {name!r}: weights do not match ConditionList of length '
+                f'{len(conditions)}'
+            )
+        by_test.setdefault(test, []).append((name, [index[c] for c in conditions], weights))
+
+    groups = {}
+    for test, entries in by_test.items():
+        nrows = sum(len(weights) for _, _, weights in entries)
+        matrix = np.zeros((nrows, len(columns)))
+        slices = []
+        row = 0
+        for _, cols, weights in entries:
+            for weight_row in weights:
+                matrix[row, cols] = [parse_weight(w) for w in weight_row]
+                row += 1
+            slices.append(slice(row - len(weights), row))
+        matrix.flags.writeable = False
+        groups[test] = ContrastSet(
+            test=test,
+            names=tuple(name for name, _, _ in entries),
+            matrix=matrix,
+            slices=tuple(slices),
+        )
+    return CompiledContrasts(columns=columns, groups=groups)
+
+
+def compile_contrasts(
+    node: 'Node',
+    columns: Optional[Sequence[Column]] = None,
+) -> CompiledContrasts:
+    """Compile the contrasts and dummy contrasts of a node into weight matrices.
+
+    Parameters
+    ----------
+    node
+        The node whose contrasts should be compiled.
+    columns
+        Design matrix columns, in order. Defaults to :py:attr:`Model.X
+        <bsmschema.models.Model.X>`; pass the expanded columns if ``X`` contains wildcards.
+        The literal intercept is represented by ``1``.
+
+    Explicit contrasts precede dummy contrasts within each test.
+    Dummy contrasts of the intercept are named :py:data:`INTERCEPT_NAME`.
+    Wildcards in :py:attr:`DummyContrasts.Contrasts <bsmschema.models.DummyContrasts.Contrasts>`
+    are expanded against ``columns`` (see :py:mod:`bsmschema.wildcards`).
+    Results are cached on the content of the node, so identical nodes share the
+    same (read-only) arrays.
+
+    Raises :py:class:`ValueError` if a condition is not a design column, if the shape
+    of the weights does not match the condition list, or if a t contrast has 2D weights.
+    """
+    if columns is None:
+        columns = node.Model.X
+    columns = tuple(columns)
+    return _compile(columns, _contrast_keys(node, columns))
@@ -0,0 +1,401 @@
+"""Reference construction of design matrices for a :py:class:`~bsmschema.models.Node`.
+
+:py:func:`design_matrices` builds the columns of :py:attr:`Model.X
+<bsmschema.models.Model.X>` for each :py:class:`Run` of a subject, from sparse events
+of the form (onset, duration, amplitude) and from dense regressors sampled at each
+scan.
+Variables listed in :py:attr:`HRF.Variables <bsmschema.models.HRF.Variables>` are
+convolved with the named hemodynamic model on a grid oversampled relative to the
+repetition time, and sampled at the start of each scan.
+
+Kernels are cached by (model, repetition time, oversampling, parameters).
+Convolution uses the FFT, and all convolved columns of all runs sharing a repetition
+time are transformed in a single call, so the cost of a subject does not grow with a
+Python loop over columns.
+
+The following HRF models are supported, following the conventions of SPM and nilearn:
+
+* ``"spm"`` and ``"glover"``, each optionally ``"+ derivative"`` or
+  ``"+ derivative + dispersion"``.
+  Derivatives add the columns ``<name>_derivative`` and ``<name>_dispersion``.
+  Parameters ``delay``, ``undershoot``, ``dispersion``, ``u_dispersion``, ``ratio``
+  and ``time_length`` (in seconds) override the shape of the gamma functions.
+* ``"fir"``, with the required parameter ``fir_delays``, in scans.
+  Each variable is replaced by the columns ``<name>_delay_<d>``.
+
+Unknown models raise :py:class:`ValueError`.
+:py:attr:`Model.Formula <bsmschema.models.Model.Formula>` is not interpreted.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> from bsmschema.models import Node
+>>> node = Node.model_validate({
+...     'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...     'Model': {'Type': 'glm', 'X': [1, 'A', 'rot_x'],
+...               'HRF': {'Variables': ['A'], 'Model': 'spm + derivative'}},
+... })
+>>> run = Run(
+...     n_scans=100, tr=2.0,
+...     events={'A': [(10.0, 5.0, 1.0), (110.0, 5.0, 1.0)]},
+...     regressors={'rot_x': np.linspace(0, 1, 100)},
+... )
+>>> design = design_matrix(node, run)
+>>> design.columns
+(1, 'A', 'A_derivative', 'rot_x')
+>>> design.matrix.shape
+(100, 4)
+>>> int(design['A'].argmax())
+9
+"""
+
+import math
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import numpy as np
+
+from .wildcards import expand_node
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import Node
+
+__all__ = [
+    'DesignMatrix',
+    'HRFKernel',
+    'Run',
+    'design_matrices',
+    'design_matrix',
+    'hrf_kernel',
+]
+
+Column = Union[int, str]
+
+OVERSAMPLING = 50
+"""Default number of samples of the convolution grid per repetition time."""
+
+# Default parameters of the difference of gamma functions, in seconds
+_GAMMA_SHAPES = {
+    'spm': {'delay': 6.0, 'undershoot': 16.0, 'dispersion': 1.0, 'u_dispersion': 1.0,
+            'ratio': 0.167},
+    'glover': {'delay': 6.0, 'undershoot': 12.0, 'dispersion': 0.9, 'u_dispersion': 0.9,
+               'ratio': 0.35},
+}  # fmt: skip
+_TIME_LENGTH = 32.0
+# Steps of the finite differences for the time and dispersion derivatives
+_TIME_DELTA = 0.1
+_DISPERSION_DELTA = 0.01
+
+
+@dataclass(frozen=True, eq=False)
+class HRFKernel:
+    """The sampled basis functions of a hemodynamic model."""
+
+    suffixes: tuple[str, ...]
+    """Suffix appended to the name of a convolved variable for each basis function."""
+    matrix: np.ndarray
+    """Read-only basis functions with shape ``(len(suffixes), samples)``, sampled every
+    ``tr / oversampling`` seconds."""
+
+
+@dataclass(frozen=True)
+class Run:
+    """The inputs of the design matrix of one run."""
+
+    n_scans: int
+    """Number of scans."""
+    tr: float
+    """Repetition time, in seconds."""
+    events: Mapping[str, Any] = field(default_factory=dict)
+    """Sparse variables, as arrays of (onset, duration, amplitude) rows, with onsets
+    and durations in seconds from the start of the run.
+    Events with a duration of zero are impulses."""
+    regressors: Mapping[str, Any] = field(default_factory=dict)
+    """Dense variables, as arrays with one value per scan."""
+
+
+@dataclass(frozen=True, eq=False)
+class DesignMatrix:
+    """The design matrix of one run."""
+
+    columns: tuple[Column, ...]
+    """Names of the columns; the intercept is represented by ``1``."""
+    matrix: np.ndarray
+    """Matrix with shape ``(n_scans, len(columns))``."""
+
+    def __getitem__(self, column: Column) -> np.ndarray:
+        """Return the named column."""
+        return self.matrix[:, self.columns.index(column)]
+
+
+def _gamma_pdf(t: np.ndarray, shape: float, scale: float) -> np.ndarray:
+    positive = t > 0
+    tp = np.where(positive, t, 1.0)
+    log_pdf = (shape - 1) * np.log(tp) - tp / scale - math.lgamma(shape) - shape * math.log(scale)
+    return np.where(positive, np.exp(log_pdf), 0.0)
+
+
+def _gamma_difference(
+    dt: float,
+    time_length: float,
+    onset: float,
+    delay: float,
+    undershoot: float,
+    dispersion: float,
+    u_dispersion: float,
+    ratio: float,
+) -> np.ndarray:
+    t = np.arange(round(time_length / dt)) * dt - onset
+    hrf = _gamma_pdf(t, delay / dispersion, dispersion) - ratio * _gamma_pdf(
+        t, undershoot / u_dispersion, u_dispersion
+    )
+    hrf /= hrf.sum()
+    return hrf
+
+
+def _gamma_kernel(
+    family: str, terms: list[str], dt: float, parameters: dict[str, Any]
+) -> HRFKernel:
+    if terms not in ([], ['derivative'], ['derivative', 'dispersion']):
+        raise ValueError(f'Unknown HRF model {" + ".join([family, *terms])!r}')
+    shape = dict(_GAMMA_SHAPES[family])
+    time_length = _TIME_LENGTH
+    for name, value in parameters.items():
+        if name == 'time_length':
+            time_length = float(value)
+        elif name in shape:
+            shape[name] = float(value)
+        else:
+            raise ValueError(f'Unknown parameter {name!r} for HRF model {family!r}')
+    hrf = _gamma_difference(dt, time_length, 0.0, **shape)
+    basis = [hrf]
+    suffixes = ['']
+    if terms[:1] == ['derivative']:
+        shifted = _gamma_difference(dt, time_length, _TIME_DELTA, **shape)
+        basis.append((hrf - shifted) / _TIME_DELTA)
+        suffixes.append('_derivative')
+    if terms[1:] == ['dispersion']:
+        shape['dispersion'] += _DISPERSION_DELTA
+        dispersed = _gamma_difference(dt, time_length, 0.0, **shape)
+        basis.append((hrf - dispersed) / _DISPERSION_DELTA)
+        suffixes.append('_dispersion')
+    return HRFKernel(suffixes=tuple(suffixes), matrix=np.stack(basis))
+
+
+def _fir_kernel(oversampling: int, parameters: dict[str, Any]) -> HRFKernel:
+    if set(parameters) != {'fir_delays'}:
+        raise ValueError("HRF model 'fir' requires exactly the parameter 'fir_delays'")
+    delays = [int(delay) for delay in parameters['fir_delays']]
+    if not delays or min(delays) < 0:
+        raise ValueError('fir_delays must be a non-empty list of non-negative integers')
+    # Each delay averages the signal over one scan, starting ``delay`` scans later
+    matrix = np.zeros((len(delays), (max(delays) + 1) * oversampling))
+    for row, delay in enumerate(delays):
+        matrix[row, delay * oversampling : (delay + 1) * oversampling] = 1 / oversampling
+    return HRFKernel(suffixes=tuple(f'_delay_{delay}' for delay in delays), matrix=matrix)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _model_name(model: str) -> str:
+    return ' + '.join(term.strip() for term in model.lower().split('+'))
+
+
+@lru_cache(maxsize=256)
+def _kernel(
+    model: str, tr: float, oversampling: int, parameters: tuple[tuple[str, Any], ...]
+) -> HRFKernel:
+    family, *terms = model.split(' + ')
+    params = dict(parameters)
+    if family == 'fir' and not terms:
+        kernel = _fir_kernel(oversampling, params)
+    elif family in _GAMMA_SHAPES:
+        kernel = _gamma_kernel(family, terms, tr / oversampling, params)
+    else:
+        raise ValueError(f'Unknown HRF model {model!r}')
+    kernel.matrix.flags.writeable = False
+    return kernel
+
+
+def hrf_kernel(
+    model: str,
+    tr: float,
+    oversampling: int = OVERSAMPLING,
+    parameters: Optional[Mapping[str, Any]] = None,
+) -> HRFKernel:
+    """Return the (cached) basis functions of a hemodynamic model.
+
+    >>> kernel = hrf_kernel('glover + derivative + dispersion', tr=2.0)
+    >>> kernel.suffixes
+    ('', '_derivative', '_dispersion')
+    >>> kernel.matrix.shape
+    (3, 800)
+    >>> hrf_kernel('fir', tr=2.0, parameters={'fir_delays': [0, 1, 2]}).suffixes
+    ('_delay_0', '_delay_1', '_delay_2')
+
+    Raises :py:class:`ValueError` for unknown models or parameters.
+    """
+    return _kernel(_model_name(model), float(tr), oversampling, _freeze(dict(parameters or {})))
+
+
+@lru_cache(maxsize=256)
+def _kernel_spectrum(
+    model: str,
+    tr: float,
+    oversampling: int,
+    parameters: tuple[tuple[str, Any], ...],
+    size: int,
+) -> np.ndarray:
+    spectrum = np.fft.rfft(_kernel(model, tr, oversampling, parameters).matrix, size)
+    spectrum.flags.writeable = False
+    return spectrum
+
+
+def _fast_length(n: int) -> int:
+    """The smallest 5-smooth integer not less than ``n``, for which FFTs are fast."""
+    best = 1 << max(n - 1, 0).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            # Smallest multiple of p35 by a power of two that is not less than n
+            best = min(best, p35 << (-(-n // p35) - 1).bit_length())
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def _boxcar(events: Any, size: int, dt: float, name: str) -> np.ndarray:
+    """Sample sparse events on a grid of ``size`` points spaced ``dt`` seconds apart."""
+    table = np.asarray(events, dtype=float).reshape(-1, 3) if len(events) else np.zeros((0, 3))
+    onset, duration, amplitude = table.T
+    if (duration < 0).any():
+        raise ValueError(f'Variable {name!r}: durations must not be negative')
+    start = np.rint(onset / dt).astype(np.intp)
+    # Zero-duration events are impulses of one sample
+    stop = np.maximum(np.rint((onset + duration) / dt).astype(np.intp), start + 1)
+    keep = (start >= 0) & (start < size)
+    signal = np.zeros(size + 1)
+    np.add.at(signal, start[keep], amplitude[keep])
+    np.add.at(signal, np.minimum(stop[keep], size), -amplitude[keep])
+    return np.cumsum(signal[:size])
+
+
+def _dense(values: Any, n_scans: int, name: str) -> np.ndarray:
+    array = np.asarray(values, dtype=float)
+    if array.shape != (n_scans,):
+        raise ValueError(
+            f'Variable {name!r}: expected {n_scans} values, one per scan, got shape {array.shape}'
+        )
+    return array
+
+
+def design_matrices(
+    node: 'Node',
+    runs: Sequence[Run],
+    oversampling: int = OVERSAMPLING,
+) -> list[DesignMatrix]:
+    """Build the design matrices of several runs, such as all runs of a subject.
+
+    The columns of :py:attr:`Model.X <bsmschema.models.Model.X>` are expanded against the
+    variables of each run (see :py:mod:`bsmschema.wildcards`).
+    Variables in :py:attr:`HRF.Variables <bsmschema.models.HRF.Variables>` are sampled on
+    a grid with ``oversampling`` points per scan and convolved with the basis functions
+    of :py:func:`hrf_kernel`; dense variables are held constant between scans.
+    Other sparse variables are sampled at the start of each scan without convolution.
+
+    Raises :py:class:`ValueError` if a variable of ``X`` is missing from a run or
+    defined as both an event and a regressor, if the shape of a variable is invalid,
+    or if the HRF model is unknown.
+    """
+    model = node.Model
+    hrf = model.HRF
+    hrf_model = _model_name(hrf.Model) if hrf is not None else ''
+    parameters = _freeze(dict(hrf.Parameters or {})) if hrf is not None else ()
+
+    # Per run, the columns to fill in, with None for columns pending convolution
+    layouts: list[tuple[list[Column], list[Optional[np.ndarray]]]] = []
+    # Signals to convolve, by repetition time, as (run, position, oversampled signal)
+    pending: dict[float, list[tuple[int, int, np.ndarray]]] = {}
+    for index, run in enumerate(runs):
+        both = set(run.events) & set(run.regressors)
+        if both:
+            raise ValueError(f'Variables {sorted(both)} are both events and regressors')
+        expanded = expand_node(node, [*run.events, *run.regressors])
+        convolved = set(expanded.hrf_variables)
+        tr = float(run.tr)
+        size = run.n_scans * oversampling
+        names: list[Column] = []
+        values: list[Optional[np.ndarray]] = []
+        for column in expanded.columns:
+            names.append(column)
+            if not isinstance(column, str):
+                values.append(np.full(run.n_scans, float(column)))
+            elif column in convolved:
+                if column in run.events:
+                    signal = _boxcar(run.events[column], size, tr / oversampling, column)
+                else:
+                    signal = np.repeat(
+                        _dense(run.regressors[column], run.n_scans, column), oversampling
+                    )
+                pending.setdefault(tr, []).append((index, len(values), signal))
+                values.append(None)
+            elif column in run.events:
+                signal = _boxcar(run.events[column], size, tr / oversampling, column)
+                values.append(signal[::oversampling])
+            else:
+                values.append(_dense(run.regressors[column], run.n_scans, column))
+        layouts.append((names, values))
+
+    # Convolved columns, by (run, position), with one column per basis function
+    outputs: dict[tuple[int, int], np.ndarray] = {}
+    suffixes: tuple[str, ...] = ()
+    for tr, signals in pending.items():
+        kernel = _kernel(hrf_model, tr, oversampling, parameters)
+        suffixes = kernel.suffixes
+        length = max(len(signal) for _, _, signal in signals)
+        size = _fast_length(length + kernel.matrix.shape[1] - 1)
+        stacked = np.zeros((len(signals), length))
+        for row, (_, _, signal) in enumerate(signals):
+            stacked[row, : len(signal)] = signal
+        spectrum = np.fft.rfft(stacked, size)[:, None, :] * _kernel_spectrum(
+            hrf_model, tr, oversampling, parameters, size
+        )
+        # Shape (signals, basis functions, scans), sampled at the start of each scan
+        sampled = np.fft.irfft(spectrum, size)[:, :, :length:oversampling]
+        for row, (index, position, signal) in enumerate(signals):
+            outputs[index, position] = sampled[row, :, : len(signal) // oversampling].T
+
+    results = []
+    for index, (names, values) in enumerate(layouts):
+        columns: list[Column] = []
+        blocks: list[np.ndarray] = []
+        for position, (name, value) in enumerate(zip(names, values)):
+            if value is None:
+                columns.extend(f'{name}{suffix}' for suffix in suffixes)
+                blocks.append(outputs[index, position])
+            else:
+                columns.append(name)
+                blocks.append(value[:, None])
+        n_scans = runs[index].n_scans
+        matrix = np.hstack(blocks) if blocks else np.zeros((n_scans, 0))
+        results.append(DesignMatrix(columns=tuple(columns), matrix=matrix))
+    return results
+
+
+def design_matrix(node: 'Node', run: Run, oversampling: int = OVERSAMPLING) -> DesignMatrix:
+    """Build the design matrix of a single run.
+
+    See :py:func:`design_matrices`, which processes several runs at once.
+    """
+    return design_matrices(node, [run], oversampling)[0]
@@ -0,0 +1,218 @@
+"""Incremental export of JSON schemas.
+
+:py:func:`export_schemas` writes the JSON schema of each class in
+:py:data:`bsmschema.models.__all__` to ``<Class>.json``, along with the standalone
+validator of :py:mod:`bsmschema.codegen` and, optionally, a bundled schema of all
+classes with shared ``$defs``, as ``bundle.json`` and minified as ``bundle.min.json``.
+
+The schemas of all classes are generated in a single pass, from which the schema of each
+class is extracted with the definitions it references.
+Files whose content is unchanged are not written, so their modification times are
+preserved for build tools that depend on them.
+The SHA-256 digest of each file is recorded in ``manifest.json``, which also serves as a
+cache key for downstream builds; files recorded there that are no longer produced,
+such as the bundle when ``bundle=False`` is given, are removed.
+Unless ``bundle`` is given, the bundle is written if the manifest records one, so that
+a directory is exported as it was last exported.
+With ``check=True``, nothing is written, and the result lists the files that are
+out of date, as an export with the same arguments would change them.
+
+Examples
+--------
+
+>>> import tempfile
+>>> with tempfile.TemporaryDirectory() as schemadir:
+...     first = export_schemas(schemadir, bundle=True)
+...     second = export_schemas(schemadir, bundle=True)
+...     check = export_schemas(schemadir, check=True)
+...     unbundled = export_schemas(schemadir, bundle=False)
+>>> 'bundle.min.json' in first.changed, second.changed
+(True, [])
+>>> check.current
+True
+>>> unbundled.removed
+['bundle.json', 'bundle.min.json']
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional, Union
+
+__all__ = [
+    'ExportResult',
+    'bundled_schema',
+    'class_schemas',
+    'export_schemas',
+]
+
+MANIFEST = 'manifest.json'
+BUNDLE = 'bundle.json'
+BUNDLE_MINIFIED = 'bundle.min.json'
+VALIDATOR = 'BIDSStatsModel_validator.py'
+
+Schema = dict[str, Any]
+
+
+@dataclass(frozen=True)
+class ExportResult:
+    """Files changed by :py:func:`export_schemas`, or that would be in check mode."""
+
+    changed: list[str] = field(default_factory=list)
+    """Files written, because they were missing or out of date."""
+    unchanged: list[str] = field(default_factory=list)
+    """Files already up to date."""
+    removed: list[str] = field(default_factory=list)
+    """Files of a previous export that are no longer produced."""
+
+    @property
+    def current(self) -> bool:
+        """Whether all files were already up to date."""
+        return not (self.changed or self.removed)
+
+
+def bundled_schema() -> Schema:
+    """A JSON schema for :py:class:`~bsmschema.models.BIDSStatsModel`, with the schemas of
+    all classes of :py:mod:`bsmschema.models` in its ``$defs``.
+    """
+    from pydantic.json_schema import models_json_schema
+
+    from . import models
+
+    classes = [getattr(models, name) for name in models.__all__]
+    _, schema = models_json_schema([(cls, 'validation') for cls in classes])
+    return {
+        'title': 'BIDS Stats Models',
+        '$ref': '#/$defs/BIDSStatsModel',
+        '$defs': schema['$defs'],
+    }
+
+
+def _refs(schema: Any) -> set[str]:
+    if isinstance(schema, dict):
+        found = {schema['$ref']} if isinstance(schema.get('$ref'), str) else set()
+        for value in schema.values():
+            found |= _refs(value)
+        return found
+    if isinstance(schema, list):
+        return set().union(*map(_refs, schema))
+    return set()
+
+
+def class_schemas(bundle: Schema) -> dict[str, Schema]:
+    """The schema of each class of a bundle, as from ``model_json_schema()``."""
+    from . import models
+
+    defs = bundle['$defs']
+    prefix = '#/$defs/'
+    schemas = {}
+    for name in models.__all__:
+        referenced: set[str] = set()
+        pending = [name]
+        while pending:
+            for ref in _refs(defs[pending.pop()]):
+                target = ref[len(prefix) :]
+                if target not in referenced:
+                    referenced.add(target)
+                    pending.append(target)
+        if name in referenced:
+            # Recursive classes refer to themselves through $defs
+            schemas[name] = getattr(models, name).model_json_schema()
+            continue
+        schema = {'$defs': {ref: defs[ref] for ref in sorted(referenced)}} if referenced else {}
+        schema.update(defs[name])
+        schemas[name] = schema
+    return schemas
+
+
+def _render(bundle: bool) -> dict[str, bytes]:
+    from .codegen import generate_validator
+
+    schema = bundled_schema()
+    schemas = class_schemas(schema)
+    files = {
+        f'{name}.json': json.dumps(value, indent=2).encode() for name, value in schemas.items()
+    }
+    files[VALIDATOR] = generate_validator(schemas['BIDSStatsModel']).encode()
+    if bundle:
+        files[BUNDLE] = json.dumps(schema, indent=2).encode()
+        files[BUNDLE_MINIFIED] = json.dumps(schema, separators=(',', ':')).encode()
+    return files
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_digest(path: Path) -> Union[str, None]:
+    try:
+        return _digest(path.read_bytes())
+    except OSError:
+        return None
+
+
+def _write(path: Path, data: bytes) -> None:
+    """Replace a file atomically, so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def export_schemas(
+    schemadir: Union[str, os.PathLike[str]],
+    bundle: Optional[bool] = None,
+    check: bool = False,
+) -> ExportResult:
+    """Write JSON schemas and a standalone validator to a directory, skipping unchanged files.
+
+    With ``check``, nothing is written, and the result lists the files that would change.
+    If ``bundle`` is not given, the bundle is written if the manifest records it.
+    """
+    schemadir = Path(schemadir)
+    try:
+        previous = json.loads((schemadir / MANIFEST).read_bytes())
+        if not isinstance(previous, dict):
+            previous = {}
+    except (OSError, ValueError):
+        previous = {}
+    if bundle is None:
+        bundle = BUNDLE in previous
+    files = _render(bundle)
+    digests = {name: _digest(data) for name, data in files.items()}
+
+    result = ExportResult()
+    for name, data in files.items():
+        path = schemadir / name
+        # Files are compared by content, so that files edited by hand are restored
+        if _file_digest(path) == digests[name]:
+            result.unchanged.append(name)
+            continue
+        result.changed.append(name)
+        if not check:
+            schemadir.mkdir(parents=True, exist_ok=True)
+            _write(path, data)
+    for name in sorted(previous.keys() - files.keys()):
+        path = schemadir / name
+        # Only remove files of this directory
+        if path.name == name and path.is_file():
+            result.removed.append(name)
+            if not check:
+                path.unlink()
+
+    manifest = json.dumps(digests, indent=2, sort_keys=True).encode()
+    if _file_digest(schemadir / MANIFEST) == _digest(manifest):
+        result.unchanged.append(MANIFEST)
+    else:
+        result.changed.append(MANIFEST)
+        if not check:
+            schemadir.mkdir(parents=True, exist_ok=True)
+            _write(schemadir / MANIFEST, manifest)
+    return result
@@ -0,0 +1,249 @@
+r"""Evaluation of :py:data:`~bsmschema.models.Filter`\s against columnar metadata tables.
+
+A filter, as used by :py:attr:`Edge.Filter <bsmschema.models.Edge.Filter>`,
+:py:attr:`BIDSStatsModel.Input <bsmschema.models.BIDSStatsModel.Input>` and
+:py:attr:`Options.Mask <bsmschema.models.Options.Mask>`, maps entities to lists of
+accepted values.
+A row passes if, for every entity, its value is one of the accepted values.
+
+:py:class:`IndexedTable` wraps a columnar table (a mapping of column names to arrays,
+a :py:class:`pandas.DataFrame` or a :py:class:`pyarrow.Table`) and indexes each
+entity column the first time a filter refers to it, so that all filters applied to
+the same table share the indexes.
+:py:func:`compile_filter` turns a filter into a :py:class:`CompiledFilter` that
+returns the indices of the passing rows, rather than copies of the rows.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> import numpy as np
+>>> table = IndexedTable({
+...     'subject': np.array(['01', '01', '02', '02', '03', '03']),
+...     'contrast': np.array(['A', 'B', 'A', 'B', 'A', 'B']),
+... })
+>>> select(table, {'contrast': ['A']})
+array([0, 2, 4])
+>>> select(table, {'contrast': ['B'], 'subject': ['02', '03']})
+array([3, 5])
+>>> select(table, {'run': [1]})
+array([], dtype=int64)
+"""
+
+from collections.abc import Hashable, Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+import numpy as np
+
+__all__ = [
+    'ColumnIndex',
+    'CompiledFilter',
+    'IndexedTable',
+    'compile_filter',
+    'select',
+]
+
+# (entity, accepted values), with entities sorted
+_Term = tuple[str, tuple[Any, ...]]
+
+
+class ColumnIndex:
+    """Index of the distinct values of a single column.
+
+    Each row is assigned the code of its value, and rows are grouped by code,
+    so that the rows holding a set of values can be found without scanning the column.
+    """
+
+    values: list[Any]
+    """Distinct values of the column."""
+    codes: np.ndarray
+    """Position of each row's value in :py:attr:`values`."""
+
+    def __init__(self, column: Any) -> None:
+        array = np.asarray(column)
+        try:
+            uniques, codes = np.unique(array, return_inverse=True)
+        except TypeError:
+            # Mixed object columns (e.g., strings and None) cannot be sorted
+            positions: dict[Any, int] = {}
+            codes = np.fromiter(
+                (positions.setdefault(value, len(positions)) for value in array.tolist()),
+                dtype=np.intp,
+                count=len(array),
+            )
+            self.values = list(positions)
+        else:
+            self.values = uniques.tolist()
+        self.codes = np.asarray(codes, dtype=np.intp).reshape(-1)
+        self._positions = {value: i for i, value in enumerate(self.values)}
+        self._order = np.argsort(self.codes, kind='stable')
+        self._bounds = np.searchsorted(self.codes[self._order], np.arange(len(self.values) + 1))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _lookup(self, values: Iterable[Any]) -> list[int]:
+        return sorted(
+            {
+                self._positions[value]
+                for value in values
+                if isinstance(value, Hashable) and value in self._positions
+            }
+        )
+
+    def count(self, values: Iterable[Any]) -> int:
+        """Number of rows holding any of ``values``."""
+        bounds = self._bounds
+        return sum(int(bounds[i + 1] - bounds[i]) for i in self._lookup(values))
+
+    def rows(self, values: Iterable[Any]) -> np.ndarray:
+        """Indices of the rows holding any of ``values``, in ascending order."""
+        groups = [self._order[self._bounds[i] : self._bounds[i + 1]] for i in self._lookup(values)]
+        if not groups:
+            return np.empty(0, dtype=np.intp)
+        if len(groups) == 1:
+            return groups[0]
+        return np.sort(np.concatenate(groups))
+
+    def mask(self, values: Iterable[Any], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask of the rows (or of ``rows``) holding any of ``values``."""
+        accept = np.zeros(len(self.values), dtype=bool)
+        accept[self._lookup(values)] = True
+        mask: np.ndarray = accept[self.codes if rows is None else self.codes[rows]]
+        return mask
+
+
+class IndexedTable:
+    """A columnar metadata table with lazily built, reusable column indexes.
+
+    Parameters
+    ----------
+    columns
+        Any object that returns an array-like column for ``columns[name]``, such as
+        a ``dict`` of NumPy arrays, a :py:class:`pandas.DataFrame` or a
+        :py:class:`pyarrow.Table`.
+        Columns are converted with :py:func:`numpy.asarray` when first indexed.
+    num_rows
+        Number of rows. By default, the length of the first column.
+    """
+
+    def __init__(self, columns: Any, num_rows: Optional[int] = None) -> None:
+        self.columns = columns
+        names = getattr(columns, 'column_names', None)
+        self.names: list[str] = list(columns if names is None else names)
+        if num_rows is None:
+            num_rows = len(np.asarray(columns[self.names[0]])) if self.names else 0
+        self.num_rows = num_rows
+        self._indexes: dict[str, ColumnIndex] = {}
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.names
+
+    def index(self, name: str) -> Optional[ColumnIndex]:
+        """Return the index of a column, building it on first use.
+
+        Returns ``None`` if the table has no such column.
+        Raises :py:class:`ValueError` if the column length differs from the table.
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            if name not in self.names:
+                return None
+            index = ColumnIndex(self.columns[name])
+            if len(index) != self.num_rows:
+                raise ValueError(
+                    f'Column {name!r} has {len(index)} rows; expected {self.num_rows}'
+                )
+            self._indexes[name] = index
+        return index
+
+
+@dataclass(frozen=True)
+class CompiledFilter:
+    """A filter compiled to a conjunction of per-entity terms.
+
+    Calling the filter on an :py:class:`IndexedTable` returns the indices of passing rows.
+    """
+
+    terms: tuple[_Term, ...]
+    """Pairs of entity and accepted values, sorted by entity."""
+
+    def __call__(self, table: IndexedTable, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Indices of the rows of ``table`` (or of ``rows``) that pass the filter.
+
+        The most selective term is resolved through its index, and the remaining
+        terms are only checked on the rows it selects.
+        An entity that is not a column of the table matches no rows.
+        """
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.intp)
+        if not self.terms:
+            return np.arange(len(table)) if rows is None else rows
+
+        indexes = []
+        for entity, values in self.terms:
+            index = table.index(entity)
+            if index is None:
+                return np.empty(0, dtype=np.intp)
+            indexes.append((index, values))
+
+        if rows is None:
+            indexes.sort(key=lambda term: term[0].count(term[1]))
+            (index, values), *indexes = indexes
+            rows = index.rows(values)
+        for index, values in indexes:
+            if not len(rows):
+                break
+            rows = rows[index.mask(values, rows)]
+        return rows
+
+    def mask(self, table: IndexedTable) -> np.ndarray:
+        """Boolean mask of the rows of ``table`` that pass the filter."""
+        mask = np.zeros(len(table), dtype=bool)
+        mask[self(table)] = True
+        return mask
+
+
+def _freeze(value: Any) -> Any:
+    """A hashable equivalent of a JSON value: lists become tuples, and objects tuples of items."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+@lru_cache(maxsize=1024)
+def _compile(terms: tuple[_Term, ...]) -> CompiledFilter:
+    return CompiledFilter(terms)
+
+
+def compile_filter(filter: Optional[Mapping[str, Sequence[Any]]]) -> CompiledFilter:
+    """Compile a filter, such as :py:attr:`Edge.Filter <bsmschema.models.Edge.Filter>`.
+
+    ``None`` and ``{}`` compile to a filter that passes all rows.
+    Compiled filters are cached on the content of the filter.
+    """
+    if not filter:
+        return _compile(())
+    return _compile(tuple(sorted((entity, _freeze(values)) for entity, values in filter.items())))
+
+
+def select(
+    table: IndexedTable,
+    filter: Optional[Mapping[str, Sequence[Any]]],
+    rows: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Indices of the rows of ``table`` (or of ``rows``) that pass ``filter``.
+
+    Pass the result of one filter as ``rows`` to apply several filters in sequence,
+    for example :py:attr:`BIDSStatsModel.Input <bsmschema.models.BIDSStatsModel.Input>`
+    followed by :py:attr:`Edge.Filter <bsmschema.models.Edge.Filter>`.
+    """
+    return compile_filter(filter)(table, rows)
@@ -0,0 +1,230 @@
+"""Structural fingerprints of models, nodes and contrasts.
+
+A fingerprint is a SHA-256 digest of a canonical form of an object, so that objects
+that specify the same analysis have the same fingerprint, however they are written.
+The canonical form:
+
+* omits ``Description`` fields and absent (``null``) fields;
+* omits the :py:attr:`~bsmschema.models.Node.Name` of nodes, which only serves to
+  connect them by edges;
+* sorts lists whose order has no meaning: :py:attr:`~bsmschema.models.Node.GroupBy`,
+  :py:attr:`~bsmschema.models.Node.Contrasts` (by name),
+  :py:attr:`DummyContrasts.Contrasts <bsmschema.models.DummyContrasts.Contrasts>`,
+  :py:attr:`HRF.Variables <bsmschema.models.HRF.Variables>` and the values of filters;
+* pairs :py:attr:`Contrast.ConditionList <bsmschema.models.Contrast.ConditionList>` with
+  the columns of :py:attr:`Contrast.Weights <bsmschema.models.Contrast.Weights>` and sorts
+  them by condition, sorting the rows of 2D weights as well;
+* converts weights to floats, so that ``1``, ``1.0`` and ``"1/1"`` are the same weight.
+
+Ordered lists, such as :py:attr:`Model.X <bsmschema.models.Model.X>`, which determines
+the order of design matrix columns, and :py:attr:`Transformations.Instructions
+<bsmschema.models.Transformations.Instructions>`, are kept in order.
+
+The *subtree* fingerprint of a node also covers every node upstream of it, the filters
+of the edges between them, and the model ``Input`` for root nodes.
+Nodes with the same subtree fingerprint receive the same inputs and perform the same
+computations, so their results may be shared between models.
+The fingerprint of a :py:class:`~bsmschema.models.BIDSStatsModel` combines the subtree
+fingerprints of its leaf nodes, so it is independent of node names and their order.
+
+Examples
+--------
+
+>>> from bsmschema.models import BIDSStatsModel
+>>> def make_model(name, weights):
+...     return BIDSStatsModel.model_validate({
+...         'Name': name,
+...         'BIDSModelVersion': '1.0.0',
+...         'Nodes': [
+...             {'Level': 'Run', 'Name': f'{name}_run', 'GroupBy': ['run', 'subject'],
+...              'Model': {'Type': 'glm', 'X': [1, 'A', 'B']},
+...              'DummyContrasts': {'Contrasts': ['A', 'B'], 'Test': 't'}},
+...             {'Level': 'Subject', 'Name': 'subject', 'GroupBy': ['subject', 'contrast'],
+...              'Model': {'Type': 'meta', 'X': [1]},
+...              'Contrasts': [{'Name': 'c', 'ConditionList': [1],
+...                             'Weights': weights, 'Test': 't'}]},
+...         ],
+...     })
+>>> first, second = make_model('first', [1]), make_model('second', ['2/2'])
+>>> fingerprint(first) == fingerprint(second)
+True
+>>> third = make_model('third', [-1])
+>>> fingerprint(first) == fingerprint(third)
+False
+>>> subtree_fingerprints(first)['first_run'] == subtree_fingerprints(third)['third_run']
+True
+"""
+
+import hashlib
+import json
+from collections.abc import Iterable
+from fractions import Fraction
+from typing import TYPE_CHECKING, Any, Union
+
+from pydantic import BaseModel
+
+from .lazy import RawJSON
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel, Contrast
+
+__all__ = [
+    'canonical',
+    'duplicate_subtrees',
+    'fingerprint',
+    'subtree_fingerprint',
+    'subtree_fingerprints',
+]
+
+# Fields that do not affect the analysis
+_IGNORED = {'Description'}
+_IGNORED_BY_MODEL = {'Node': {'Name'}}
+# Lists of names whose order has no meaning
+_UNORDERED = {
+    ('Node', 'GroupBy'),
+    ('DummyContrasts', 'Contrasts'),
+    ('HRF', 'Variables'),
+}
+# Fields holding filters, whose lists of values have no order
+_FILTERS = {
+    ('BIDSStatsModel', 'Input'),
+    ('Edge', 'Filter'),
+    ('Options', 'Mask'),
+}
+
+
+def _digest(value: Any) -> str:
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _sort_key(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def _filter(filter: dict[str, list[Any]]) -> dict[str, list[Any]]:
+    return {key: sorted(canonical(values), key=_sort_key) for key, values in filter.items()}
+
+
+def _weight(value: Union[int, float, str]) -> Union[float, str]:
+    try:
+        weight = float(Fraction(value)) if isinstance(value, str) else float(value)
+    except (ValueError, ZeroDivisionError):
+        # Invalid weights are compared as written
+        return value
+    # Normalize negative zero
+    return weight + 0.0
+
+
+def _terms(contrast: 'Contrast') -> list[Any]:
+    """Pair conditions with their columns of weights, in sorted order."""
+    weights = contrast.Weights
+    if weights and isinstance(weights[0], list):
+        rows = [[_weight(w) for w in row] for row in weights]
+        if contrast.ConditionList and all(len(row) == len(contrast.ConditionList) for row in rows):
+            pairs = sorted(zip(contrast.ConditionList, zip(*rows)), key=_sort_key)
+            conditions, columns = zip(*pairs)
+            return [list(conditions), sorted(map(list, zip(*columns)), key=_sort_key)]
+        return [contrast.ConditionList, rows]
+    flat = [_weight(w) for w in weights]  # type: ignore[arg-type]
+    if len(flat) == len(contrast.ConditionList):
+        return [sorted(map(list, zip(contrast.ConditionList, flat)), key=_sort_key)]
+    return [contrast.ConditionList, flat]
+
+
+def canonical(obj: Any) -> Any:
+    """The canonical form of a model object, as JSON-compatible values."""
+    if isinstance(obj, RawJSON):
+        return obj.value
+    if isinstance(obj, list):
+        return [canonical(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: canonical(value) for key, value in obj.items()}
+    if not isinstance(obj, BaseModel):
+        return obj
+
+    cls = type(obj).__name__
+    ignored = _IGNORED | _IGNORED_BY_MODEL.get(cls, set())
+    result = {}
+    for name in type(obj).model_fields:
+        value = getattr(obj, name)
+        if value is None or name in ignored:
+            continue
+        if cls == 'Contrast' and name == 'ConditionList':
+            result['Terms'] = _terms(obj)  # type: ignore[arg-type]
+            continue
+        if cls == 'Contrast' and name == 'Weights':
+            continue
+        value = canonical(value)
+        if (cls, name) in _UNORDERED:
+            value = sorted(value, key=_sort_key)
+        elif (cls, name) in _FILTERS:
+            value = _filter(value)
+        elif cls == 'Node' and name == 'Contrasts':
+            value = sorted(value, key=lambda contrast: contrast['Name'])
+        result[name] = value
+    return result
+
+
+def fingerprint(obj: BaseModel) -> str:
+    """Fingerprint of a model object, as a hexadecimal SHA-256 digest.
+
+    Any object of :py:mod:`bsmschema.models` may be fingerprinted.
+    The fingerprint of a :py:class:`~bsmschema.models.BIDSStatsModel` combines the
+    subtree fingerprints of its leaves, so it does not depend on its name.
+    """
+    from .models import BIDSStatsModel
+
+    if isinstance(obj, BIDSStatsModel):
+        subtrees = subtree_fingerprints(obj)
+        leaves = sorted(subtrees[name] for name in obj.graph.leaves)
+        return _digest({'BIDSModelVersion': obj.BIDSModelVersion, 'Leaves': leaves})
+    return _digest([type(obj).__name__, canonical(obj)])
+
+
+def subtree_fingerprints(model: 'BIDSStatsModel') -> dict[str, str]:
+    """Subtree fingerprints of every node of a model, by node name.
+
+    Raises :py:class:`ValueError` if the graph contains a cycle.
+    """
+    graph = model.graph
+    model_input = _filter(model.Input) if model.Input is not None else None
+    subtrees: dict[str, str] = {}
+    for name in graph.topological_order:
+        inputs = sorted(
+            (
+                [subtrees[edge.Source], _filter(edge.Filter) if edge.Filter else None]
+                for edge in graph.incoming[name]
+            ),
+            key=_sort_key,
+        )
+        subtrees[name] = _digest(
+            {
+                'Node': fingerprint(graph.nodes[name]),
+                'Inputs': inputs if inputs else model_input,
+            }
+        )
+    return subtrees
+
+
+def subtree_fingerprint(model: 'BIDSStatsModel', name: str) -> str:
+    """Fingerprint of a node together with all of its upstream nodes."""
+    return subtree_fingerprints(model)[name]
+
+
+def duplicate_subtrees(models: Iterable['BIDSStatsModel']) -> dict[str, list[tuple[int, str]]]:
+    """Find nodes that share subtree fingerprints across a collection of models.
+
+    Returns a map of subtree fingerprints to the ``(model index, node name)`` pairs
+    that have them, for fingerprints occurring more than once.
+    Models whose graphs contain cycles are skipped.
+    """
+    found: dict[str, list[tuple[int, str]]] = {}
+    for index, model in enumerate(models):
+        try:
+            subtrees = subtree_fingerprints(model)
+        except ValueError:
+            continue
+        for name, value in subtrees.items():
+            found.setdefault(value, []).append((index, name))
+    return {key: nodes for key, nodes in found.items() if len(nodes) > 1}
@@ -0,0 +1,310 @@
+"""Reference estimation of ``"glm"`` nodes over many voxels at once.
+
+:py:func:`fit_glm` fits the design matrix of a :py:class:`~bsmschema.models.Node` whose
+:py:attr:`Model.Type <bsmschema.models.Model.Type>` is ``"glm"`` to every voxel of a
+data array, by ordinary least squares, and estimates all contrasts of the node
+(see :py:mod:`bsmschema.contrasts`).
+
+The pseudoinverse of the design and the :math:`(X^T X)^{-1}` terms of each contrast
+are computed once per design.
+Voxels are then processed in chunks sized to fit in the CPU cache, each with a few
+matrix products covering all parameters and all contrasts of a test, on a pool of
+threads.
+Data may be a memory-mapped array, or the path of a ``.npy`` file, which is mapped
+rather than read, so only one chunk per thread is held in memory at a time.
+
+:py:func:`fit_glm_groups` fits many groups, such as the groups of
+:py:attr:`Node.GroupBy <bsmschema.models.Node.GroupBy>`, preparing each distinct
+design matrix once and sharing a single pool across the chunks of all groups.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> from bsmschema.design import DesignMatrix
+>>> from bsmschema.models import Node
+>>> node = Node.model_validate({
+...     'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...     'Model': {'Type': 'glm', 'X': [1, 'A', 'B']},
+...     'Contrasts': [
+...         {'Name': 'AvB', 'ConditionList': ['A', 'B'], 'Weights': [1, -1], 'Test': 't'},
+...         {'Name': 'any', 'ConditionList': ['A', 'B'], 'Weights': [[1, 0], [0, 1]],
+...          'Test': 'F'},
+...     ],
+... })
+>>> rng = np.random.default_rng(0)
+>>> X = np.column_stack([np.ones(100), rng.standard_normal((100, 2))])
+>>> data = X @ [[1.0] * 5, [2.0] * 5, [0.0] * 5] + rng.standard_normal((100, 5))
+>>> result = fit_glm(node, DesignMatrix((1, 'A', 'B'), X), data)
+>>> result.betas.shape, result.dof
+((3, 5), 97.0)
+>>> bool((result['AvB'].stat > 5).all())
+True
+>>> result['any'].effect.shape
+(2, 5)
+"""
+
+import os
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Literal, Optional, Union
+
+import numpy as np
+
+from .contrasts import CompiledContrasts, compile_contrasts
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .design import DesignMatrix
+    from .models import Node
+
+__all__ = [
+    'ContrastEstimate',
+    'GLMResult',
+    'fit_glm',
+    'fit_glm_groups',
+]
+
+CHUNK_BYTES = 1 << 21
+"""Default size of the data of one chunk of voxels, in bytes."""
+
+Data = Union[np.ndarray, str, 'os.PathLike[str]']
+
+
+@dataclass(frozen=True, eq=False)
+class ContrastEstimate:
+    """The estimate of one contrast at every voxel."""
+
+    name: str
+    """Name of the contrast."""
+    test: str
+    """Statistical test: ``"t"``, ``"F"`` or ``"pass"``."""
+    effect: np.ndarray
+    """Contrast of the parameter estimates, with one row per row of weights for contrasts
+    with several rows of weights."""
+    variance: Optional[np.ndarray]
+    """Variance of :py:attr:`effect`, or ``None`` for ``"F"`` contrasts."""
+    stat: Optional[np.ndarray]
+    """t or F statistic, or ``None`` for ``"pass"`` contrasts."""
+
+
+@dataclass(frozen=True, eq=False)
+class GLMResult:
+    """The fit of a design matrix to every voxel of a data array.
+
+    Voxel dimensions follow those of the data, after the first (scan) dimension.
+    Voxels with zero residual variance have infinite or undefined statistics.
+    """
+
+    columns: tuple[Union[int, str], ...]
+    """Columns of the design matrix."""
+    betas: np.ndarray
+    """Parameter estimates, one row per column."""
+    residual_variance: np.ndarray
+    """Unbiased estimate of the variance of the residuals."""
+    dof: float
+    """Residual degrees of freedom: the number of scans minus the rank of the design."""
+    contrasts: dict[str, ContrastEstimate]
+    """Contrast estimates, by name."""
+
+    def __getitem__(self, name: str) -> ContrastEstimate:
+        return self.contrasts[name]
+
+
+class _PreparedDesign:
+    """The terms of a design matrix and its contrasts that do not depend on the data."""
+
+    def __init__(self, design: 'DesignMatrix', compiled: CompiledContrasts) -> None:
+        self.columns = design.columns
+        self.matrix = np.asarray(design.matrix, dtype=float)
+        self.pinv = np.linalg.pinv(self.matrix)
+        # (X'X)^-1, or its pseudoinverse if the design is rank deficient
+        xtx_inv = self.pinv @ self.pinv.T
+        self.dof = float(self.matrix.shape[0] - np.linalg.matrix_rank(self.matrix))
+        self.groups = [group for test, group in compiled.groups.items() if test != 'F']
+        # Variance factor of each row of weights, c (X'X)^-1 c'
+        self.variances = [
+            np.einsum('ij,jk,ik->i', group.matrix, xtx_inv, group.matrix) for group in self.groups
+        ]
+        # F = b'R' (R (X'X)^-1 R')^-1 R b / (q sigma^2), with the middle terms divided by q
+        self.f_tests = [
+            (name, weights, np.linalg.pinv(weights @ xtx_inv @ weights.T) / len(weights))
+            for name, weights in compiled.groups.get('F', ())
+        ]
+        self.compiled = compiled
+
+    def empty_result(self, n_voxels: int) -> GLMResult:
+        contrasts = {}
+        for test, group in self.compiled.groups.items():
+            for name, weights in group:
+                # Contrasts with several rows of weights have one row of effects per row
+                shape = (len(weights), n_voxels) if len(weights) > 1 else (n_voxels,)
+                contrasts[name] = ContrastEstimate(
+                    name=name,
+                    test=test,
+                    effect=np.empty(shape),
+                    variance=None if test == 'F' else np.empty(shape),
+                    stat=None if test == 'pass' else np.empty(n_voxels),
+                )
+        return GLMResult(
+            columns=self.columns,
+            betas=np.empty((len(self.columns), n_voxels)),
+            residual_variance=np.empty(n_voxels),
+            dof=self.dof,
+            contrasts=contrasts,
+        )
+
+    def fit(self, data: np.ndarray, result: GLMResult, voxels: slice) -> None:
+        """Fit a chunk of voxels, writing the estimates into ``result``."""
+        Y = np.asarray(data[:, voxels], dtype=float)
+        betas = self.pinv @ Y
+        residuals = Y - self.matrix @ betas
+        result.betas[:, voxels] = betas
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sigma2 = np.einsum('ij,ij->j', residuals, residuals) / self.dof
+            result.residual_variance[voxels] = sigma2
+            for group, variance in zip(self.groups, self.variances):
+                effects = group.matrix @ betas
+                variances = variance[:, None] * sigma2
+                for name, rows in zip(group.names, group.slices):
+                    estimate = result.contrasts[name]
+                    index = rows if estimate.effect.ndim > 1 else rows.start
+                    estimate.effect[..., voxels] = effects[index]
+                    estimate.variance[..., voxels] = variances[index]  # type: ignore[index]
+                    if estimate.stat is not None:
+                        estimate.stat[voxels] = effects[index] / np.sqrt(variances[index])
+            for name, weights, middle in self.f_tests:
+                effects = weights @ betas
+                estimate = result.contrasts[name]
+                estimate.effect[..., voxels] = effects if len(weights) > 1 else effects[0]
+                stat = np.einsum('iv,ij,jv->v', effects, middle, effects) / sigma2
+                estimate.stat[voxels] = stat  # type: ignore[index]
+
+
+def _reshape(result: GLMResult, shape: tuple[int, ...], order: Literal['C', 'F']) -> GLMResult:
+    """Restore the voxel dimensions of the data, flattened in ``order``."""
+
+    def reshape(array: Any) -> Any:
+        return None if array is None else array.reshape(*array.shape[:-1], *shape, order=order)
+
+    return GLMResult(
+        columns=result.columns,
+        betas=reshape(result.betas),
+        residual_variance=reshape(result.residual_variance),
+        dof=result.dof,
+        contrasts={
+            name: ContrastEstimate(
+                name=name,
+                test=estimate.test,
+                effect=reshape(estimate.effect),
+                variance=reshape(estimate.variance),
+                stat=reshape(estimate.stat),
+            )
+            for name, estimate in result.contrasts.items()
+        },
+    )
+
+
+def _load(data: Data) -> np.ndarray:
+    if isinstance(data, (str, os.PathLike)):
+        return np.load(data, mmap_mode='r')  # type: ignore[no-any-return]
+    return data if isinstance(data, np.ndarray) else np.asarray(data)
+
+
+def _memory_order(array: np.ndarray) -> Literal['C', 'F']:
+    """The order in which the dimensions of an array are flattened without copying.
+
+    Memory maps of NIfTI images, and ``.npy`` files saved from them, are Fortran-ordered.
+    """
+    return 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+
+
+def fit_glm_groups(
+    node: 'Node',
+    designs: Sequence['DesignMatrix'],
+    data: Sequence[Data],
+    chunk_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> list[GLMResult]:
+    """Fit the design matrix of each group to its data, and estimate the contrasts of the node.
+
+    Parameters
+    ----------
+    node
+        A node with :py:attr:`Model.Type <bsmschema.models.Model.Type>` ``"glm"``.
+    designs
+        Design matrix of each group, such as from :py:mod:`bsmschema.design`.
+        Groups with identical designs share a single pseudoinverse.
+    data
+        Data of each group, as arrays with one row per row of the design matrix and
+        any number of voxel dimensions, or paths of ``.npy`` files, which are
+        memory-mapped.
+    chunk_size
+        Number of voxels fitted at once. Defaults to the number of voxels whose data
+        fits in :py:data:`CHUNK_BYTES`.
+    max_workers
+        Number of threads. Defaults to the number of CPUs.
+
+    Raises :py:class:`ValueError` if the node is not a ``"glm"`` node, if the number of
+    rows of the data does not match the design, or if a contrast refers to a column
+    that is not in the design.
+    """
+    if node.Model.Type != 'glm':
+        raise ValueError(f'Node {node.Name!r}: expected a "glm" model, got {node.Model.Type!r}')
+    if len(designs) != len(data):
+        raise ValueError(f'Expected one data array per design, got {len(data)} for {len(designs)}')
+
+    prepared: dict[tuple[Any, ...], _PreparedDesign] = {}
+    results: list[GLMResult] = []
+    arrays: list[np.ndarray] = []
+    tasks: list[tuple[_PreparedDesign, np.ndarray, GLMResult, slice]] = []
+    for design, values in zip(designs, data):
+        matrix = np.ascontiguousarray(design.matrix, dtype=float)
+        key = (design.columns, matrix.shape, matrix.tobytes())
+        if key not in prepared:
+            prepared[key] = _PreparedDesign(design, compile_contrasts(node, design.columns))
+        array = _load(values)
+        if array.shape[0] != matrix.shape[0]:
+            raise ValueError(
+                f'Data with {array.shape[0]} rows do not match a design with '
+                f'{matrix.shape[0]} rows'
+            )
+        flat = array.reshape(array.shape[0], -1, order=_memory_order(array))
+        result = prepared[key].empty_result(flat.shape[1])
+        size = chunk_size or max(1, CHUNK_BYTES // (8 * max(flat.shape[0], 1)))
+        tasks.extend(
+            (prepared[key], flat, result, slice(start, start + size))
+            for start in range(0, flat.shape[1], size)
+        )
+        results.append(result)
+        arrays.append(array)
+
+    def run(task: tuple[_PreparedDesign, np.ndarray, GLMResult, slice]) -> None:
+        task[0].fit(task[1], task[2], task[3])
+
+    if max_workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            run(task)
+    else:
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as pool:
+            # Chunks write disjoint slices of the results, so no locking is needed
+            list(pool.map(run, tasks))
+    return [
+        _reshape(result, array.shape[1:], _memory_order(array))
+        for result, array in zip(results, arrays)
+    ]
+
+
+def fit_glm(
+    node: 'Node',
+    design: 'DesignMatrix',
+    data: Data,
+    chunk_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> GLMResult:
+    """Fit a design matrix to data, and estimate the contrasts of the node.
+
+    See :py:func:`fit_glm_groups`, which fits several groups at once.
+    """
+    return fit_glm_groups(node, [design], [data], chunk_size, max_workers)[0]
@@ -0,0 +1,172 @@
+r"""Graph view of a :py:class:`~bsmschema.models.BIDSStatsModel`.
+
+:py:class:`ModelGraph` resolves the :py:class:`~bsmschema.models.Edge`\s of a model
+into adjacency structures once, so that consumers do not need to repeatedly scan
+the ``Nodes`` and ``Edges`` lists.
+If ``Edges`` is absent, the nodes are chained in the order they appear in ``Nodes``.
+
+A graph is usually obtained through :py:attr:`BIDSStatsModel.graph
+<bsmschema.models.BIDSStatsModel.graph>`, which builds it on first access and caches it.
+
+Examples
+--------
+
+>>> from bsmschema.models import BIDSStatsModel
+>>> model = BIDSStatsModel.model_validate({
+...     'Name': 'example',
+...     'BIDSModelVersion': '1.0.0',
+...     'Nodes': [
+...         {'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...          'Model': {'Type': 'glm', 'X': [1]}},
+...         {'Level': 'Subject', 'Name': 'subject', 'GroupBy': ['subject'],
+...          'Model': {'Type': 'meta', 'X': [1]}},
+...     ],
+... })
+>>> model.graph.implicit
+True
+>>> model.graph.children['run']
+['subject']
+>>> model.graph.topological_order
+['run', 'subject']
+"""
+
+from collections import deque
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel, Edge, Node
+
+__all__ = ['ModelGraph']
+
+
+class ModelGraph:
+    """Indexes and adjacency structures for the nodes and edges of a model.
+
+    All structures are built in a single pass over ``Nodes`` and ``Edges``.
+    Node names are used as keys; ordering follows the order of ``Nodes``.
+    """
+
+    nodes: 'dict[str, Node]'
+    """Map of node names to :py:class:`~bsmschema.models.Node` objects.
+    If names are duplicated, the first node with a name is indexed."""
+    levels: 'dict[str, list[Node]]'
+    """Map of analysis levels to the nodes at that level."""
+    edges: 'list[Edge]'
+    """Edges of the graph, including implicit edges if ``Edges`` is absent."""
+    implicit: bool
+    """Whether :py:attr:`edges` were inferred from the order of ``Nodes``."""
+    children: dict[str, list[str]]
+    """Map of node names to the names of the nodes that receive their outputs."""
+    parents: dict[str, list[str]]
+    """Map of node names to the names of the nodes that provide their inputs."""
+    incoming: 'dict[str, list[Edge]]'
+    """Map of node names to the edges ending at that node."""
+    outgoing: 'dict[str, list[Edge]]'
+    """Map of node names to the edges starting at that node."""
+    duplicates: list[str]
+    """Node names that appear more than once in ``Nodes``."""
+    dangling: 'list[Edge]'
+    """Edges whose source or destination does not name a node.
+    These edges are excluded from the adjacency structures."""
+
+    def __init__(self, model: 'BIDSStatsModel') -> None:
+        from .models import Edge
+
+        self.nodes = {}
+        self.levels = {}
+        self.duplicates = []
+        for node in model.Nodes:
+            if node.Name in self.nodes:
+                self.duplicates.append(node.Name)
+                continue
+            self.nodes[node.Name] = node
+            self.levels.setdefault(node.Level, []).append(node)
+
+        self.implicit = model.Edges is None
+        if model.Edges is None:
+            names = list(self.nodes)
+            self.edges = [Edge(Source=src, Destination=dst) for src, dst in zip(names, names[1:])]
+        else:
+            self.edges = list(model.Edges)
+
+        self.children = {name: [] for name in self.nodes}
+        self.parents = {name: [] for name in self.nodes}
+        self.incoming = {name: [] for name in self.nodes}
+        self.outgoing = {name: [] for name in self.nodes}
+        self.dangling = []
+        for edge in self.edges:
+            if edge.Source not in self.nodes or edge.Destination not in self.nodes:
+                self.dangling.append(edge)
+                continue
+            self.children[edge.Source].append(edge.Destination)
+            self.parents[edge.Destination].append(edge.Source)
+            self.outgoing[edge.Source].append(edge)
+            self.incoming[edge.Destination].append(edge)
+
+        self._order, self._cyclic = self._sort()
+
+    def _sort(self) -> tuple[list[str], list[str]]:
+        # Kahn's algorithm; nodes that are never freed lie on or downstream of a cycle
+        indegree = {name: len(parents) for name, parents in self.parents.items()}
+        queue = deque(name for name, degree in indegree.items() if degree == 0)
+        order = []
+        while queue:
+            name = queue.popleft()
+            order.append(name)
+            for child in self.children[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+        cyclic = [name for name, degree in indegree.items() if degree > 0]
+        return order, cyclic
+
+    @property
+    def roots(self) -> list[str]:
+        """Names of nodes with no incoming edges."""
+        return [name for name, parents in self.parents.items() if not parents]
+
+    @property
+    def leaves(self) -> list[str]:
+        """Names of nodes with no outgoing edges."""
+        return [name for name, children in self.children.items() if not children]
+
+    @property
+    def cyclic(self) -> list[str]:
+        """Names of nodes that lie on, or can only be reached through, a cycle."""
+        return list(self._cyclic)
+
+    @property
+    def is_acyclic(self) -> bool:
+        """Whether the graph is a directed acyclic graph."""
+        return not self._cyclic
+
+    @property
+    def topological_order(self) -> list[str]:
+        """Node names, ordered such that every node follows all of its parents.
+
+        Raises :py:class:`ValueError` if the graph contains a cycle.
+        """
+        if self._cyclic:
+            raise ValueError(f'Model graph contains a cycle through nodes: {self._cyclic}')
+        return list(self._order)
+
+    def ancestors(self, name: str) -> list[str]:
+        """Names of all nodes upstream of ``name``, nearest first."""
+        return list(self._walk(name, self.parents))
+
+    def descendants(self, name: str) -> list[str]:
+        """Names of all nodes downstream of ``name``, nearest first."""
+        return list(self._walk(name, self.children))
+
+    @staticmethod
+    def _walk(start: str, adjacency: dict[str, list[str]]) -> Iterator[str]:
+        seen = {start}
+        queue = deque(adjacency[start])
+        while queue:
+            name = queue.popleft()
+            if name in seen:
+                continue
+            seen.add(name)
+            yield name
+            queue.extend(adjacency[name])
@@ -0,0 +1,183 @@
+"""Partitioning of input tables by :py:attr:`Node.GroupBy <bsmschema.models.Node.GroupBy>`.
+
+Inputs to a node are split into one model fit per unique combination of the values
+of the grouping variables.
+:py:func:`partition` combines the per-column codes of an
+:py:class:`~bsmschema.filters.IndexedTable` into a single integer key, and groups
+rows with one stable sort of the keys.
+Groups are yielded lazily as arrays of row indices, while the number and sizes of
+the groups are known as soon as the partition is created.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> import numpy as np
+>>> from bsmschema.filters import IndexedTable
+>>> table = IndexedTable({
+...     'subject': np.array(['02', '01', '02', '01', '02']),
+...     'contrast': np.array(['A', 'A', 'B', 'B', 'A']),
+... })
+>>> groups = partition(table, ['subject'])
+>>> len(groups)
+2
+>>> groups.counts
+array([2, 3])
+>>> for group in groups:
+...     print(group.key, group.rows)
+{'subject': '01'} [1 3]
+{'subject': '02'} [0 2 4]
+"""
+
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import numpy as np
+
+from .filters import ColumnIndex, IndexedTable
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import Node
+
+__all__ = [
+    'Group',
+    'Partition',
+    'partition',
+]
+
+# Keys are compressed before they could overflow int64
+_MAX_KEY = 2**62
+
+
+@dataclass(frozen=True)
+class Group:
+    """A subset of inputs to be passed to a single model fit."""
+
+    key: dict[str, Any]
+    """Values of the grouping variables shared by the rows."""
+    rows: np.ndarray
+    """Indices of the rows of the table, in ascending order."""
+
+
+class Partition:
+    """The groups of a table, by unique combinations of grouping variables.
+
+    Only the sort order of the rows and the group boundaries are stored;
+    each :py:class:`Group` is created when iterated over.
+    """
+
+    groupby: tuple[str, ...]
+    """Grouping variables."""
+    counts: np.ndarray
+    """Number of rows in each group, in iteration order."""
+
+    def __init__(
+        self,
+        table: IndexedTable,
+        groupby: Sequence[str],
+        rows: Optional[np.ndarray] = None,
+    ) -> None:
+        self.groupby = tuple(groupby)
+        if rows is None:
+            rows = np.arange(len(table))
+        rows = np.asarray(rows, dtype=np.intp)
+
+        # Missing variables take the value None for every row
+        self._indexes = [table.index(name) for name in self.groupby]
+        codes = [
+            (index.codes[rows], len(index.values)) for index in self._indexes if index is not None
+        ]
+
+        key = np.zeros(len(rows), dtype=np.int64)
+        size = 1
+        for column, nvalues in codes:
+            if size * nvalues >= _MAX_KEY:
+                uniques, key = np.unique(key, return_inverse=True)
+                key = key.reshape(-1)
+                size = len(uniques)
+            key = key * nvalues + column
+            size *= nvalues
+
+        order = np.argsort(key, kind='stable')
+        sorted_keys = key[order]
+        starts = np.flatnonzero(np.diff(sorted_keys)) + 1
+        self._rows = rows[order]
+        if len(rows):
+            self._bounds = np.concatenate(([0], starts, [len(rows)]))
+        else:
+            self._bounds = np.zeros(1, dtype=np.intp)
+        self._firsts = self._rows[self._bounds[:-1]]
+        self.counts = np.diff(self._bounds)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def _key(self, row: int) -> dict[str, Any]:
+        return {
+            name: None if index is None else index.values[index.codes[row]]
+            for name, index in zip(self.groupby, self._indexes)
+        }
+
+    @property
+    def keys(self) -> Iterator[dict[str, Any]]:
+        """Iterate over the keys of the groups, without their rows."""
+        return (self._key(row) for row in self._firsts)
+
+    def __iter__(self) -> Iterator[Group]:
+        bounds = self._bounds
+        for i, row in enumerate(self._firsts):
+            yield Group(key=self._key(row), rows=self._rows[bounds[i] : bounds[i + 1]])
+
+    def __getitem__(self, i: int) -> Group:
+        start, stop = self._bounds[i], self._bounds[i + 1]
+        return Group(key=self._key(self._rows[start]), rows=self._rows[start:stop])
+
+    def common(self, index: ColumnIndex) -> Optional[np.ndarray]:
+        """Code of the value of an indexed column within each group.
+
+        Returns ``None`` if the value varies within any group.
+        """
+        starts = self._bounds[:-1]
+        if not len(starts):
+            return np.empty(0, dtype=np.intp)
+        codes = index.codes[self._rows]
+        first = codes[starts]
+        if (np.minimum.reduceat(codes, starts) != first).any():
+            return None
+        if (np.maximum.reduceat(codes, starts) != first).any():
+            return None
+        values: np.ndarray = first
+        return values
+
+
+def partition(
+    table: IndexedTable,
+    groupby: Union['Node', str, Sequence[str]],
+    rows: Optional[np.ndarray] = None,
+) -> Partition:
+    """Split the rows of a table by the grouping variables of a node.
+
+    Parameters
+    ----------
+    table
+        Table of inputs, with one row per input image.
+    groupby
+        A :py:class:`~bsmschema.models.Node`, whose :py:attr:`GroupBy
+        <bsmschema.models.Node.GroupBy>` is used, a list of variables, or a single
+        variable name.
+    rows
+        Restrict the partition to these rows, for example the result of
+        :py:func:`~bsmschema.filters.select`.
+
+    Groups are ordered by the values of the grouping variables (or by first appearance,
+    for columns of values that cannot be sorted), and rows within a group retain their order.
+    An empty list of grouping variables produces a single group containing every row.
+    Variables that are not columns of the table are given the value ``None``.
+    """
+    if isinstance(groupby, str):
+        groupby = [groupby]
+    elif not isinstance(groupby, Sequence):
+        groupby = groupby.GroupBy
+    return Partition(table, groupby, rows)
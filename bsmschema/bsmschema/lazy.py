@@ -0,0 +1,353 @@
+"""Lazy loading of the opaque payloads of a :py:class:`~bsmschema.models.BIDSStatsModel`.
+
+:py:attr:`Transformations.Instructions <bsmschema.models.Transformations.Instructions>`
+and the per-package parameters of :py:attr:`Model.Software
+<bsmschema.models.Model.Software>` are not interpreted by ``bsmschema``, but
+:py:meth:`~pydantic.BaseModel.model_validate_json` builds Python objects for every
+value they contain.
+:py:func:`validate_json` instead locates these payloads with a scan that only
+matches brackets, and validates the rest of the document.
+Each payload is held as a :py:class:`RawJSON` view of the original bytes, which is
+decoded on first use.
+Until then, :py:meth:`~pydantic.BaseModel.model_dump_json` emits it verbatim.
+
+Payloads are checked to have the required type (an array of instructions, an object
+of parameters) and balanced brackets; other syntax errors within a payload are
+reported when it is decoded.
+Documents that cannot be scanned are validated in full, so errors are reported as by
+:py:meth:`~pydantic.BaseModel.model_validate_json`.
+
+Examples
+--------
+
+>>> model = validate_json(b'''{
+...     "Name": "lazy", "BIDSModelVersion": "1.0.0",
+...     "Nodes": [{
+...         "Level": "Run", "Name": "run", "GroupBy": ["run", "subject"],
+...         "Transformations": {"Transformer": "pybids-transforms-v1",
+...                             "Instructions": [{"Name": "Factor", "Input": ["trial_type"]}]},
+...         "Model": {"Type": "glm", "X": [1], "Software": {"FSL": {"Option": 1}}}
+...     }]
+... }''')
+>>> instructions = model.Nodes[0].Transformations.Instructions
+>>> instructions
+RawJSON(b'[{"Name": "Factor", "Input": ["trial_type"]}]')
+>>> instructions.decoded
+False
+>>> instructions[0]['Name']
+'Factor'
+>>> instructions.decoded
+True
+>>> model.Nodes[0].Model.Software['FSL'] == {'Option': 1}
+True
+"""
+
+import json
+import re
+import secrets
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any, Callable, Union
+
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel
+
+__all__ = [
+    'LazyJSON',
+    'RawJSON',
+    'validate_json',
+]
+
+# Validation and serialization context entry for raw payloads
+CONTEXT_KEY = 'bsmschema.raw_json'
+
+_WS = re.compile(rb'[ \t\n\r]*')
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(rb'[^\s,:\[\]{}"]+')
+# Everything up to the next bracket, skipping over strings
+# (written so that each input has a single match, so failures cannot backtrack)
+_FLAT = re.compile(rb'[^\[\]{}"]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^\[\]{}"]*)*')
+
+_QUOTE, _COLON, _COMMA = b'":,'
+_LBRACKET, _RBRACKET, _LBRACE, _RBRACE = b'[]{}'
+_CLOSING = {_LBRACKET: _RBRACKET, _LBRACE: _RBRACE}
+
+
+class RawJSON:
+    """A JSON value held as its serialized bytes, and decoded on first use.
+
+    Indexing, iteration, ``len()``, ``in`` and ``==`` act on the decoded value,
+    which is available as :py:attr:`value`.
+    Once decoded, the value may be modified in place, and it is serialized in place
+    of the original bytes.
+    """
+
+    __slots__ = ('raw', '_value', '_decoded')
+
+    raw: Union[bytes, memoryview]
+    """The serialized value."""
+
+    def __init__(self, raw: Union[bytes, memoryview]) -> None:
+        self.raw = raw
+        self._value: Any = None
+        self._decoded = False
+
+    @property
+    def decoded(self) -> bool:
+        """Whether :py:attr:`value` has been decoded."""
+        return self._decoded
+
+    @property
+    def value(self) -> Any:
+        """The decoded value."""
+        if not self._decoded:
+            self._value = json.loads(bytes(self.raw))
+            self._decoded = True
+        return self._value
+
+    @property
+    def text(self) -> str:
+        """The serialized value, as a string."""
+        return bytes(self.raw).decode()
+
+    def __repr__(self) -> str:
+        return f'RawJSON({bytes(self.raw)!r})'
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, RawJSON):
+            if not (self._decoded or other._decoded) and self.raw == other.raw:
+                return True
+            other = other.value
+        return bool(self.value == other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.value)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.value
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.value[key]
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # memoryviews cannot be pickled or copied
+        return _restore, (bytes(self.raw), self._decoded, self._value)
+
+
+def _restore(raw: bytes, decoded: bool, value: Any) -> RawJSON:
+    restored = RawJSON(raw)
+    restored._value = value
+    restored._decoded = decoded
+    return restored
+
+
+class _Collector:
+    """Replaces raw payloads with placeholders during serialization, and back."""
+
+    def __init__(self) -> None:
+        self.prefix = f'bsmschema-raw:{secrets.token_hex(8)}:'
+        self.values: list[RawJSON] = []
+
+    def add(self, value: RawJSON) -> str:
+        self.values.append(value)
+        return f'{self.prefix}{len(self.values) - 1}'
+
+    def splice(self, text: str) -> str:
+        if not self.values:
+            return text
+        return re.sub(
+            f'"{re.escape(self.prefix)}(\\d+)"',
+            lambda match: self.values[int(match[1])].text,
+            text,
+        )
+
+
+def _dump_json(dump: Callable[..., str], context: Any = None, **kwargs: Any) -> str:
+    """Call a ``model_dump_json`` method, emitting undecoded payloads verbatim."""
+    collector = _Collector()
+    text = dump(context={**(context or {}), CONTEXT_KEY: collector}, **kwargs)
+    return collector.splice(text)
+
+
+def _validate(value: Any, handler: Callable[[Any], Any], info: core_schema.ValidationInfo) -> Any:
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, str) and isinstance(info.context, dict):
+        raw = info.context.get(CONTEXT_KEY)
+        if isinstance(raw, dict) and value in raw:
+            return raw[value]
+    return handler(value)
+
+
+def _serialize(
+    value: Any, handler: Callable[[Any], Any], info: core_schema.SerializationInfo
+) -> Any:
+    if not isinstance(value, RawJSON):
+        return handler(value)
+    if not value.decoded and info.mode_is_json() and isinstance(info.context, dict):
+        collector = info.context.get(CONTEXT_KEY)
+        if isinstance(collector, _Collector):
+            return collector.add(value)
+    return handler(value.value)
+
+
+class LazyJSON:
+    """Annotation marking a field that may hold a :py:class:`RawJSON` payload.
+
+    The validation and JSON schemas of the annotated type are unchanged.
+    """
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        schema = handler(source)
+        return core_schema.with_info_wrap_validator_function(
+            _validate,
+            schema,
+            serialization=core_schema.wrap_serializer_function_ser_schema(
+                _serialize, info_arg=True, schema=schema
+            ),
+        )
+
+
+class _Scanner:
+    """Replace payloads in a document with placeholders, matching only brackets."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.view = memoryview(data)
+        self.pieces: list[bytes] = []
+        self.raw: dict[str, RawJSON] = {}
+        self.last = 0
+        self.prefix = f'bsmschema-raw:{secrets.token_hex(8)}:'
+
+    def ws(self, pos: int) -> int:
+        return _WS.match(self.data, pos).end()  # type: ignore[union-attr]
+
+    def skip(self, pos: int) -> int:
+        """Return the end of the value starting at ``pos``."""
+        data = self.data
+        if data[pos] not in _CLOSING:
+            match = (_STRING if data[pos] == _QUOTE else _SCALAR).match(data, pos)
+            if match is None:
+                raise ValueError(pos)
+            return match.end()
+        # Match brackets with a stack, in time linear in the length of the value
+        stack = []
+        while True:
+            char = data[pos]
+            if char in _CLOSING:
+                stack.append(_CLOSING[char])
+            elif stack and char == stack[-1]:
+                stack.pop()
+                if not stack:
+                    return pos + 1
+            else:
+                raise ValueError(pos)
+            pos = _FLAT.match(data, pos + 1).end()  # type: ignore[union-attr]
+
+    def object(self, pos: int, visit: Callable[[str, int], int]) -> int:
+        """Visit the members of the object at ``pos``, returning its end."""
+        data = self.data
+        if data[pos] != _LBRACE:
+            return self.skip(pos)
+        pos = self.ws(pos + 1)
+        if data[pos] == _RBRACE:
+            return pos + 1
+        while True:
+            match = _STRING.match(data, pos)
+            if match is None:
+                raise ValueError(pos)
+            key = json.loads(match[0])
+            pos = self.ws(match.end())
+            if data[pos] != _COLON:
+                raise ValueError(pos)
+            pos = self.ws(visit(key, self.ws(pos + 1)))
+            if data[pos] == _RBRACE:
+                return pos + 1
+            if data[pos] != _COMMA:
+                raise ValueError(pos)
+            pos = self.ws(pos + 1)
+
+    def array(self, pos: int, visit: Callable[[int], int]) -> int:
+        """Visit the items of the array at ``pos``, returning its end."""
+        data = self.data
+        if data[pos] != _LBRACKET:
+            return self.skip(pos)
+        pos = self.ws(pos + 1)
+        if data[pos] == _RBRACKET:
+            return pos + 1
+        while True:
+            pos = self.ws(visit(pos))
+            if data[pos] == _RBRACKET:
+                return pos + 1
+            if data[pos] != _COMMA:
+                raise ValueError(pos)
+            pos = self.ws(pos + 1)
+
+    def payload(self, pos: int, opening: int) -> int:
+        """Replace the value at ``pos`` with a placeholder, if it opens with ``opening``."""
+        end = self.skip(pos)
+        if self.data[pos] != opening:
+            return end
+        placeholder = f'{self.prefix}{len(self.raw)}'
+        self.raw[placeholder] = RawJSON(self.view[pos:end])
+        self.pieces += [self.data[self.last : pos], f'"{placeholder}"'.encode()]
+        self.last = end
+        return end
+
+    def document(self) -> bytes:
+        pos = self.ws(0)
+        if self.data[pos] != _LBRACE:
+            raise ValueError(pos)
+        self.object(pos, self.model)
+        return b''.join([*self.pieces, self.data[self.last :]])
+
+    def model(self, key: str, pos: int) -> int:
+        if key == 'Nodes':
+            return self.array(pos, lambda pos: self.object(pos, self.node))
+        return self.skip(pos)
+
+    def node(self, key: str, pos: int) -> int:
+        if key == 'Transformations':
+            return self.object(pos, self.transformations)
+        if key == 'Model':
+            return self.object(pos, self.software)
+        return self.skip(pos)
+
+    def transformations(self, key: str, pos: int) -> int:
+        if key == 'Instructions':
+            return self.payload(pos, _LBRACKET)
+        return self.skip(pos)
+
+    def software(self, key: str, pos: int) -> int:
+        if key == 'Software':
+            return self.object(pos, lambda key, pos: self.payload(pos, _LBRACE))
+        return self.skip(pos)
+
+
+def validate_json(data: Union[str, bytes, bytearray]) -> 'BIDSStatsModel':
+    """Validate a JSON document, holding opaque payloads as :py:class:`RawJSON`."""
+    from .models import BIDSStatsModel
+
+    if isinstance(data, str):
+        data = data.encode()
+    elif not isinstance(data, bytes):
+        data = bytes(data)
+    scanner = _Scanner(data)
+    try:
+        document = scanner.document()
+    except (ValueError, IndexError):
+        # Not scannable JSON; validate in full to report errors
+        return BIDSStatsModel.model_validate_json(data)
+    if not scanner.raw:
+        return BIDSStatsModel.model_validate_json(data)
+    return BIDSStatsModel.model_validate_json(document, context={CONTEXT_KEY: scanner.raw})
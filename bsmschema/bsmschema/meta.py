@@ -0,0 +1,361 @@
+"""Streaming estimation of ``"meta"`` nodes, combining the outputs of upstream nodes.
+
+A :py:class:`MetaEstimator` receives effect maps, and optionally their variance maps,
+one input at a time or in stacked batches, and keeps only running sums per voxel, so
+its memory does not grow with the number of inputs.
+:py:meth:`MetaEstimator.result` then estimates the parameters of :py:attr:`Model.X
+<bsmschema.models.Model.X>` and all contrasts of the node (see
+:py:mod:`bsmschema.contrasts`).
+Covariates other than the intercept ``1`` are passed with each input.
+
+Two methods are available:
+
+* ``"fixed"``: fixed-effects weighted least squares, weighting each input by the
+  inverse of its variance.
+  The running sums are :math:`\\sum_i w_i x_i x_i^T` and :math:`\\sum_i w_i x_i y_i`,
+  and the statistics are z statistics (with infinite degrees of freedom).
+  Voxels where an input has a non-positive or undefined variance ignore that input.
+* ``"mixed"``: the summary statistics approximation of the mixed-effects model, as
+  in SPM and nilearn, where the variance of the effects is estimated from their
+  spread across inputs by ordinary least squares.
+  The running sums are :math:`\\sum_i x_i x_i^T`, :math:`\\sum_i x_i y_i` and
+  :math:`\\sum_i y_i^2`, and variance maps are not required.
+  Estimators that weight inputs by both their own variance and an estimated
+  between-input variance require a second pass over the inputs, and are not provided.
+
+Updates and estimation are split into chunks of voxels, run on a pool of threads.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> from bsmschema.models import Node
+>>> node = Node.model_validate({
+...     'Level': 'Subject', 'Name': 'subject', 'GroupBy': ['subject', 'contrast'],
+...     'Model': {'Type': 'meta', 'X': [1]},
+...     'DummyContrasts': {'Test': 't'},
+... })
+>>> estimator = MetaEstimator(node)
+>>> estimator.add([1.0, 2.0, 0.0], variance=[1.0, 1.0, 1.0])
+>>> estimator.add([3.0, 2.0, 0.0], variance=[1.0, 4.0, 1.0])
+>>> result = estimator.result()
+>>> result.count
+2
+>>> result['intercept'].effect
+array([2., 2., 0.])
+>>> result['intercept'].variance
+array([0.5, 0.8, 0.5])
+"""
+
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Literal, Optional, Union
+
+import numpy as np
+
+from .contrasts import compile_contrasts
+from .glm import CHUNK_BYTES, ContrastEstimate, Data, _load, _memory_order
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import Node
+
+__all__ = [
+    'MetaEstimator',
+    'MetaResult',
+]
+
+Column = Union[int, str]
+Method = Literal['fixed', 'mixed']
+
+
+@dataclass(frozen=True, eq=False)
+class MetaResult:
+    """The estimates of a meta-analysis at every voxel.
+
+    Voxel dimensions follow those of the inputs.
+    Voxels without enough inputs to estimate the parameters have undefined estimates.
+    """
+
+    columns: tuple[Column, ...]
+    """Columns of the design matrix."""
+    method: str
+    """Estimation method, ``"fixed"`` or ``"mixed"``."""
+    count: int
+    """Number of inputs."""
+    betas: np.ndarray
+    """Parameter estimates, one row per column."""
+    dof: float
+    """Degrees of freedom of the t statistics; infinite for the z statistics of
+    ``"fixed"``."""
+    contrasts: dict[str, ContrastEstimate]
+    """Contrast estimates, by name. Statistics of ``"t"`` contrasts are z statistics for
+    ``"fixed"``, and those of ``"F"`` contrasts are divided by their number of rows."""
+
+    def __getitem__(self, name: str) -> ContrastEstimate:
+        return self.contrasts[name]
+
+
+def _covariate_rows(
+    columns: tuple[Column, ...], count: int, covariates: Optional[Mapping[str, Any]]
+) -> np.ndarray:
+    rows = np.empty((count, len(columns)))
+    for j, column in enumerate(columns):
+        if not isinstance(column, str):
+            rows[:, j] = float(column)
+        elif covariates is None or column not in covariates:
+            raise ValueError(f'Missing covariate {column!r}')
+        else:
+            rows[:, j] = np.broadcast_to(np.asarray(covariates[column], dtype=float), count)
+    return rows
+
+
+def _inverse(matrices: np.ndarray) -> np.ndarray:
+    """Invert a stack of matrices, using pseudoinverses only if one is singular."""
+    try:
+        return np.linalg.inv(matrices)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(matrices)
+
+
+class MetaEstimator:
+    """Accumulate the inputs of a ``"meta"`` node, and estimate its contrasts.
+
+    Parameters
+    ----------
+    node
+        A node with :py:attr:`Model.Type <bsmschema.models.Model.Type>` ``"meta"``.
+    method
+        ``"fixed"`` or ``"mixed"``; see :py:mod:`bsmschema.meta`.
+    columns
+        Design matrix columns. Defaults to :py:attr:`Model.X <bsmschema.models.Model.X>`.
+        The intercept is represented by ``1``.
+    chunk_size
+        Number of voxels updated at once. Defaults to a size based on
+        :py:data:`bsmschema.glm.CHUNK_BYTES`.
+    max_workers
+        Number of threads. Defaults to the number of CPUs.
+
+    Raises :py:class:`ValueError` if the node is not a ``"meta"`` node, or if a contrast
+    refers to a column that is not in the design.
+    """
+
+    def __init__(
+        self,
+        node: 'Node',
+        method: Method = 'fixed',
+        columns: Optional[Sequence[Column]] = None,
+        chunk_size: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        if node.Model.Type != 'meta':
+            raise ValueError(
+                f'Node {node.Name!r}: expected a "meta" model, got {node.Model.Type!r}'
+            )
+        if method not in ('fixed', 'mixed'):
+            raise ValueError(f'Unknown method: {method!r}')
+        self.method = method
+        self.columns = tuple(node.Model.X if columns is None else columns)
+        self.compiled = compile_contrasts(node, self.columns)
+        self.count = 0
+        self._chunk_size = chunk_size
+        self._max_workers = max_workers
+        self._shape: Optional[tuple[int, ...]] = None
+        # Order in which voxels are flattened, that of the first inputs
+        self._order: Literal['C', 'F'] = 'C'
+        p = len(self.columns)
+        # Sums of x x' and x y, weighted per voxel for "fixed", and of y^2 for "mixed"
+        self._xx: np.ndarray = np.zeros((p, p))
+        self._xy: np.ndarray = np.zeros((0, p))
+        self._yy: np.ndarray = np.zeros(0)
+
+    def _map(self, function: Callable[[slice], None], per_voxel: int) -> None:
+        """Apply a function to chunks of voxels, on a pool of threads."""
+        assert self._shape is not None
+        n_voxels = int(np.prod(self._shape))
+        size = self._chunk_size or max(1, CHUNK_BYTES // (8 * max(per_voxel, 1)))
+        chunks = [slice(start, start + size) for start in range(0, n_voxels, size)]
+        if self._max_workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                function(chunk)
+        else:
+            with ThreadPoolExecutor(self._max_workers or os.cpu_count()) as pool:
+                # Chunks update disjoint slices of the sums, so no locking is needed
+                list(pool.map(function, chunks))
+
+    def add(
+        self,
+        effect: Data,
+        variance: Optional[Data] = None,
+        covariates: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        """Add one input, with the values of its covariates."""
+        effect = _load(effect)
+        self.add_batch(
+            effect[None],
+            None if variance is None else _load(variance)[None],
+            covariates,
+        )
+
+    def add_batch(
+        self,
+        effects: Data,
+        variances: Optional[Data] = None,
+        covariates: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        """Add inputs stacked along the first dimension.
+
+        Covariates map column names to one value per input, or to a value shared by all.
+        Variances are required by the ``"fixed"`` method.
+
+        Raises :py:class:`ValueError` if variances are missing or do not match the effects,
+        if the voxel dimensions differ from previous inputs, or if a covariate is missing.
+        """
+        effects = _load(effects)
+        count = effects.shape[0]
+        # Inputs are validated before any state is set
+        if self._shape is not None and effects.shape[1:] != self._shape:
+            raise ValueError(f'Expected inputs of shape {self._shape}, got {effects.shape[1:]}')
+        rows = _covariate_rows(self.columns, count, covariates)
+        variance_data = None if variances is None else _load(variances)
+        if self.method == 'fixed':
+            if variance_data is None:
+                raise ValueError('The "fixed" method requires variances')
+            if variance_data.shape != effects.shape:
+                raise ValueError(
+                    f'Variances of shape {variance_data.shape} do not match effects of shape '
+                    f'{effects.shape}'
+                )
+
+        if self._shape is None:
+            self._shape = effects.shape[1:]
+            self._order = _memory_order(effects)
+            n_voxels = int(np.prod(self._shape))
+            p = len(self.columns)
+            if self.method == 'fixed':
+                self._xx = np.zeros((n_voxels, p, p))
+            else:
+                self._yy = np.zeros(n_voxels)
+            self._xy = np.zeros((n_voxels, p))
+        flat = effects.reshape(count, -1, order=self._order)
+
+        if self.method == 'mixed':
+            self._xx += rows.T @ rows
+
+            def update(voxels: slice) -> None:
+                y = np.asarray(flat[:, voxels], dtype=float)
+                self._xy[voxels] += (rows.T @ y).T
+                self._yy[voxels] += np.einsum('kv,kv->v', y, y)
+
+        else:
+            assert variance_data is not None
+            flat_variances = variance_data.reshape(count, -1, order=self._order)
+            outer = np.einsum('kp,kq->kpq', rows, rows)
+
+            def update(voxels: slice) -> None:
+                y = np.asarray(flat[:, voxels], dtype=float)
+                v = np.asarray(flat_variances[:, voxels], dtype=float)
+                valid = np.isfinite(v) & (v > 0) & np.isfinite(y)
+                w = np.divide(1.0, v, out=np.zeros_like(v), where=valid)
+                self._xx[voxels] += np.einsum('kv,kpq->vpq', w, outer)
+                self._xy[voxels] += np.where(valid, w * y, 0.0).T @ rows
+
+        p = len(self.columns)
+        self._map(update, count + p * p)
+        self.count += count
+
+    def result(self) -> MetaResult:
+        """Estimate the parameters and contrasts from the inputs added so far.
+
+        Raises :py:class:`ValueError` if no inputs were added.
+        """
+        if self._shape is None:
+            raise ValueError('No inputs were added')
+        n_voxels = self._xy.shape[0]
+        p = len(self.columns)
+        if self.method == 'mixed':
+            rank = np.linalg.matrix_rank(self._xx)
+            dof = float(self.count - rank)
+        else:
+            dof = float('inf')
+
+        betas = np.empty((p, n_voxels))
+        contrasts: dict[str, ContrastEstimate] = {}
+        for test, group in self.compiled.groups.items():
+            for name, weights in group:
+                shape = (len(weights), n_voxels) if len(weights) > 1 else (n_voxels,)
+                contrasts[name] = ContrastEstimate(
+                    name=name,
+                    test=test,
+                    effect=np.empty(shape),
+                    variance=None if test == 'F' else np.empty(shape),
+                    stat=None if test == 'pass' else np.empty(n_voxels),
+                )
+
+        def estimate(voxels: slice) -> None:
+            xy = self._xy[voxels]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if self.method == 'mixed':
+                    inverse = np.linalg.pinv(self._xx)
+                    beta = xy @ inverse
+                    rss = self._yy[voxels] - np.einsum('vp,vp->v', beta, xy)
+                    # Covariance of the parameters, per voxel
+                    covariance = inverse * (np.maximum(rss, 0) / dof)[:, None, None]
+                else:
+                    # Voxels without a weighted input have no estimate
+                    xx = self._xx[voxels]
+                    empty = np.trace(xx, axis1=1, axis2=2) == 0
+                    xx = np.where(empty[:, None, None], np.eye(p), xx)
+                    covariance = _inverse(xx)
+                    covariance[empty] = np.nan
+                    beta = np.einsum('vpq,vq->vp', covariance, xy)
+                betas[:, voxels] = beta.T
+                for name, weights in self.compiled.groups.get('F', ()):
+                    effect = beta @ weights.T
+                    middle = _inverse(weights @ covariance @ weights.T)
+                    stat = np.einsum('vi,vij,vj->v', effect, middle, effect) / len(weights)
+                    contrasts[name].effect[..., voxels] = (
+                        effect.T if len(weights) > 1 else effect[:, 0]
+                    )
+                    contrasts[name].stat[voxels] = stat  # type: ignore[index]
+                for test, group in self.compiled.groups.items():
+                    if test == 'F':
+                        continue
+                    effects = beta @ group.matrix.T
+                    variances = np.einsum('ip,vpq,iq->vi', group.matrix, covariance, group.matrix)
+                    for name, rows in zip(group.names, group.slices):
+                        result = contrasts[name]
+                        index = rows if result.effect.ndim > 1 else rows.start
+                        result.effect[..., voxels] = effects[:, index].T
+                        result.variance[..., voxels] = variances[:, index].T  # type: ignore[index]
+                        if result.stat is not None:
+                            result.stat[voxels] = effects[:, index] / np.sqrt(variances[:, index])
+
+        self._map(estimate, p * p)
+
+        voxel_shape, order = self._shape, self._order
+
+        def reshape(array: Any) -> Any:
+            if array is None:
+                return None
+            return array.reshape(*array.shape[:-1], *voxel_shape, order=order)
+
+        return MetaResult(
+            columns=self.columns,
+            method=self.method,
+            count=self.count,
+            betas=reshape(betas),
+            dof=dof,
+            contrasts={
+                name: ContrastEstimate(
+                    name=name,
+                    test=estimate.test,
+                    effect=reshape(estimate.effect),
+                    variance=reshape(estimate.variance),
+                    stat=reshape(estimate.stat),
+                )
+                for name, estimate in contrasts.items()
+            },
+        )
@@ -16,8 +16,13 @@ Note that these are the structured and validatable objects.
 """
 
 import sys
-from typing import Optional, Literal, Any, Union, TYPE_CHECKING
-from pydantic import BaseModel
+from typing import Annotated, Optional, Literal, Any, Union, TYPE_CHECKING
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+from .lazy import LazyJSON, _dump_json
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .graph import ModelGraph
 
 __all__ = [
     'BIDSStatsModel',
@@ -78,6 +83,9 @@ StatisticalTest = Literal[
 Filter = dict[StrictStr, list[Any]]
 VariableList = list[Union[Literal[1], StrictStr]]
 Weights = list[Union[StrictInt, StrictFloat, StrictStr]]
+# Opaque payloads, which bsmschema.lazy.validate_json holds as raw JSON
+InstructionList = Annotated[list[Any], LazyJSON]
+SoftwareParameters = Annotated[dict[StrictStr, Any], LazyJSON]
 
 # Python 3.10 at least weirdly annotates "X: Optional[X] = None" as NoneType
 OptionalFilter = Optional[Filter]
@@ -89,10 +97,16 @@ class _BSMBase(BaseModel):
     # This permits users to write comments on objects.
     Description: Optional[str] = None
 
+    # Validators and serializers are built on first use, not at import
     model_config: dict[str, Any] = {
         'extras': 'forbid',
+        'defer_build': True,
     }
 
+    def model_dump_json(self, **kwargs: Any) -> str:
+        # Emit raw payloads that have not been decoded verbatim
+        return _dump_json(super().model_dump_json, **kwargs)
+
 
 class Edge(_BSMBase):
     r"""An Edge connects two :py:class:`Node`\s, indicating the outputs (contrasts) of
@@ -166,9 +180,14 @@ class Transformations(_BSMBase):
 
     Transformer: TransformerID
     """Name of the specification of an instruction set."""
-    Instructions: list[Any]
+    Instructions: InstructionList
     """Sequence of instructions to pass to an implementation of :py:attr:`Transformer`.
-    The format of these instructions is determined by the :py:attr:`Transformer`."""
+    The format of these instructions is determined by the :py:attr:`Transformer`.
+
+    Held as a :py:class:`~bsmschema.lazy.RawJSON` when loaded with
+    :py:func:`bsmschema.lazy.validate_json`.
+    Instructions of ``"pybids-transforms-v1"`` are typed and compiled by
+    :py:mod:`bsmschema.transforms`."""
 
 
 # Python annotation hack
@@ -412,13 +431,16 @@ class Model(_BSMBase):
     # """Specifies how to model the error."""
     Options: OptionalOptions = None
     """Estimation options that are common to multiple estimation packages."""
-    Software: Optional[dict[StrictStr, dict[StrictStr, Any]]] = None
+    Software: Optional[dict[StrictStr, SoftwareParameters]] = None
     """This section allows one to specify any software-specific estimation parameters.
     Each key in the object is the name of the software package (FSL, SPM, etc.),
     and the value is an object containing software-specific parameters.
     The BIDS Stats Models spec makes no attempt to control the vocabulary available for
     use in any particular software package;
-    we expect that the developers of each package will, over time, fill in these specifications."""
+    we expect that the developers of each package will, over time, fill in these specifications.
+
+    Parameters are held as :py:class:`~bsmschema.lazy.RawJSON` when loaded with
+    :py:func:`bsmschema.lazy.validate_json`."""
 
 
 class Node(_BSMBase):
@@ -487,6 +509,53 @@ class BIDSStatsModel(_BSMBase):
     Edges: Optional[list[Edge]] = None
     """A list of edges between analysis nodes. If absent, the nodes are connected in the sequence presented in Nodes."""
 
+    _graph: Optional['ModelGraph'] = PrivateAttr(default=None)
+
+    @property
+    def graph(self) -> 'ModelGraph':
+        """A :py:class:`~bsmschema.graph.ModelGraph` indexing the nodes and edges of this model.
+
+        The graph is built on first access and cached.
+        The cache is discarded when a field of the model is assigned or the model is copied;
+        in-place modifications of nested objects are not tracked.
+        """
+        if self._graph is None:
+            from .graph import ModelGraph
+
+            self._graph = ModelGraph(self)
+        return self._graph
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in type(self).model_fields:
+            self._graph = None
+        super().__setattr__(name, value)
+
+    def __eq__(self, other: object) -> bool:
+        # The cached graph is not part of the value of the model
+        if not isinstance(other, BIDSStatsModel):
+            return NotImplemented
+        return (
+            type(self) is type(other)
+            and self.__dict__ == other.__dict__
+            and self.__pydantic_extra__ == other.__pydantic_extra__
+            and _uncached(self) == _uncached(other)
+        )
+
+    def __copy__(self) -> 'BIDSStatsModel':
+        copied = super().__copy__()
+        copied._graph = None
+        return copied
+
+    def __deepcopy__(self, memo: Optional[dict[int, Any]] = None) -> 'BIDSStatsModel':
+        copied = super().__deepcopy__(memo)
+        copied._graph = None
+        return copied
+
+
+def _uncached(model: BaseModel) -> dict[str, Any]:
+    private = model.__pydantic_private__ or {}
+    return {name: value for name, value in private.items() if name != '_graph'}
+
 
 class ExplainerModel(BaseModel):
     """This is an example model.
@@ -503,6 +572,8 @@ class ExplainerModel(BaseModel):
     Probably the most complex-looking field is :py:attr:`Contrast.Weights`.
     """
 
+    model_config = ConfigDict(defer_build=True)
+
     StringField: str
     """This field is called ``StringField`` and has type ``str``.
 
@@ -0,0 +1,452 @@
+"""Incremental revalidation of models edited with JSON Patch.
+
+:py:class:`ModelEditor` holds a document together with the validated objects built from
+it, and applies `RFC 6902 <https://datatracker.ietf.org/doc/html/rfc6902>`_ JSON Patches
+to it.
+Patches are applied by copying only the objects along each modified path, so every other
+object of the document is shared, unchanged, with the previous version.
+Objects whose identity is unchanged keep their validated
+:py:class:`~bsmschema.models.Node`, :py:class:`~bsmschema.models.Contrast` and
+:py:class:`~bsmschema.models.Edge`, so only the objects touched by a patch are
+revalidated.
+Likewise, the checks of :py:mod:`bsmschema.semantics` are rerun for changed nodes,
+and the checks relating nodes to one another are rerun only if node names,
+F contrasts or edges change.
+
+Each patch produces a :py:class:`PatchResult`, with the errors of the new version and
+how they differ from the errors of the previous version.
+Schema errors are reported if any part of the document is invalid; otherwise, the
+semantic errors of the model are reported.
+
+Examples
+--------
+
+>>> editor = ModelEditor({
+...     'Name': 'example',
+...     'BIDSModelVersion': '1.0.0',
+...     'Nodes': [
+...         {'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...          'Model': {'Type': 'glm', 'X': [1, 'A', 'B']},
+...          'Contrasts': [{'Name': 'AvB', 'ConditionList': ['A', 'B'],
+...                         'Weights': [1, -1], 'Test': 't'}]},
+...     ],
+... })
+>>> editor.errors
+[]
+>>> result = editor.apply([{'op': 'add', 'path': '/Nodes/0/Contrasts/0/Weights/-', 'value': 1}])
+>>> [(error['loc'], error['type']) for error in result.added]
+[(['Nodes', 0, 'Contrasts', 0, 'Weights'], 'weights_length')]
+>>> result = editor.apply([{'op': 'remove', 'path': '/Nodes/0/Contrasts/0/Weights/2'}])
+>>> result.errors, len(result.removed)
+([], 1)
+>>> result.model.Nodes[0].Contrasts[0].Weights
+[1, -1]
+"""
+
+import json
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
+
+from pydantic import ValidationError
+
+from .batch import _format_errors
+from .semantics import _check_graph, _check_node, _Errors
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel, Contrast, Edge, Node
+
+__all__ = [
+    'ModelEditor',
+    'PatchResult',
+    'apply_patch',
+]
+
+Error = dict[str, Any]
+Loc = list[Union[str, int]]
+
+
+def _tokens(pointer: str) -> list[str]:
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens."""
+    if not pointer:
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError(f'Invalid JSON Pointer: {pointer!r}')
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _index(array: list[Any], token: str, insert: bool = False) -> int:
+    if insert and token == '-':
+        return len(array)
+    if not token.isdigit() or (token != '0' and token.startswith('0')):
+        raise ValueError(f'Invalid array index: {token!r}')
+    index = int(token)
+    if index > len(array) or (index == len(array) and not insert):
+        raise ValueError(f'Array index out of range: {index}')
+    return index
+
+
+def _get(document: Any, tokens: Sequence[str]) -> Any:
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise ValueError(f'Member not found: {token!r}')
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_index(document, token)]
+        else:
+            raise ValueError(f'Cannot index a scalar with {token!r}')
+    return document
+
+
+def _update(document: Any, tokens: Sequence[str], action: Callable[[Any, str], None]) -> Any:
+    """Apply ``action`` to a copy of the container of a location, copying its ancestors."""
+    *path, last = tokens
+    copies = [document]
+    for token in path:
+        copies.append(_get(copies[-1], [token]))
+    if not isinstance(copies[-1], (dict, list)):
+        raise ValueError(f'Cannot index a scalar with {last!r}')
+    child = copies[-1] = copies[-1].copy()
+    action(child, last)
+    for token, parent in zip(reversed(path), reversed(copies[:-1])):
+        parent = parent.copy()
+        parent[token if isinstance(parent, dict) else _index(parent, token)] = child
+        child = parent
+    return child
+
+
+def _add(document: Any, tokens: Sequence[str], value: Any) -> Any:
+    if not tokens:
+        return value
+
+    def add(container: Any, token: str) -> None:
+        if isinstance(container, dict):
+            container[token] = value
+        else:
+            container.insert(_index(container, token, insert=True), value)
+
+    return _update(document, tokens, add)
+
+
+def _remove(document: Any, tokens: Sequence[str]) -> Any:
+    if not tokens:
+        raise ValueError('Cannot remove the whole document')
+
+    def remove(container: Any, token: str) -> None:
+        if isinstance(container, dict):
+            if token not in container:
+                raise ValueError(f'Member not found: {token!r}')
+            del container[token]
+        else:
+            del container[_index(container, token)]
+
+    return _update(document, tokens, remove)
+
+
+def _replace(document: Any, tokens: Sequence[str], value: Any) -> Any:
+    if not tokens:
+        return value
+
+    def replace(container: Any, token: str) -> None:
+        if isinstance(container, dict):
+            if token not in container:
+                raise ValueError(f'Member not found: {token!r}')
+            container[token] = value
+        else:
+            container[_index(container, token)] = value
+
+    return _update(document, tokens, replace)
+
+
+def _equal(a: Any, b: Any) -> bool:
+    """JSON equality, which distinguishes booleans from numbers."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(_equal, a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    return bool(a == b)
+
+
+def apply_patch(document: Any, patch: Sequence[Mapping[str, Any]]) -> Any:
+    """Apply a JSON Patch to a JSON document, returning the new document.
+
+    The document is not modified: objects along the modified paths are copied, and the
+    new document shares all other objects with ``document``.
+    Raises :py:class:`ValueError` if any operation fails, in which case no change is made.
+    """
+    for n, operation in enumerate(patch):
+        try:
+            op = operation['op']
+            tokens = _tokens(operation['path'])
+            if op in ('add', 'replace', 'test'):
+                value = operation['value']
+            elif op in ('move', 'copy'):
+                source = _tokens(operation['from'])
+                value = _get(document, source)
+            elif op != 'remove':
+                raise ValueError(f'Unknown operation: {op!r}')
+
+            if op == 'add' or op == 'copy':
+                # Shared objects are safe, since they are never modified in place
+                document = _add(document, tokens, value)
+            elif op == 'remove':
+                document = _remove(document, tokens)
+            elif op == 'replace':
+                document = _replace(document, tokens, value)
+            elif op == 'move':
+                if tokens[: len(source)] == source and tokens != source:
+                    raise ValueError('Cannot move a value into itself')
+                document = _add(_remove(document, source), tokens, value)
+            elif not _equal(_get(document, tokens), value):
+                raise ValueError(f'Test failed at {operation["path"]!r}')
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'Patch operation {n} failed: {e}') from e
+    return document
+
+
+@dataclass(frozen=True)
+class PatchResult:
+    """The outcome of applying a patch with :py:meth:`ModelEditor.apply`."""
+
+    model: Optional['BIDSStatsModel']
+    """The patched model, or ``None`` if the patched document fails schema validation."""
+    errors: list[Error]
+    """Errors of the patched document, each with ``loc``, ``msg`` and ``type`` keys."""
+    added: list[Error]
+    """Errors that were not present before the patch."""
+    removed: list[Error]
+    """Errors that were present before the patch and are now resolved."""
+
+
+@dataclass(frozen=True)
+class _Validated:
+    """The outcome of validating an object of the document."""
+
+    source: Any
+    """The validated object, which is kept to ensure that its ``id()`` is not reused."""
+    model: Any
+    errors: list[Error]
+
+
+def _prefix(loc: Loc, errors: list[Error]) -> list[Error]:
+    return [{**error, 'loc': [*loc, *error['loc']]} for error in errors]
+
+
+def _key(error: Error) -> tuple[Any, ...]:
+    return tuple(error['loc']), error['type'], error['msg']
+
+
+class ModelEditor:
+    """A document and its validated model, updated incrementally by JSON Patches.
+
+    Parameters
+    ----------
+    document
+        A BIDS Stats Model document, as parsed JSON or as a JSON string.
+    semantic
+        Whether to check the rules of :py:mod:`bsmschema.semantics` once the document
+        passes schema validation.
+
+    The document is treated as immutable, and should not be modified in place.
+    """
+
+    document: Any
+    """The current document."""
+    model: Optional['BIDSStatsModel']
+    """The current model, or ``None`` if the document fails schema validation."""
+    errors: list[Error]
+    """Errors of the current document."""
+
+    def __init__(self, document: Union[str, bytes, dict[str, Any]], semantic: bool = True) -> None:
+        if isinstance(document, (str, bytes)):
+            document = json.loads(document)
+        self.document = document
+        self.semantic = semantic
+        self._shell: Optional[_Validated] = None
+        self._nodes: dict[int, _Validated] = {}
+        self._contrasts: dict[int, tuple[Any, 'Contrast']] = {}
+        self._edges: dict[int, _Validated] = {}
+        # Semantic errors and F contrasts by node
+        self._checks: dict[int, tuple['Node', list[Error], set[str]]] = {}
+        self._graph_key: Any = None
+        self._graph_errors: list[Error] = []
+        self._revalidate()
+
+    def apply(self, patch: Sequence[Mapping[str, Any]]) -> PatchResult:
+        """Apply a JSON Patch, and revalidate the objects it changes.
+
+        Raises :py:class:`ValueError` if the patch cannot be applied, leaving the
+        editor unchanged.
+        """
+        document = apply_patch(self.document, patch)
+        previous = {_key(error) for error in self.errors}
+        self.document = document
+        self._revalidate()
+        current = {_key(error) for error in self.errors}
+        return PatchResult(
+            model=self.model,
+            errors=self.errors,
+            added=[error for error in self.errors if _key(error) not in previous],
+            removed=[
+                {'loc': list(loc), 'type': type_, 'msg': msg}
+                for loc, type_, msg in previous - current
+            ],
+        )
+
+    def _revalidate(self) -> None:
+        from .models import BIDSStatsModel
+
+        document = self.document
+        if (
+            not isinstance(document, dict)
+            or not isinstance(document.get('Nodes'), list)
+            or not isinstance(document.get('Edges', []), (list, type(None)))
+        ):
+            # The structure is not one we can validate piecewise
+            self._nodes, self._edges, self._shell = {}, {}, None
+            try:
+                self.model = BIDSStatsModel.model_validate(document)
+            except ValidationError as e:
+                self.model, self.errors = None, _format_errors(e)
+                return
+            self.errors = self._check(self.model) if self.semantic else []
+            return
+
+        errors = self._validate_shell(document)
+        self._nodes = self._validate_items(document['Nodes'], self._nodes, self._validate_node)
+        nodes = self._collect('Nodes', document['Nodes'], self._nodes, errors)
+        edges = None
+        if document.get('Edges') is not None:
+            self._edges = self._validate_items(document['Edges'], self._edges, self._validate_edge)
+            edges = self._collect('Edges', document['Edges'], self._edges, errors)
+        self._prune_contrasts()
+
+        if errors:
+            self.model, self.errors = None, errors
+            return
+        assert self._shell is not None
+        shell = self._shell.model
+        fields = {name: getattr(shell, name) for name in shell.model_fields_set}
+        fields.update(Nodes=nodes, Edges=edges)
+        self.model = BIDSStatsModel.model_construct(
+            _fields_set=shell.model_fields_set | {'Nodes'} | ({'Edges'} & document.keys()),
+            **fields,
+        )
+        self.errors = self._check(self.model) if self.semantic else []
+
+    def _validate_shell(self, document: dict[str, Any]) -> list[Error]:
+        """Validate the top-level fields, if changed, returning their errors."""
+        from .models import BIDSStatsModel
+
+        shell = {key: value for key, value in document.items() if key not in ('Nodes', 'Edges')}
+        entry = self._shell
+        if (
+            entry is None
+            or entry.source.keys() != shell.keys()
+            or any(entry.source[key] is not value for key, value in shell.items())
+        ):
+            try:
+                entry = _Validated(
+                    shell, BIDSStatsModel.model_validate({**shell, 'Nodes': []}), []
+                )
+            except ValidationError as e:
+                entry = _Validated(shell, None, _format_errors(e))
+            self._shell = entry
+        return list(entry.errors)
+
+    @staticmethod
+    def _validate_items(
+        items: list[Any], cache: dict[int, _Validated], validate: Callable[[Any], _Validated]
+    ) -> dict[int, _Validated]:
+        """Validate the items of a list that are not in ``cache``, returning a new cache."""
+        validated = {}
+        for item in items:
+            entry = cache.get(id(item))
+            if entry is None or entry.source is not item:
+                entry = validate(item)
+            validated[id(item)] = entry
+        return validated
+
+    @staticmethod
+    def _collect(
+        field: str, items: list[Any], cache: dict[int, _Validated], errors: list[Error]
+    ) -> list[Any]:
+        models = []
+        for i, item in enumerate(items):
+            entry = cache[id(item)]
+            errors.extend(_prefix([field, i], entry.errors))
+            models.append(entry.model)
+        return models
+
+    def _validate_node(self, source: Any) -> _Validated:
+        from .models import Node
+
+        data = source
+        contrasts = source.get('Contrasts') if isinstance(source, dict) else None
+        if isinstance(contrasts, list):
+            # Pydantic accepts Contrast instances without revalidating them
+            data = {**source, 'Contrasts': [self._contrast(item) for item in contrasts]}
+        try:
+            node = Node.model_validate(data)
+        except ValidationError as e:
+            return _Validated(source, None, _format_errors(e))
+        for item, contrast in zip(contrasts or (), node.Contrasts or ()):
+            self._contrasts[id(item)] = (item, contrast)
+        return _Validated(source, node, [])
+
+    def _contrast(self, source: Any) -> Any:
+        cached = self._contrasts.get(id(source))
+        return cached[1] if cached is not None and cached[0] is source else source
+
+    def _prune_contrasts(self) -> None:
+        live = sum(
+            len(entry.model.Contrasts or ()) for entry in self._nodes.values() if entry.model
+        )
+        if len(self._contrasts) > 2 * live + 64:
+            self._contrasts = {
+                id(item): (item, contrast)
+                for entry in self._nodes.values()
+                if entry.model is not None
+                for item, contrast in zip(
+                    entry.source.get('Contrasts') or (), entry.model.Contrasts or ()
+                )
+            }
+
+    @staticmethod
+    def _validate_edge(source: Any) -> _Validated:
+        from .models import Edge
+
+        try:
+            return _Validated(source, Edge.model_validate(source), [])
+        except ValidationError as e:
+            return _Validated(source, None, _format_errors(e))
+
+    def _check(self, model: 'BIDSStatsModel') -> list[Error]:
+        """Semantic errors, rechecking only changed nodes and, if needed, the graph."""
+        errors: list[Error] = []
+        checks = {}
+        f_contrasts: dict[str, set[str]] = {}
+        for i, node in enumerate(model.Nodes):
+            cached = self._checks.get(id(node))
+            if cached is None or cached[0] is not node:
+                node_errors = _Errors()
+                cached = (node, node_errors, _check_node(node, [], node_errors))
+            checks[id(node)] = cached
+            errors.extend(_prefix(['Nodes', i], cached[1]))
+            f_contrasts.setdefault(node.Name, set()).update(cached[2])
+        self._checks = checks
+
+        edges: list['Edge'] = model.Edges or []
+        graph_key = (
+            [(node.Name, checks[id(node)][2]) for node in model.Nodes],
+            model.Edges is None,
+            [id(edge) for edge in edges],
+        )
+        if graph_key != self._graph_key:
+            graph_errors = _Errors()
+            _check_graph(model, f_contrasts, graph_errors)
+            self._graph_key, self._graph_errors = graph_key, graph_errors
+        return errors + self._graph_errors
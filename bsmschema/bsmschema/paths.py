@@ -0,0 +1,51 @@
+"""Discovery of BIDS Stats Models files.
+
+This module has no dependencies, so that it may be used by lightweight clients.
+"""
+
+import glob
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Optional, Union
+
+__all__ = ['DEFAULT_PATTERN', 'iter_model_paths']
+
+DEFAULT_PATTERN = '*_smdl.json'
+
+PathLike = Union[str, 'os.PathLike[str]']
+
+
+def iter_model_paths(
+    targets: Iterable[PathLike],
+    pattern: str = DEFAULT_PATTERN,
+    unmatched: Optional[list[PathLike]] = None,
+) -> Iterator[Path]:
+    """Expand files, directories and globs into a stream of model paths.
+
+    Directories are searched recursively for files matching ``pattern``.
+    Targets that do not exist are interpreted as (recursive) glob expressions.
+    Each path is yielded at most once.
+    Targets that match no files are appended to ``unmatched``, if given, as they are
+    reached.
+    """
+    seen: set[Path] = set()
+    for target in targets:
+        matched = False
+        path = Path(target)
+        if path.is_dir():
+            candidates: Iterable[Path] = sorted(path.rglob(pattern))
+        elif path.exists():
+            candidates = [path]
+        else:
+            candidates = (Path(match) for match in sorted(glob.iglob(str(target), recursive=True)))
+        for candidate in candidates:
+            if candidate.is_dir():
+                continue
+            matched = True
+            if candidate in seen:
+                continue
+            seen.add(candidate)
+            yield candidate
+        if not matched and unmatched is not None:
+            unmatched.append(target)
@@ -0,0 +1,403 @@
+r"""Execution plans for :py:class:`~bsmschema.models.BIDSStatsModel`\s.
+
+:py:func:`plan_model` walks the nodes of a model in topological order and resolves
+the inputs of every node into individual model fits:
+
+* Root nodes receive the rows of the input table that pass
+  :py:attr:`BIDSStatsModel.Input <bsmschema.models.BIDSStatsModel.Input>`.
+* Each node partitions its inputs by :py:attr:`Node.GroupBy
+  <bsmschema.models.Node.GroupBy>` (see :py:mod:`bsmschema.groupby`), producing one
+  :py:class:`Fit` per group.
+* Each fit produces one output per ``"t"`` or ``"pass"`` contrast.
+  Outputs carry the ``"contrast"`` entity and every entity that is constant within
+  the groups of the node.
+* The outputs of a node that pass :py:attr:`Edge.Filter <bsmschema.models.Edge.Filter>`
+  become the inputs of the destination node.
+
+A fit depends on exactly the fits that produced its inputs, so a subject-level fit
+may start as soon as the run-level fits of that subject are complete.
+Fits are also assigned to waves: every fit in a wave depends only on fits in
+earlier waves.
+
+:py:func:`run_plan` executes a plan on a thread or process pool.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> import numpy as np
+>>> from bsmschema.models import BIDSStatsModel
+>>> model = BIDSStatsModel.model_validate({
+...     'Name': 'example',
+...     'BIDSModelVersion': '1.0.0',
+...     'Nodes': [
+...         {'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...          'Model': {'Type': 'glm', 'X': [1, 'A']},
+...          'DummyContrasts': {'Contrasts': ['A'], 'Test': 't'}},
+...         {'Level': 'Subject', 'Name': 'subject', 'GroupBy': ['subject', 'contrast'],
+...          'Model': {'Type': 'meta', 'X': [1]},
+...          'DummyContrasts': {'Test': 't'}},
+...     ],
+... })
+>>> plan = plan_model(model, {
+...     'subject': np.array(['01', '01', '02', '02']),
+...     'run': np.array([1, 2, 1, 2]),
+... })
+>>> plan.counts
+{'run': 4, 'subject': 2}
+>>> [fit.depends for fit in plan.fits]
+[(), (), (), (), (0, 2), (1, 3)]
+>>> plan.waves
+[[0, 1, 2, 3], [4, 5]]
+>>> plan.fits[4].key, plan.fits[4].contrasts
+({'subject': '01', 'contrast': 'A'}, ('A',))
+"""
+
+import heapq
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
+
+import numpy as np
+
+from .contrasts import INTERCEPT_NAME
+from .filters import IndexedTable, select
+from .groupby import partition
+from .wildcards import expand, is_pattern
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel, Node
+
+__all__ = [
+    'ExecutionPlan',
+    'Fit',
+    'NodePlan',
+    'output_contrasts',
+    'plan_model',
+    'run_plan',
+]
+
+FitFunction = Callable[['Fit', dict[int, Any]], Any]
+ProgressFunction = Callable[[int, int, 'Fit'], None]
+
+
+@dataclass(frozen=True, eq=False)
+class Fit:
+    """A single model fit: one group of inputs to one node."""
+
+    id: int
+    """Position of the fit in :py:attr:`ExecutionPlan.fits`."""
+    node: str
+    """Name of the node."""
+    key: dict[str, Any]
+    """Values of the grouping variables of the node for this fit."""
+    rows: np.ndarray
+    """Rows of the input table of the node (:py:attr:`NodePlan.inputs`)."""
+    depends: tuple[int, ...]
+    """Fits that produce the inputs of this fit."""
+    wave: int
+    """Length of the longest chain of fits this fit depends on."""
+    contrasts: tuple[str, ...]
+    """Names of the outputs of this fit."""
+
+
+@dataclass(frozen=True, eq=False)
+class NodePlan:
+    """Inputs, fits and outputs of a single node."""
+
+    node: 'Node'
+    """The node."""
+    inputs: IndexedTable
+    """Table of inputs to the node."""
+    fits: range
+    """Identifiers of the fits of the node."""
+    outputs: IndexedTable
+    """Table of outputs of the node, one row per output of each fit."""
+    output_fits: np.ndarray
+    """Fit that produces each row of :py:attr:`outputs`."""
+
+
+class ExecutionPlan:
+    """The fits of a model, with the dependencies between them."""
+
+    fits: list[Fit]
+    """All fits, ordered by node (in topological order) and by group within nodes."""
+    nodes: dict[str, NodePlan]
+    """Plans of the individual nodes, in topological order."""
+    dependents: dict[int, list[int]]
+    """Map of fits to the fits that depend on them."""
+
+    def __init__(self, fits: list[Fit], nodes: dict[str, NodePlan]) -> None:
+        self.fits = fits
+        self.nodes = nodes
+        self.dependents = {fit.id: [] for fit in fits}
+        for fit in fits:
+            for dep in fit.depends:
+                self.dependents[dep].append(fit.id)
+
+    def __len__(self) -> int:
+        return len(self.fits)
+
+    @property
+    def counts(self) -> dict[str, int]:
+        """Number of fits of each node."""
+        return {name: len(node.fits) for name, node in self.nodes.items()}
+
+    @property
+    def waves(self) -> list[list[int]]:
+        """Fits grouped into waves of mutually independent fits."""
+        waves: list[list[int]] = []
+        for fit in self.fits:
+            while len(waves) <= fit.wave:
+                waves.append([])
+            waves[fit.wave].append(fit.id)
+        return waves
+
+
+def output_contrasts(
+    node: 'Node',
+    columns: Optional[Sequence[Union[int, str]]] = None,
+) -> list[str]:
+    """Names of the contrasts of a node that are passed on to following nodes.
+
+    ``"F"`` contrasts are terminal and excluded.
+    Wildcards in :py:attr:`DummyContrasts.Contrasts
+    <bsmschema.models.DummyContrasts.Contrasts>` and :py:attr:`Model.X
+    <bsmschema.models.Model.X>` are expanded against ``columns``, if given;
+    otherwise they raise :py:class:`ValueError`.
+    """
+    names = [contrast.Name for contrast in node.Contrasts or () if contrast.Test != 'F']
+    dummy = node.DummyContrasts
+    if dummy is not None and dummy.Test != 'F':
+        conditions: Sequence[Union[int, str]] = (
+            node.Model.X if dummy.Contrasts is None else dummy.Contrasts
+        )
+        if columns is not None:
+            conditions = expand(conditions, expand(node.Model.X, columns))
+        elif any(is_pattern(cond) for cond in conditions):
+            raise ValueError(
+                f'Node {node.Name!r}: design columns are required to expand wildcards'
+            )
+        names.extend(INTERCEPT_NAME if cond == 1 else str(cond) for cond in conditions)
+    return names
+
+
+def _as_table(table: Any) -> IndexedTable:
+    return table if isinstance(table, IndexedTable) else IndexedTable(table)
+
+
+def _concat(parts: list[tuple[NodePlan, np.ndarray]]) -> tuple[IndexedTable, np.ndarray]:
+    names: dict[str, None] = {}
+    for source, _ in parts:
+        names.update(dict.fromkeys(source.outputs.names))
+    columns = {}
+    for name in names:
+        arrays = []
+        for source, rows in parts:
+            if name in source.outputs:
+                arrays.append(np.asarray(source.outputs.columns[name])[rows])
+            else:
+                arrays.append(np.full(len(rows), None, dtype=object))
+        columns[name] = np.concatenate(arrays) if arrays else np.empty(0)
+    fits = [source.output_fits[rows] for source, rows in parts]
+    num_rows = sum(len(rows) for _, rows in parts)
+    return IndexedTable(columns, num_rows), np.concatenate(fits).astype(np.intp)
+
+
+def plan_model(
+    model: 'BIDSStatsModel',
+    table: Any,
+    columns: Optional[Mapping[str, Sequence[Union[int, str]]]] = None,
+) -> ExecutionPlan:
+    """Resolve a model and a table of inputs into an :py:class:`ExecutionPlan`.
+
+    Parameters
+    ----------
+    model
+        The model to plan.
+    table
+        Inputs to the root nodes, one row per input, as an
+        :py:class:`~bsmschema.filters.IndexedTable` or any table it accepts.
+    columns
+        Map of node names to their available design columns, used to expand
+        wildcards when naming the outputs of nodes.
+
+    When a node groups by ``"contrast"``, the outputs of its intercept are named after
+    the contrast of the group, following the convention of passing contrasts
+    through higher levels of a model.
+
+    Raises :py:class:`ValueError` if the model graph contains a cycle.
+    """
+    graph = model.graph
+    order = graph.topological_order
+    table = _as_table(table)
+    input_rows = select(table, model.Input)
+    columns = columns or {}
+
+    fits: list[Fit] = []
+    nodes: dict[str, NodePlan] = {}
+    for name in order:
+        node = graph.nodes[name]
+        if graph.parents[name]:
+            parts = [
+                (nodes[edge.Source], select(nodes[edge.Source].outputs, edge.Filter))
+                for edge in graph.incoming[name]
+            ]
+            inputs, input_fits = _concat(parts)
+            groups = partition(inputs, node)
+        else:
+            inputs, input_fits = table, None
+            groups = partition(inputs, node, input_rows)
+
+        names = output_contrasts(node, columns.get(name))
+        rename = 'contrast' in node.GroupBy and INTERCEPT_NAME in names
+        first = len(fits)
+        contrast_column: list[str] = []
+        for group in groups:
+            if input_fits is None:
+                depends: tuple[int, ...] = ()
+                wave = 0
+            else:
+                depends = tuple(np.unique(input_fits[group.rows]).tolist())
+                wave = 1 + max((fits[dep].wave for dep in depends), default=-1)
+            contrasts = names
+            if rename and group.key['contrast'] is not None:
+                contrast = str(group.key['contrast'])
+                contrasts = [contrast if c == INTERCEPT_NAME else c for c in names]
+            contrast_column.extend(contrasts)
+            fits.append(
+                Fit(
+                    id=len(fits),
+                    node=name,
+                    key=group.key,
+                    rows=group.rows,
+                    depends=depends,
+                    wave=wave,
+                    contrasts=tuple(contrasts),
+                )
+            )
+
+        # Outputs inherit the entities that are constant within each fit
+        outputs: dict[str, np.ndarray] = {}
+        for entity in inputs.names:
+            index = inputs.index(entity)
+            if entity == 'contrast' or index is None:
+                continue
+            codes = groups.common(index)
+            if codes is not None:
+                values = np.array([index.values[code] for code in codes.tolist()])
+                outputs[entity] = np.repeat(values, len(names))
+        outputs['contrast'] = np.array(contrast_column, dtype=str)
+        node_fits = range(first, len(fits))
+        nodes[name] = NodePlan(
+            node=node,
+            inputs=inputs,
+            fits=node_fits,
+            outputs=IndexedTable(outputs, len(contrast_column)),
+            output_fits=np.repeat(np.arange(first, len(fits), dtype=np.intp), len(names)),
+        )
+    return ExecutionPlan(fits, nodes)
+
+
+def _make_executor(executor: str, max_workers: Optional[int]) -> Executor:
+    if executor == 'thread':
+        return ThreadPoolExecutor(max_workers)
+    if executor == 'process':
+        return ProcessPoolExecutor(max_workers)
+    raise ValueError(f'Unknown executor: {executor!r}')
+
+
+def run_plan(
+    plan: ExecutionPlan,
+    fit: Union[FitFunction, Mapping[str, FitFunction]],
+    executor: Union[str, Executor] = 'thread',
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    progress: Optional[ProgressFunction] = None,
+) -> dict[int, Any]:
+    """Execute the fits of a plan, each as soon as the fits it depends on are complete.
+
+    Parameters
+    ----------
+    plan
+        The plan to execute.
+    fit
+        Function called as ``fit(fit, inputs)``, where ``inputs`` maps the identifiers of
+        the fits in :py:attr:`Fit.depends` to their results, or a map of node names
+        to such functions.
+        Functions must be picklable to be used with a process pool.
+    executor
+        ``"thread"`` or ``"process"`` to create a pool for the duration of the call,
+        or an existing :py:class:`concurrent.futures.Executor`, which is not shut down.
+    max_workers
+        Number of workers of a created pool. Defaults to the number of CPUs.
+    max_pending
+        Maximum number of fits submitted but not yet complete.
+        Defaults to twice ``max_workers``.
+    progress
+        Function called as ``progress(done, total, fit)`` after each fit completes.
+
+    Ready fits are submitted deepest first, and the result of a fit is released once
+    every fit depending on it is complete, which bounds the number of results held.
+    Returns the results of the fits that no other fit depends on.
+    If a fit raises an exception, pending fits are cancelled and the exception is re-raised.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * max_workers
+    max_pending = max(max_pending, 1)
+
+    def function(item: Fit) -> FitFunction:
+        return fit[item.node] if isinstance(fit, Mapping) else fit
+
+    fits = plan.fits
+    waiting = {item.id: len(item.depends) for item in fits}
+    consumers = {item.id: len(plan.dependents[item.id]) for item in fits}
+    ready = [(-item.wave, item.id) for item in fits if not item.depends]
+    heapq.heapify(ready)
+    results: dict[int, Any] = {}
+    pending: dict[Future[Any], int] = {}
+    done = 0
+
+    pool = _make_executor(executor, max_workers) if isinstance(executor, str) else executor
+    try:
+        while ready or pending:
+            while ready and len(pending) < max_pending:
+                item = fits[heapq.heappop(ready)[1]]
+                inputs = {dep: results[dep] for dep in item.depends}
+                pending[pool.submit(function(item), item, inputs)] = item.id
+
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                item = fits[pending.pop(future)]
+                results[item.id] = future.result()
+                for dep in item.depends:
+                    consumers[dep] -= 1
+                    if not consumers[dep]:
+                        del results[dep]
+                for child in plan.dependents[item.id]:
+                    waiting[child] -= 1
+                    if not waiting[child]:
+                        heapq.heappush(ready, (-fits[child].wave, child))
+                done += 1
+                if progress is not None:
+                    progress(done, len(fits), item)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+    finally:
+        if isinstance(executor, str):
+            pool.shutdown(wait=True, cancel_futures=True)
+    return results
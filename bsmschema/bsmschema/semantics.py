@@ -0,0 +1,202 @@
+"""Semantic validation of :py:class:`~bsmschema.models.BIDSStatsModel` objects.
+
+Validating against the schema checks the shape of each field, but not the rules that
+relate fields to one another.
+:py:func:`check_model` checks these rules in a single pass over the model, building
+one index of node names and, per node, one index of design columns and contrast names:
+
+* Node names are unique (``duplicate_node``) and the graph has no cycles (``cycle``).
+* Edges name existing nodes (``unknown_node``).
+* Contrast names are unique within a node (``duplicate_contrast``) and do not
+  appear in :py:attr:`DummyContrasts.Contrasts
+  <bsmschema.models.DummyContrasts.Contrasts>` (``contrast_conflict``).
+* :py:attr:`Contrast.ConditionList <bsmschema.models.Contrast.ConditionList>`,
+  :py:attr:`DummyContrasts.Contrasts <bsmschema.models.DummyContrasts.Contrasts>` and
+  :py:attr:`HRF.Variables <bsmschema.models.HRF.Variables>` are included in
+  :py:attr:`Model.X <bsmschema.models.Model.X>` (``unknown_variable``).
+  Wildcards in ``X`` are honored; variables containing wildcards are not checked.
+* Weights have one entry per condition (``weights_length``), and ``"t"`` contrasts
+  have 1D weights (``weights_dimension``).
+* ``"F"`` contrasts are terminal, so edges do not filter on them (``terminal_contrast``).
+
+Every violation is reported, in the same form as the errors of
+:py:class:`~bsmschema.batch.ValidationResult`.
+
+Examples
+--------
+
+>>> from bsmschema.models import BIDSStatsModel
+>>> model = BIDSStatsModel.model_validate({
+...     'Name': 'example',
+...     'BIDSModelVersion': '1.0.0',
+...     'Nodes': [
+...         {'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...          'Model': {'Type': 'glm', 'X': [1, 'A']},
+...          'Contrasts': [{'Name': 'AvB', 'ConditionList': ['A', 'B'],
+...                         'Weights': [1, -1], 'Test': 't'}]},
+...     ],
+...     'Edges': [{'Source': 'run', 'Destination': 'subject'}],
+... })
+>>> for error in check_model(model):
+...     print(error['loc'], error['type'])
+['Nodes', 0, 'Contrasts', 0, 'ConditionList', 1] unknown_variable
+['Edges', 0, 'Destination'] unknown_node
+"""
+
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, Union
+
+from .wildcards import is_pattern, match
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel, Node
+
+__all__ = ['check_model']
+
+Loc = list[Union[str, int]]
+
+
+class _Errors(list[dict[str, Any]]):
+    def add(self, loc: Loc, msg: str, type: str) -> None:
+        self.append({'loc': loc, 'msg': msg, 'type': type})
+
+
+class _Columns:
+    """Membership test for the variables of ``Model.X``, including wildcards."""
+
+    def __init__(self, X: Sequence[Union[int, str]]) -> None:
+        self.names = set(X)
+        self.patterns = [var for var in X if isinstance(var, str) and is_pattern(var)]
+
+    def __contains__(self, variable: Union[int, str]) -> bool:
+        if variable in self.names or is_pattern(variable):
+            return True
+        return isinstance(variable, str) and any(
+            match(pattern, variable) for pattern in self.patterns
+        )
+
+
+def _check_node(node: 'Node', loc: Loc, errors: _Errors) -> set[str]:
+    """Check the rules internal to a node, returning the names of its F contrasts."""
+    X = _Columns(node.Model.X)
+    # Variables of HRF.Variables, DummyContrasts.Contrasts and ConditionList
+    var: Union[int, str]
+
+    hrf = node.Model.HRF
+    if hrf is not None:
+        for k, var in enumerate(hrf.Variables):
+            if var not in X:
+                errors.add(
+                    [*loc, 'Model', 'HRF', 'Variables', k],
+                    f'HRF variable {var!r} is not in Model.X',
+                    'unknown_variable',
+                )
+
+    dummy = node.DummyContrasts
+    dummy_names: set[Union[int, str]] = set()
+    if dummy is not None and dummy.Contrasts is not None:
+        for k, var in enumerate(dummy.Contrasts):
+            dummy_names.add(var)
+            if var not in X:
+                errors.add(
+                    [*loc, 'DummyContrasts', 'Contrasts', k],
+                    f'Dummy contrast {var!r} is not in Model.X',
+                    'unknown_variable',
+                )
+
+    names: set[str] = set()
+    f_contrasts = set()
+    for j, contrast in enumerate(node.Contrasts or ()):
+        cloc = [*loc, 'Contrasts', j]
+        if contrast.Name in names:
+            errors.add(
+                [*cloc, 'Name'], f'Duplicate contrast name {contrast.Name!r}', 'duplicate_contrast'
+            )
+        elif contrast.Name in dummy_names:
+            errors.add(
+                [*cloc, 'Name'],
+                f'Contrast name {contrast.Name!r} also appears in DummyContrasts.Contrasts',
+                'contrast_conflict',
+            )
+        names.add(contrast.Name)
+        if contrast.Test == 'F':
+            f_contrasts.add(contrast.Name)
+
+        for k, var in enumerate(contrast.ConditionList):
+            if var not in X:
+                errors.add(
+                    [*cloc, 'ConditionList', k],
+                    f'Condition {var!r} is not in Model.X',
+                    'unknown_variable',
+                )
+
+        weights = contrast.Weights
+        rows = weights if weights and isinstance(weights[0], list) else [weights]
+        if contrast.Test == 't' and rows is weights:
+            errors.add([*cloc, 'Weights'], 't contrasts must have 1D weights', 'weights_dimension')
+        nconds = len(contrast.ConditionList)
+        if any(len(row) != nconds for row in rows):
+            errors.add(
+                [*cloc, 'Weights'],
+                f'Weights do not match ConditionList of length {nconds}',
+                'weights_length',
+            )
+
+    # Dummy contrasts of the intercept are named as in bsmschema.contrasts.INTERCEPT_NAME
+    if dummy is not None and dummy.Test == 'F':
+        f_contrasts.update(
+            'intercept' if var == 1 else str(var)
+            for var in (node.Model.X if dummy.Contrasts is None else dummy.Contrasts)
+        )
+    return f_contrasts
+
+
+def _check_graph(
+    model: 'BIDSStatsModel', f_contrasts: dict[str, set[str]], errors: _Errors
+) -> None:
+    """Check the rules relating nodes to one another, given the F contrasts of each node."""
+    positions: dict[str, int] = {}
+    for i, node in enumerate(model.Nodes):
+        if node.Name in positions:
+            errors.add(
+                ['Nodes', i, 'Name'], f'Duplicate node name {node.Name!r}', 'duplicate_node'
+            )
+        else:
+            positions[node.Name] = i
+
+    for i, edge in enumerate(model.Edges or ()):
+        for field, name in (('Source', edge.Source), ('Destination', edge.Destination)):
+            if name not in positions:
+                errors.add(['Edges', i, field], f'Unknown node {name!r}', 'unknown_node')
+        terminal = f_contrasts.get(edge.Source)
+        if terminal and edge.Filter:
+            for k, value in enumerate(edge.Filter.get('contrast', ())):
+                if value in terminal:
+                    errors.add(
+                        ['Edges', i, 'Filter', 'contrast', k],
+                        f'F contrast {value!r} is terminal and cannot be passed to '
+                        f'{edge.Destination!r}',
+                        'terminal_contrast',
+                    )
+
+    for name in model.graph.cyclic:
+        errors.add(
+            ['Nodes', positions[name], 'Name'],
+            f'Node {name!r} is part of, or only reachable through, a cycle',
+            'cycle',
+        )
+
+
+def check_model(model: 'BIDSStatsModel') -> list[dict[str, Any]]:
+    """Check the rules relating fields of a model to one another.
+
+    Returns a list of errors, each with ``loc``, ``msg`` and ``type`` keys.
+    An empty list indicates that no rules are violated.
+    The work is linear in the size of the model.
+    """
+    errors = _Errors()
+    f_contrasts: dict[str, set[str]] = {}
+    for i, node in enumerate(model.Nodes):
+        f_contrasts.setdefault(node.Name, set()).update(_check_node(node, ['Nodes', i], errors))
+    _check_graph(model, f_contrasts, errors)
+    return errors
@@ -0,0 +1,254 @@
+"""Compact binary and canonical JSON serializations of models.
+
+Models are archived and exchanged in large numbers, for which the JSON written by
+:py:meth:`~pydantic.BaseModel.model_dump_json` is verbose.
+This module provides two alternatives:
+
+* :py:func:`dumps_json` writes canonical JSON: minified, with sorted keys, and omitting
+  fields equal to their defaults, including explicit ``null`` values, so that equal
+  models have identical bytes, suitable for content addressing.
+* :py:func:`dumps` and :py:class:`ModelWriter` write a compact binary format, read with
+  :py:func:`loads` and :py:func:`read_models`.
+
+The binary format serializes the fields that are set on a model, including fields
+explicitly set to ``null``, so that models round-trip exactly.
+In both, weights written as fractions remain strings, and the intercept ``1`` remains
+an integer.
+
+Binary format
+-------------
+
+A binary stream is a header followed by any number of records, one per model.
+The header is the magic bytes ``BSMB``, a version byte, and a dictionary of the field
+names and enumerated values of :py:mod:`bsmschema.models`, as JSON fragments.
+Each record is the minified JSON of the fields set on a model, compressed as a
+`zlib <https://www.rfc-editor.org/rfc/rfc1950>`_ stream with the dictionary of the
+header as its preset dictionary, so that field names cost a few bits each even in small
+models.
+Records are preceded by their length, and are decoded independently of one another.
+Lengths are unsigned LEB128 varints.
+
+Compression and decompression run in C, as does parsing the decompressed JSON, so
+reading a record is faster than reading the equivalent pretty-printed JSON, and records
+are around a tenth of its size.
+
+Examples
+--------
+
+>>> from bsmschema.models import BIDSStatsModel
+>>> model = BIDSStatsModel.model_validate({
+...     'Name': 'example',
+...     'BIDSModelVersion': '1.0.0',
+...     'Nodes': [
+...         {'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...          'Model': {'Type': 'glm', 'X': [1, 'A', 'B']},
+...          'Contrasts': [{'Name': 'AvB', 'ConditionList': ['A', 'B'],
+...                         'Weights': [1, '-1/1'], 'Test': 't'}]},
+...     ],
+... })
+>>> dumps_json(model)[:60]
+b'{"BIDSModelVersion":"1.0.0","Name":"example","Nodes":[{"Cont'
+>>> loads(dumps(model)) == model
+True
+>>> loads(dumps(model)).Nodes[0].Contrasts[0].Weights
+[1, '-1/1']
+"""
+
+import json
+import typing
+import zlib
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from io import BytesIO
+from typing import IO, TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import BIDSStatsModel
+
+__all__ = [
+    'ModelWriter',
+    'dumps',
+    'dumps_json',
+    'loads',
+    'read_models',
+]
+
+MAGIC = b'BSMB'
+VERSION = 1
+
+
+def _encode(document: Any) -> bytes:
+    return json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def dumps_json(model: 'BIDSStatsModel') -> bytes:
+    """Serialize a model as canonical JSON.
+
+    Keys are sorted, and fields equal to their defaults are omitted whether or not they
+    were set, so equal models produce identical bytes, and the result may be hashed for
+    content addressing.
+    """
+    return _encode(model.model_dump(mode='json', exclude_defaults=True))
+
+
+@lru_cache(maxsize=1)
+def _dictionary() -> bytes:
+    """Field names and enumerated values of the models, as they appear in JSON."""
+    from . import models
+
+    fragments: dict[str, None] = {}
+    for alias in (
+        models.NodeLevel,
+        models.ModelType,
+        models.TransformerID,
+        models.Aggregate,
+        models.StatisticalTest,
+    ):
+        fragments.update(dict.fromkeys(f'"{value}"' for value in typing.get_args(alias)))
+    for obj in vars(models).values():
+        if isinstance(obj, type) and issubclass(obj, models._BSMBase):
+            fragments.update(dict.fromkeys(f'"{name}":' for name in sorted(obj.model_fields)))
+    return ''.join(fragments).encode()
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+class ModelWriter:
+    """Write models to a binary stream, one record at a time.
+
+    The header is written on creation, so ``file`` should be positioned at the start
+    of the stream.
+    ``level`` is the zlib compression level, from 1 (fastest) to 9 (smallest).
+
+    >>> from bsmschema.models import BIDSStatsModel
+    >>> models = [
+    ...     BIDSStatsModel.model_validate({
+    ...         'Name': name, 'BIDSModelVersion': '1.0.0',
+    ...         'Nodes': [{'Level': 'Run', 'Name': 'run', 'GroupBy': ['run'],
+    ...                    'Model': {'Type': 'glm', 'X': [1]}}],
+    ...     })
+    ...     for name in ('first', 'second')
+    ... ]
+    >>> stream = BytesIO()
+    >>> ModelWriter(stream).write_all(models)
+    2
+    >>> stream.seek(0)
+    0
+    >>> [model.Name for model in read_models(stream)]
+    ['first', 'second']
+    """
+
+    def __init__(self, file: IO[bytes], level: int = 6) -> None:
+        self._file = file
+        self._level = level
+        self._dictionary = _dictionary()
+        file.write(MAGIC + bytes([VERSION]) + _varint(len(self._dictionary)) + self._dictionary)
+
+    def write(self, model: 'BIDSStatsModel') -> None:
+        """Write one model as a record."""
+        compressor = zlib.compressobj(self._level, zdict=self._dictionary)
+        record = (
+            compressor.compress(_encode(model.model_dump(mode='json', exclude_unset=True)))
+            + compressor.flush()
+        )
+        self._file.write(_varint(len(record)) + record)
+
+    def write_all(self, models: Iterable['BIDSStatsModel']) -> int:
+        """Write models as records, returning the number written."""
+        count = 0
+        for model in models:
+            self.write(model)
+            count += 1
+        return count
+
+
+# Lengths are at most 64 bits, which take ten bytes
+_MAX_VARINT_SHIFT = 63
+
+
+def _read_varint(read: Callable[[int], bytes]) -> int:
+    """Read a length, raising :py:class:`EOFError` only at a clean end of stream."""
+    result = shift = 0
+    while True:
+        byte = read(1)
+        if not byte:
+            if shift:
+                raise ValueError('Unexpected end of stream')
+            raise EOFError
+        result |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return result
+        shift += 7
+        if shift > _MAX_VARINT_SHIFT:
+            raise ValueError('Corrupt record: length prefix is too long')
+
+
+def _read_exactly(read: Callable[[int], bytes], size: int) -> bytes:
+    data = read(size)
+    if len(data) != size:
+        raise ValueError('Unexpected end of stream')
+    return data
+
+
+def _records(file: IO[bytes]) -> Iterator[bytes]:
+    """The decompressed records of a binary stream."""
+    read = file.read
+    if read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a bsmschema binary stream')
+    version = _read_exactly(read, 1)[0]
+    if version != VERSION:
+        raise ValueError(f'Unsupported binary format version {version}')
+    try:
+        dictionary = _read_exactly(read, _read_varint(read))
+    except EOFError:
+        raise ValueError('Unexpected end of stream') from None
+    while True:
+        try:
+            length = _read_varint(read)
+        except EOFError:
+            return
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        try:
+            data = decompressor.decompress(_read_exactly(read, length))
+        except zlib.error as e:
+            raise ValueError(f'Corrupt record: {e}') from e
+        if not decompressor.eof or decompressor.unused_data:
+            raise ValueError('Corrupt record: unexpected record length')
+        yield data
+
+
+def read_models(file: IO[bytes]) -> Iterator['BIDSStatsModel']:
+    """Read and validate the models of a binary stream, one at a time.
+
+    Raises :py:class:`ValueError` if the stream is corrupt, or
+    :py:class:`pydantic.ValidationError` if a record is not a valid model.
+    """
+    from .models import BIDSStatsModel
+
+    for data in _records(file):
+        yield BIDSStatsModel.model_validate_json(data)
+
+
+def dumps(model: 'BIDSStatsModel') -> bytes:
+    """Serialize a model as a binary stream of one record.
+
+    To serialize many models, :py:class:`ModelWriter` writes the header once.
+    """
+    stream = BytesIO()
+    ModelWriter(stream).write(model)
+    return stream.getvalue()
+
+
+def loads(data: bytes) -> 'BIDSStatsModel':
+    """Deserialize a model from a binary stream of one record."""
+    models = list(read_models(BytesIO(data)))
+    if len(models) != 1:
+        raise ValueError(f'Expected one model, found {len(models)}')
+    return models[0]
@@ -0,0 +1,274 @@
+"""A long-running validation server.
+
+Starting Python and building the validators of :py:class:`~bsmschema.models.BIDSStatsModel`
+dominates the cost of validating a single file in a new process.
+:py:class:`ValidationServer` keeps warm validators in a pool of workers and answers
+requests over a Unix domain socket or a localhost TCP port, so that clients such as
+editor plugins and pre-commit hooks (see :py:mod:`bsmschema.client`) pay only for
+the validation itself.
+
+Protocol
+--------
+
+Clients send newline-delimited JSON.
+Each line is either a single request object or an array of request objects, and
+is answered by a line holding a single result or an array of results, in order.
+Lines are processed concurrently, and answered in the order they were received.
+
+A request names a file by ``"path"``, or passes its contents as ``"text"`` (a JSON
+string) or ``"document"`` (a JSON object).
+If ``"semantic"`` is true, models that pass schema validation are also checked with
+:py:func:`~bsmschema.semantics.check_model`.
+An ``"id"`` is copied to the result::
+
+    {"id": 1, "path": "/data/model-example_smdl.json", "semantic": true}
+
+Results have the fields of :py:class:`~bsmschema.batch.ValidationResult`,
+plus ``"id"`` if given.
+
+Examples
+--------
+
+.. code-block:: console
+
+   $ python -m bsmschema serve --socket /tmp/bsmschema.sock &
+   $ python -m bsmschema client --socket /tmp/bsmschema.sock model-example_smdl.json
+"""
+
+import asyncio
+import contextlib
+import errno
+import json
+import os
+import signal
+import socket as _socket
+import stat
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from pydantic import ValidationError
+
+from .batch import ValidationResult, _format_errors
+from .client import default_socket_path
+from .models import BIDSStatsModel
+from .semantics import check_model
+
+__all__ = [
+    'ValidationServer',
+    'default_socket_path',
+    'validate_request',
+]
+
+PathLike = Union[str, 'os.PathLike[str]']
+
+# Lines may hold large batches or documents
+LINE_LIMIT = 2**26
+
+
+def _warm() -> None:
+    """Build validators ahead of the first request."""
+    check_model(
+        BIDSStatsModel.model_validate({'Name': 'warm', 'BIDSModelVersion': '1.0.0', 'Nodes': []})
+    )
+
+
+def _remove_stale_socket(path: Path) -> None:
+    """Remove the socket of a server that is no longer running.
+
+    Raises :py:class:`FileExistsError` if the path is not a socket, or if a server is
+    listening on it.
+    """
+    try:
+        mode = path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, 'File exists and is not a socket', str(path))
+    with _socket.socket(_socket.AF_UNIX) as sock:
+        try:
+            sock.connect(str(path))
+        except ConnectionRefusedError:
+            path.unlink()
+            return
+    raise FileExistsError(errno.EADDRINUSE, 'A server is already listening', str(path))
+
+
+def validate_request(request: Any, semantic: bool = False) -> dict[str, Any]:
+    """Validate the model described by a request, returning a result object.
+
+    ``semantic`` is the default for requests that do not set ``"semantic"``.
+    Malformed requests produce a result with a ``bad_request`` error.
+    """
+    start = time.perf_counter()
+    if not isinstance(request, dict):
+        request = {}
+    path = request.get('path')
+    errors: list[dict[str, Any]] = []
+    try:
+        if 'document' in request:
+            model = BIDSStatsModel.model_validate(request['document'])
+        elif 'text' in request:
+            model = BIDSStatsModel.model_validate_json(request['text'])
+        elif isinstance(path, str):
+            model = BIDSStatsModel.model_validate_json(Path(path).read_bytes())
+        else:
+            model = None
+            errors = [
+                {
+                    'loc': [],
+                    'msg': 'Request must be an object with "path", "text" or "document"',
+                    'type': 'bad_request',
+                }
+            ]
+        if model is not None and request.get('semantic', semantic):
+            errors = check_model(model)
+    except ValidationError as e:
+        errors = _format_errors(e)
+    except OSError as e:
+        errors = [{'loc': [], 'msg': str(e), 'type': 'os_error'}]
+    result = ValidationResult(
+        path=path if isinstance(path, str) else '-',
+        ok=not errors,
+        errors=errors,
+        elapsed=time.perf_counter() - start,
+    ).model_dump()
+    if 'id' in request:
+        result['id'] = request['id']
+    return result
+
+
+class ValidationServer:
+    """An asyncio server that validates models in a pool of warm workers.
+
+    Parameters
+    ----------
+    workers
+        Number of workers. Defaults to the number of CPUs.
+    semantic
+        Run semantic checks for requests that do not specify ``"semantic"``.
+    executor
+        ``"process"`` for a process pool, which validates in parallel, or ``"thread"``,
+        which avoids starting processes.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        semantic: bool = False,
+        executor: str = 'process',
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.semantic = semantic
+        self.executor = executor
+        self.pool: Optional[Executor] = None
+        self.requests = 0
+
+    def _start_pool(self) -> Executor:
+        if self.executor == 'process':
+            return ProcessPoolExecutor(self.workers, initializer=_warm)
+        if self.executor == 'thread':
+            _warm()
+            return ThreadPoolExecutor(self.workers)
+        raise ValueError(f'Unknown executor: {self.executor!r}')
+
+    async def _answer(self, line: bytes) -> bytes:
+        assert self.pool is not None
+        loop = asyncio.get_running_loop()
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            error = {'loc': [], 'msg': f'Invalid JSON: {e}', 'type': 'json_invalid'}
+            return json.dumps({'path': '-', 'ok': False, 'errors': [error]}).encode()
+
+        requests = message if isinstance(message, list) else [message]
+        self.requests += len(requests)
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(self.pool, validate_request, request, self.semantic)
+                for request in requests
+            )
+        )
+        return json.dumps(results if isinstance(message, list) else results[0]).encode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the requests of a single connection."""
+        answers: asyncio.Queue[Optional[asyncio.Task[bytes]]] = asyncio.Queue()
+
+        async def respond() -> None:
+            while (task := await answers.get()) is not None:
+                writer.write(await task + b'\n')
+                await writer.drain()
+
+        responder = asyncio.ensure_future(respond())
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    answers.put_nowait(asyncio.ensure_future(self._answer(line)))
+            answers.put_nowait(None)
+            await responder
+        except (ConnectionError, ValueError):
+            # Disconnected, or a line exceeded LINE_LIMIT
+            responder.cancel()
+        finally:
+            writer.close()
+
+    async def serve(
+        self,
+        socket: Optional[PathLike] = None,
+        host: str = '127.0.0.1',
+        port: Optional[int] = None,
+        ready: Optional['asyncio.Event'] = None,
+    ) -> None:
+        """Serve until cancelled, on a Unix socket or, if ``port`` is given, over TCP.
+
+        ``ready`` is set once the server accepts connections.
+        The socket of a server that is no longer running is replaced, and the socket is
+        removed when the server stops.
+        Raises :py:class:`FileExistsError` if the socket path is another file, or the
+        socket of a running server.
+        """
+        path = None if port is not None else Path(socket or default_socket_path())
+        created = None
+        if path is not None:
+            _remove_stale_socket(path)
+        self.pool = self._start_pool()
+        try:
+            if path is None:
+                server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+            else:
+                server = await asyncio.start_unix_server(self.handle, path, limit=LINE_LIMIT)
+                created = path.lstat()
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            if path is not None and created is not None:
+                # Only remove the socket this server created
+                with contextlib.suppress(FileNotFoundError):
+                    current = path.lstat()
+                    if (current.st_dev, current.st_ino) == (created.st_dev, created.st_ino):
+                        path.unlink()
+
+    def run(
+        self,
+        socket: Optional[PathLike] = None,
+        host: str = '127.0.0.1',
+        port: Optional[int] = None,
+    ) -> None:
+        """Serve until interrupted by SIGINT or SIGTERM."""
+
+        async def main() -> None:
+            task = asyncio.ensure_future(self.serve(socket, host, port))
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, task.cancel)
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(main())
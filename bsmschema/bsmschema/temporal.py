@@ -0,0 +1,222 @@
+"""Temporal filtering for :py:attr:`Options.HighPassFilterCutoffHz
+<bsmschema.models.Options.HighPassFilterCutoffHz>` and :py:attr:`Options.LowPassFilterCutoffHz
+<bsmschema.models.Options.LowPassFilterCutoffHz>`.
+
+Filters are defined on the discrete cosine basis of a run, as in SPM and nilearn:
+component :math:`k` of a run of :math:`n` scans with repetition time :math:`T` has a
+frequency of :math:`k / 2nT` Hz.
+A high-pass filter removes the components (other than the constant) with frequencies
+below its cutoff, and a low-pass filter removes those with frequencies above its cutoff.
+Filtering projects out the removed components, or projects onto the kept components
+when there are fewer of them, so it costs two matrix products.
+
+:py:func:`filter_basis` returns bases from a cache keyed by (number of scans, repetition
+time, cutoffs), so the many runs of a dataset with the same acquisition share a single
+basis.
+:py:meth:`FilterBasis.filter_design` caches filtered design matrices in the same way,
+and :py:meth:`FilterBasis.apply` filters data arrays in chunks of voxels.
+
+This module requires NumPy (``pip install bsmschema[analysis]``).
+
+Examples
+--------
+
+>>> basis = filter_basis(n_scans=200, tr=2.0, high_pass=1 / 128)
+>>> basis is filter_basis(200, 2.0, high_pass=0.0078125)
+True
+>>> basis.regressors.shape
+(200, 6)
+>>> t = np.arange(200) * 2.0
+>>> signal = np.sin(2 * np.pi * 0.1 * t)
+>>> filtered = basis.apply(signal + np.cos(2 * np.pi * t / 800))
+>>> bool(np.abs(filtered - signal).max() < 0.05)
+True
+"""
+
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from .glm import CHUNK_BYTES, _memory_order
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .design import DesignMatrix
+    from .models import Node
+
+__all__ = [
+    'FilterBasis',
+    'filter_basis',
+    'node_filter_basis',
+]
+
+
+def _cosines(n_scans: int, orders: np.ndarray) -> np.ndarray:
+    """Orthonormal discrete cosine components of the given orders, as columns."""
+    scans = np.arange(n_scans)[:, None] + 0.5
+    components: np.ndarray = np.sqrt(2 / n_scans) * np.cos(np.pi / n_scans * scans * orders)
+    components[:, orders == 0] = 1 / np.sqrt(n_scans)
+    return components
+
+
+@dataclass(frozen=True, eq=False)
+class FilterBasis:
+    """The discrete cosine components removed by a temporal filter.
+
+    Use :py:func:`filter_basis` to obtain a cached instance.
+    """
+
+    n_scans: int
+    """Number of scans."""
+    tr: float
+    """Repetition time, in seconds."""
+    high_pass: Optional[float]
+    """High-pass cutoff, in Hz."""
+    low_pass: Optional[float]
+    """Low-pass cutoff, in Hz."""
+    removed: np.ndarray
+    """Orders of the removed components."""
+    components: np.ndarray
+    """Read-only components projected out by the filter, as columns, or the kept
+    components if :py:attr:`subtract` is false."""
+    subtract: bool
+    """Whether :py:attr:`components` are the removed components."""
+
+    @cached_property
+    def regressors(self) -> np.ndarray:
+        """Read-only cosine regressors of the high-pass filter, with shape
+        ``(n_scans, components)``.
+
+        Including these in a design matrix is equivalent to high-pass filtering both the
+        design and the data.
+        """
+        orders = self.removed[self.removed < 2 * self.n_scans * self.tr * (self.high_pass or 0)]
+        regressors = _cosines(self.n_scans, orders)
+        regressors.flags.writeable = False
+        return regressors
+
+    @property
+    def regressor_names(self) -> list[str]:
+        """Names of the :py:attr:`regressors`: ``cosine00``, ``cosine01``, and so on."""
+        return [f'cosine{k:02d}' for k in range(self.regressors.shape[1])]
+
+    def apply(
+        self,
+        data: np.ndarray,
+        chunk_size: Optional[int] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Filter data with one row per scan, in chunks of ``chunk_size`` columns.
+
+        Data with more than two dimensions are filtered along the first.
+        Filtered values are written to ``out``, which may be ``data`` itself or a
+        writable memory-mapped array, or to a new array.
+        """
+        if data.shape[0] != self.n_scans:
+            raise ValueError(f'Expected {self.n_scans} scans, got {data.shape[0]}')
+        order = _memory_order(data)
+        if out is None:
+            out = np.empty(data.shape, order=order)
+        elif out.shape != data.shape:
+            raise ValueError(f'Output of shape {out.shape} does not match data of {data.shape}')
+        components = self.components
+        # Columns are voxels in the memory order of the data, so that it is not copied
+        flat = data.reshape(self.n_scans, -1, order=order)
+        flat_out = out.reshape(self.n_scans, -1, order=order)
+        size = chunk_size or max(1, CHUNK_BYTES // (8 * self.n_scans))
+        for start in range(0, flat.shape[1], size):
+            chunk = np.asarray(flat[:, start : start + size], dtype=float)
+            projected = components @ (components.T @ chunk)
+            flat_out[:, start : start + size] = chunk - projected if self.subtract else projected
+        if not np.shares_memory(flat_out, out):
+            # Reshaping copied a non-contiguous output
+            out[...] = flat_out.reshape(out.shape, order=order)
+        return out
+
+    def filter_design(self, design: 'DesignMatrix') -> 'DesignMatrix':
+        """Filter the columns of a design matrix.
+
+        Results are cached on the content of the design, so identical designs share the
+        same (read-only) filtered matrix.
+        """
+        from .design import DesignMatrix
+
+        matrix = np.ascontiguousarray(design.matrix, dtype=float)
+        filtered = _filtered_design(
+            self.n_scans, self.tr, self.high_pass, self.low_pass, matrix.shape, matrix.tobytes()
+        )
+        return DesignMatrix(columns=design.columns, matrix=filtered)
+
+
+@lru_cache(maxsize=256)
+def _filtered_design(
+    n_scans: int,
+    tr: float,
+    high_pass: Optional[float],
+    low_pass: Optional[float],
+    shape: tuple[int, ...],
+    data: bytes,
+) -> np.ndarray:
+    basis = filter_basis(n_scans, tr, high_pass, low_pass)
+    matrix = np.frombuffer(data).reshape(shape)
+    filtered = basis.apply(matrix)
+    filtered.flags.writeable = False
+    return filtered
+
+
+@lru_cache(maxsize=256)
+def _basis(
+    n_scans: int, tr: float, high_pass: Optional[float], low_pass: Optional[float]
+) -> FilterBasis:
+    orders = np.arange(n_scans)
+    frequencies = orders / (2 * n_scans * tr)
+    removed = np.zeros(n_scans, dtype=bool)
+    if high_pass is not None:
+        removed |= (orders > 0) & (frequencies < high_pass)
+    if low_pass is not None:
+        removed |= frequencies > low_pass
+    # Project onto the kept components when there are fewer of them
+    subtract = bool(removed.sum() <= n_scans // 2)
+    components = _cosines(n_scans, orders[removed if subtract else ~removed])
+    components.flags.writeable = False
+    removed_orders = orders[removed]
+    removed_orders.flags.writeable = False
+    return FilterBasis(n_scans, tr, high_pass, low_pass, removed_orders, components, subtract)
+
+
+def filter_basis(
+    n_scans: int,
+    tr: float,
+    high_pass: Optional[float] = None,
+    low_pass: Optional[float] = None,
+) -> FilterBasis:
+    """Return the (cached) basis of a temporal filter.
+
+    Cutoffs are in Hz; a cutoff of ``None`` disables that side of the filter.
+
+    Raises :py:class:`ValueError` if the number of scans or the repetition time is not
+    positive, or if a cutoff is not positive.
+    """
+    if n_scans < 1 or not tr > 0:
+        raise ValueError(f'Invalid acquisition: {n_scans} scans with a TR of {tr}')
+    for cutoff in (high_pass, low_pass):
+        if cutoff is not None and not cutoff > 0:
+            raise ValueError(f'Filter cutoffs must be positive, got {cutoff}')
+    return _basis(
+        int(n_scans),
+        float(tr),
+        None if high_pass is None else float(high_pass),
+        None if low_pass is None else float(low_pass),
+    )
+
+
+def node_filter_basis(node: 'Node', n_scans: int, tr: float) -> Optional[FilterBasis]:
+    """Return the filter basis of the :py:attr:`Model.Options
+    <bsmschema.models.Model.Options>` of a node, or ``None`` if it sets no cutoff."""
+    options = node.Model.Options
+    if options is None or (
+        options.HighPassFilterCutoffHz is None and options.LowPassFilterCutoffHz is None
+    ):
+        return None
+    return filter_basis(n_scans, tr, options.HighPassFilterCutoffHz, options.LowPassFilterCutoffHz)
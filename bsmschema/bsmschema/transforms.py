@@ -0,0 +1,921 @@
+"""Typed ``pybids-transforms-v1`` instructions, and their compilation into execution plans.
+
+:py:attr:`Transformations.Instructions <bsmschema.models.Transformations.Instructions>`
+is untyped in the schema.
+:py:func:`parse_instructions` validates the instructions of the
+``"pybids-transforms-v1"`` :py:attr:`Transformer
+<bsmschema.models.Transformations.Transformer>` into one model per transformation, such
+as :py:class:`Factor` or :py:class:`Convolve`.
+
+:py:func:`compile_transformations` resolves the variables read and written by each
+instruction of a :py:class:`~bsmschema.models.Node`, starting from the columns of the
+input tables, and builds the graph of the instructions that produce the variables read
+by each instruction:
+
+* Instructions whose outputs do not reach :py:attr:`Model.X
+  <bsmschema.models.Model.X>` (and so any contrast) are pruned.
+  Instructions that remove variables, such as :py:class:`Delete` and
+  :py:class:`Select`, are pruned unless the variables they remove would otherwise be
+  matched by a wildcard or family read later, by a remaining instruction or by the node.
+* Reads of variables that are not defined at that point are reported
+  (``undefined_variable``), in the same form as the errors of
+  :py:func:`bsmschema.semantics.check_model`.
+* The remaining instructions form an ordered list of steps.
+  Instructions that apply the same transformation, with the same parameters, to
+  different variables are fused into a single step, provided no instruction between
+  them reads or writes their variables.
+
+The levels of :py:class:`Factor` and :py:class:`Split` are not known until the data are
+read, so their outputs are resolved as families of variables: ``Factor`` of
+``"trial_type"`` defines every variable starting with ``"trial_type."``.
+Inputs may contain wildcards, as in :py:mod:`bsmschema.wildcards`.
+
+Examples
+--------
+
+>>> from bsmschema.models import Node
+>>> node = Node.model_validate({
+...     'Level': 'Run', 'Name': 'run', 'GroupBy': ['run', 'subject'],
+...     'Transformations': {'Transformer': 'pybids-transforms-v1', 'Instructions': [
+...         {'Name': 'Factor', 'Input': ['trial_type']},
+...         {'Name': 'Scale', 'Input': ['response_time']},
+...         {'Name': 'Threshold', 'Input': ['framewise_displacement'], 'Threshold': 0.5,
+...          'Output': ['outliers']},
+...         {'Name': 'Scale', 'Input': ['rot_x']},
+...         {'Name': 'Convolve', 'Input': ['trial_type.*', 'response_time'], 'Model': 'spm'},
+...         {'Name': 'Convolve', 'Input': ['heart_rate']},
+...     ]},
+...     'Model': {'Type': 'glm', 'X': [1, 'trial_type.*', 'response_time', 'rot_x']},
+... })
+>>> columns = ['trial_type', 'response_time', 'framewise_displacement', 'rot_x']
+>>> compiled = compile_transformations(node, columns)
+>>> compiled.pruned
+[2, 5]
+>>> [(step.instruction.Name, step.indices) for step in compiled.steps]
+[('Factor', (0,)), ('Scale', (1, 3)), ('Convolve', (4,))]
+>>> compiled.steps[1].instruction.Input
+['response_time', 'rot_x']
+>>> compiled.dependencies[4], compiled.steps[2].depends
+((0, 1), (0, 1))
+>>> compiled.inputs
+['trial_type', 'response_time', 'rot_x']
+>>> for error in compiled.errors:
+...     print(error['loc'], error['type'])
+['Transformations', 'Instructions', 5, 'Input', 0] undefined_variable
+"""
+
+import json
+import re
+from bisect import bisect_left, insort
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar, Literal, Optional, Union
+
+from pydantic import BeforeValidator, Field, StrictStr, TypeAdapter, model_validator
+
+from .lazy import RawJSON
+from .models import _BSMBase
+from .wildcards import is_pattern, match
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import Node
+
+__all__ = [
+    'And',
+    'Assign',
+    'CompiledTransformations',
+    'Concatenate',
+    'Convolve',
+    'Copy',
+    'Delete',
+    'Demean',
+    'DropNA',
+    'Factor',
+    'Filter',
+    'Instruction',
+    'Lag',
+    'Not',
+    'Or',
+    'Orthogonalize',
+    'Product',
+    'Rename',
+    'Replace',
+    'Resample',
+    'Scale',
+    'Select',
+    'Split',
+    'Step',
+    'Sum',
+    'Threshold',
+    'ToDense',
+    'compile_transformations',
+    'parse_instructions',
+]
+
+
+def _as_list(value: Any) -> Any:
+    return [value] if isinstance(value, str) else value
+
+
+# A variable name or list of variable names, held as a list
+Variables = Annotated[list[StrictStr], BeforeValidator(_as_list)]
+
+
+class Instruction(_BSMBase):
+    """Base of the ``pybids-transforms-v1`` instructions.
+
+    Unless stated otherwise, an instruction transforms each :py:attr:`Input` variable
+    separately, and replaces it, or writes the result to the corresponding
+    :py:attr:`Output` variable.
+    """
+
+    kind: ClassVar[str] = 'map'
+    """How the instruction writes variables: ``"map"`` (one output per input),
+    ``"reduce"`` (one output for all inputs), ``"family"`` (one output per level of
+    each input), ``"assign"``, ``"delete"`` or ``"select"``."""
+    arguments: ClassVar[tuple[str, ...]] = ()
+    """Fields, other than :py:attr:`Input`, that name variables read by the instruction."""
+
+    Name: str
+    """Name of the transformation."""
+    Input: Variables
+    """Variables to transform, which may contain wildcards."""
+    Output: Optional[Variables] = None
+    """Names of the transformed variables, one per input. Defaults to :py:attr:`Input`."""
+
+    @model_validator(mode='after')
+    def _check_output(self) -> 'Instruction':
+        if self.Output is None:
+            return self
+        if self.kind == 'reduce' and len(self.Output) != 1:
+            raise ValueError(f'{self.Name} takes a single output, got {self.Output}')
+        if self.kind in ('map', 'family'):
+            if len(self.Output) != len(self.Input):
+                raise ValueError(
+                    f'{self.Name} has {len(self.Input)} inputs but {len(self.Output)} outputs'
+                )
+            if any(is_pattern(name) for name in self.Input):
+                raise ValueError(f'{self.Name} inputs with wildcards cannot be given outputs')
+        return self
+
+    def parameters(self) -> dict[str, Any]:
+        """Parameters of the transformation, other than the variables it transforms."""
+        return self.model_dump(exclude={'Name', 'Input', 'Output', 'Description'})
+
+    def suffixes(self) -> tuple[str, ...]:
+        """Suffixes of the variables written for each output, ``''`` being the output itself."""
+        return ('',)
+
+
+class And(Instruction):
+    """Logical conjunction of the inputs."""
+
+    kind = 'reduce'
+
+    Name: Literal['And']
+    Output: Variables
+    """Name of the result."""
+
+
+class Or(Instruction):
+    """Logical disjunction of the inputs."""
+
+    kind = 'reduce'
+
+    Name: Literal['Or']
+    Output: Variables
+    """Name of the result."""
+
+
+class Not(Instruction):
+    """Logical negation."""
+
+    Name: Literal['Not']
+
+
+class Sum(Instruction):
+    """Weighted sum of the inputs."""
+
+    kind = 'reduce'
+
+    Name: Literal['Sum']
+    Output: Variables
+    """Name of the result."""
+    Weights: Optional[list[float]] = None
+    """Weight of each input. Defaults to 1."""
+
+
+class Product(Instruction):
+    """Product of the inputs."""
+
+    kind = 'reduce'
+
+    Name: Literal['Product']
+    Output: Variables
+    """Name of the result."""
+
+
+class Concatenate(Instruction):
+    """Concatenation of the inputs, in time."""
+
+    kind = 'reduce'
+
+    Name: Literal['Concatenate']
+    Output: Variables
+    """Name of the result."""
+
+
+class Demean(Instruction):
+    """Subtraction of the mean."""
+
+    Name: Literal['Demean']
+
+
+class Scale(Instruction):
+    """Standardization of the values."""
+
+    Name: Literal['Scale']
+    Demean: bool = True
+    """Whether to subtract the mean."""
+    Rescale: bool = True
+    """Whether to divide by the standard deviation."""
+    ReplaceNA: Optional[Literal['before', 'after']] = None
+    """Whether to replace missing values by zero, before or after scaling."""
+
+
+class Threshold(Instruction):
+    """Thresholding of the values."""
+
+    Name: Literal['Threshold']
+    Threshold: float = 0.0
+    """Threshold value."""
+    Binarize: bool = False
+    """Whether to replace the values that pass the threshold by 1."""
+    Above: bool = True
+    """Whether values above the threshold pass, rather than values below."""
+    Signed: bool = True
+    """Whether to compare the signed values, rather than their absolute values."""
+
+
+class Orthogonalize(Instruction):
+    """Orthogonalization of each input with respect to other variables."""
+
+    arguments = ('Other',)
+
+    Name: Literal['Orthogonalize']
+    Other: Variables
+    """Variables to orthogonalize the inputs with respect to."""
+    Dense: bool = False
+    """Whether to convert the variables to dense variables first."""
+
+
+class Lag(Instruction):
+    """Shift of the values in time."""
+
+    Name: Literal['Lag']
+    Shift: int = 1
+    """Number of samples to shift by."""
+    Order: int = 1
+    """Order of the interpolation."""
+    Difference: bool = False
+    """Whether to return the difference with the shifted values."""
+
+
+class Convolve(Instruction):
+    """Convolution with a hemodynamic response function."""
+
+    Name: Literal['Convolve']
+    Model: str = 'spm'
+    """Name of the HRF model, as in :py:attr:`HRF.Model <bsmschema.models.HRF.Model>`."""
+    Derivative: bool = False
+    """Whether to add the temporal derivative."""
+    Dispersion: bool = False
+    """Whether to add the dispersion derivative."""
+    FIRDelays: Optional[list[float]] = None
+    """Delays of the ``"fir"`` model."""
+
+    def suffixes(self) -> tuple[str, ...]:
+        """Suffixes of the regressors, as in :py:func:`bsmschema.design.hrf_kernel`.
+
+        >>> Convolve(Name='Convolve', Input=['A'], Derivative=True).suffixes()
+        ('', '_derivative')
+        >>> Convolve(Name='Convolve', Input=['A'], Model='fir', FIRDelays=[0, 1]).suffixes()
+        ('_delay_0', '_delay_1')
+        """
+        family, *terms = (term.strip() for term in self.Model.lower().split('+'))
+        if family == 'fir' and self.FIRDelays:
+            return tuple(f'_delay_{int(delay)}' for delay in self.FIRDelays)
+        suffixes = ['']
+        if self.Derivative or 'derivative' in terms:
+            suffixes.append('_derivative')
+        if self.Dispersion or 'dispersion' in terms:
+            suffixes.append('_dispersion')
+        return tuple(suffixes)
+
+
+class Assign(Instruction):
+    """Assignment of the values of the input to an attribute of the target."""
+
+    kind = 'assign'
+    arguments = ('Target',)
+
+    Name: Literal['Assign']
+    Target: Variables
+    """Variable to assign to, which is replaced unless :py:attr:`Output` is given."""
+    InputAttr: str = 'amplitude'
+    """Attribute of the input to assign."""
+    TargetAttr: str = 'amplitude'
+    """Attribute of the target to assign to."""
+
+
+class Copy(Instruction):
+    """Copy of the inputs."""
+
+    Name: Literal['Copy']
+    Output: Variables
+    """Names of the copies."""
+
+
+class Rename(Instruction):
+    """Renaming of the inputs."""
+
+    Name: Literal['Rename']
+    Output: Variables
+    """New names."""
+
+
+class Factor(Instruction):
+    """Expansion of categorical variables into one indicator variable per level.
+
+    Indicators are named after the input and the level, such as ``"trial_type.A"``.
+    """
+
+    kind = 'family'
+
+    Name: Literal['Factor']
+    Constraint: Literal['none', 'drop_one', 'mean_zero'] = 'none'
+    """Constraint on the indicators."""
+    RefLevel: Optional[str] = None
+    """Level dropped by the ``"drop_one"`` constraint."""
+    Sep: str = '.'
+    """Separator of the input name and the level."""
+
+
+class Split(Instruction):
+    """Split of the inputs into one variable per level of other variables."""
+
+    kind = 'family'
+    arguments = ('By',)
+
+    Name: Literal['Split']
+    By: Variables
+    """Variables whose levels define the splits."""
+
+
+class Filter(Instruction):
+    """Selection of the events that match a query."""
+
+    arguments = ('By',)
+
+    Name: Literal['Filter']
+    Query: str
+    """Query to evaluate, such as ``"trial_type == 'A'"``."""
+    By: Optional[Variables] = None
+    """Other variables used in the query."""
+
+
+class Replace(Instruction):
+    """Replacement of values."""
+
+    Name: Literal['Replace']
+    Replace: dict[str, Any]
+    """Map of the values to replace to their replacements."""
+    Attribute: Literal['value', 'onset', 'duration', 'all'] = 'value'
+    """Attribute in which values are replaced."""
+
+
+class ToDense(Instruction):
+    """Conversion of sparse variables into dense variables."""
+
+    Name: Literal['ToDense']
+    SamplingRate: Union[float, Literal['TR'], None] = None
+    """Sampling rate of the dense variables, in Hz."""
+
+
+class Resample(Instruction):
+    """Resampling of dense variables."""
+
+    Name: Literal['Resample']
+    SamplingRate: Union[float, Literal['TR']]
+    """New sampling rate, in Hz."""
+    Decimate: bool = False
+    """Whether to low-pass filter before downsampling."""
+    Kind: str = 'linear'
+    """Kind of interpolation."""
+
+
+class DropNA(Instruction):
+    """Removal of missing values."""
+
+    Name: Literal['DropNA']
+
+
+class Delete(Instruction):
+    """Removal of the inputs."""
+
+    kind = 'delete'
+
+    Name: Literal['Delete']
+
+
+class Select(Instruction):
+    """Removal of all variables but the inputs."""
+
+    kind = 'select'
+
+    Name: Literal['Select']
+
+
+AnyInstruction = Annotated[
+    Union[
+        And,
+        Assign,
+        Concatenate,
+        Convolve,
+        Copy,
+        Delete,
+        Demean,
+        DropNA,
+        Factor,
+        Filter,
+        Lag,
+        Not,
+        Or,
+        Orthogonalize,
+        Product,
+        Rename,
+        Replace,
+        Resample,
+        Scale,
+        Select,
+        Split,
+        Sum,
+        Threshold,
+        ToDense,
+    ],
+    Field(discriminator='Name'),
+]
+
+
+@lru_cache(maxsize=None)
+def _adapter() -> TypeAdapter[list[AnyInstruction]]:
+    return TypeAdapter(list[AnyInstruction])
+
+
+def parse_instructions(instructions: Union[Sequence[Any], RawJSON]) -> list[Instruction]:
+    """Validate ``pybids-transforms-v1`` instructions into typed models.
+
+    Instructions held as an undecoded :py:class:`~bsmschema.lazy.RawJSON` are validated
+    directly from their bytes.
+
+    Raises :py:class:`pydantic.ValidationError` (a :py:class:`ValueError`) if an
+    instruction is unknown or invalid.
+    """
+    adapter = _adapter()
+    if isinstance(instructions, RawJSON):
+        if not instructions.decoded:
+            return list(adapter.validate_json(bytes(instructions.raw)))
+        instructions = instructions.value
+    return list(adapter.validate_python(list(instructions)))
+
+
+@dataclass(frozen=True, eq=False)
+class Step:
+    """One step of an execution plan: one or more fused instructions."""
+
+    instruction: Instruction
+    """The instruction to apply, with the variables of the fused instructions."""
+    indices: tuple[int, ...]
+    """Positions of the fused instructions in :py:attr:`Transformations.Instructions
+    <bsmschema.models.Transformations.Instructions>`."""
+    depends: tuple[int, ...]
+    """Positions of the earlier steps that must be complete before this step: those that
+    write the variables it reads, or read or write the variables it writes."""
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledTransformations:
+    """The instructions of a node, compiled into an execution plan."""
+
+    instructions: list[Instruction]
+    """The typed instructions, in order."""
+    dependencies: list[tuple[int, ...]]
+    """For each instruction, the instructions that produce the variables it reads."""
+    steps: list[Step]
+    """Steps to apply, in order."""
+    pruned: list[int]
+    """Positions of the instructions whose outputs are not used by the node."""
+    inputs: list[str]
+    """Columns of the input tables read by the steps or by the node, in column order."""
+    outputs: list[str]
+    """Variables of :py:attr:`Model.X <bsmschema.models.Model.X>`, with wildcards
+    resolved and excluding the intercept.
+    Variables of a :py:class:`Factor` or :py:class:`Split` are given as a single family,
+    such as ``"trial_type.*"``."""
+    errors: list[dict[str, Any]]
+    """Reads of undefined variables."""
+
+
+# Producer of a variable that is not defined
+_UNDEFINED = -2
+# Producer of the columns of the input tables
+_INPUT = -1
+
+
+def _literal_prefix(pattern: str) -> str:
+    return re.split(r'[*?]', pattern, maxsplit=1)[0]
+
+
+def _overlaps(families: set[str], names: set[str], name_families: set[str]) -> bool:
+    """Whether families of variables may share a name with variables, some of which
+    (``name_families``) are families too."""
+    if not families:
+        return False
+    prefixes = tuple(family[:-1] for family in families)
+    return any(name.startswith(prefixes) for name in names) or any(
+        prefix.startswith(family[:-1]) for family in name_families for prefix in prefixes
+    )
+
+
+class _Access:
+    """The variables read and written by instructions, with their families set apart."""
+
+    def __init__(self, reads: set[str], writes: set[str]) -> None:
+        self.reads = reads
+        self.writes = writes
+        self.read_families = {var for var in reads if is_pattern(var)}
+        self.write_families = {var for var in writes if is_pattern(var)}
+
+    def update(self, other: '_Access') -> None:
+        self.reads |= other.reads
+        self.writes |= other.writes
+        self.read_families |= other.read_families
+        self.write_families |= other.write_families
+
+    @property
+    def families(self) -> bool:
+        return bool(self.read_families or self.write_families)
+
+    def conflicts(self, other: '_Access') -> bool:
+        """Whether the order of the two accesses matters."""
+        if not (
+            self.writes.isdisjoint(other.reads)
+            and self.reads.isdisjoint(other.writes)
+            and self.writes.isdisjoint(other.writes)
+        ):
+            return True
+        if not (self.families or other.families):
+            return False
+        return any(
+            _overlaps(a.write_families, b.reads | b.writes, b.read_families | b.write_families)
+            or _overlaps(a.read_families, b.writes, b.write_families)
+            for a, b in ((self, other), (other, self))
+        )
+
+
+class _Scope:
+    """The variables defined at a point of the instructions, with their producers."""
+
+    def __init__(self, columns: Sequence[str]) -> None:
+        self.defined = dict.fromkeys(columns, _INPUT)
+        # Names in sorted order, so that patterns only examine names sharing their prefix
+        self.sorted = sorted(self.defined)
+        # Order in which names were defined, which is the order of pattern matches
+        self.order = {name: k for k, name in enumerate(self.defined)}
+        # Families of variables, by the prefix of their names
+        self.families: dict[str, int] = {}
+        # Position of the last removal of each variable
+        self.removed: dict[str, int] = {}
+
+    def resolve(self, name: str) -> list[tuple[str, int]]:
+        """The variables read under a name, or a pattern, with their producers."""
+        if is_pattern(name):
+            prefix = _literal_prefix(name)
+            names = self.sorted
+            matches = []
+            for k in range(bisect_left(names, prefix), len(names)):
+                if not names[k].startswith(prefix):
+                    break
+                if match(name, names[k]):
+                    matches.append(names[k])
+            matches.sort(key=self.order.__getitem__)
+            hits = [(var, self.defined[var]) for var in matches]
+            hits.extend(
+                (family + '*', producer)
+                for family, producer in self.families.items()
+                if family.startswith(prefix) or prefix.startswith(family)
+            )
+            return hits
+        best, variable = self.defined.get(name, _UNDEFINED), name
+        # A later family shadows the variable, unless it was removed since
+        floor = max(best, self.removed.get(name, _UNDEFINED))
+        for family, producer in self.families.items():
+            if producer > floor and len(name) > len(family) and name.startswith(family):
+                best, variable, floor = producer, family + '*', producer
+        return [] if best == _UNDEFINED else [(variable, best)]
+
+    def write(self, variable: str, producer: int) -> None:
+        if is_pattern(variable):
+            self.families[variable[:-1]] = producer
+            return
+        if variable not in self.defined:
+            insort(self.sorted, variable)
+            self.order[variable] = len(self.order)
+        self.defined[variable] = producer
+        self.removed.pop(variable, None)
+
+    def remove(self, name: str, variables: list[str], position: int) -> set[str]:
+        """Remove the variables read under a name or pattern, returning the names removed.
+
+        Variables of a family that are not removed as a whole are returned as ``name``.
+        """
+        removed = set()
+        for variable in variables:
+            if not is_pattern(variable):
+                if self.defined.pop(variable, None) is not None:
+                    del self.sorted[bisect_left(self.sorted, variable)]
+                    del self.order[variable]
+                self.removed[variable] = position
+                removed.add(variable)
+            elif not is_pattern(name):
+                # A single variable of a family
+                self.removed[name] = position
+                removed.add(name)
+            elif (
+                name.endswith('*') and not is_pattern(name[:-1]) and variable.startswith(name[:-1])
+            ):
+                # Only remove a family as a whole if the pattern covers all of it
+                self.families.pop(variable[:-1], None)
+                removed.add(variable)
+            else:
+                removed.add(name)
+        return removed
+
+
+class _Fused:
+    """A step under construction."""
+
+    def __init__(self, instruction: Instruction, index: int, key: Optional[str]) -> None:
+        self.instruction = instruction
+        self.indices = [index]
+        self.key = key
+        self.access = _Access(set(), set())
+
+    def fuse(self, instruction: Instruction, index: int) -> None:
+        outputs = self.instruction.Output
+        self.instruction = self.instruction.model_copy(
+            update={
+                'Input': self.instruction.Input + instruction.Input,
+                'Output': None if outputs is None else outputs + (instruction.Output or []),
+            }
+        )
+        self.indices.append(index)
+
+
+def _order(steps: list[_Fused]) -> list[tuple[int, ...]]:
+    """The earlier steps that each step must follow."""
+    last_write: dict[str, int] = {}
+    # Steps that read a variable since it was last written
+    readers: dict[str, list[int]] = {}
+    # Families may share names with any variable, so their steps are compared in full
+    with_families: list[int] = []
+    result = []
+    for position, step in enumerate(steps):
+        access = step.access
+        depends = {last_write[var] for var in access.reads | access.writes if var in last_write}
+        for var in access.writes:
+            depends.update(readers.get(var, ()))
+        depends.update(
+            earlier
+            for earlier in (range(position) if access.families else with_families)
+            if earlier not in depends and access.conflicts(steps[earlier].access)
+        )
+        depends.discard(position)
+        for var in access.reads:
+            readers.setdefault(var, []).append(position)
+        for var in access.writes:
+            last_write[var] = position
+            readers[var] = []
+        if access.families:
+            with_families.append(position)
+        result.append(tuple(sorted(depends)))
+    return result
+
+
+def _narrows(pattern: str, removed: str) -> bool:
+    """Whether removing a variable, or the variables of a pattern, changes what a pattern
+    matches."""
+    if is_pattern(removed):
+        prefix, other = _literal_prefix(pattern), _literal_prefix(removed)
+        return prefix.startswith(other) or other.startswith(prefix)
+    return match(pattern, removed)
+
+
+def _fusion_key(instruction: Instruction) -> Optional[str]:
+    """Instructions with the same key may be applied as one, if they are independent."""
+    if instruction.kind not in ('map', 'family'):
+        return None
+    parameters = json.dumps(instruction.parameters(), sort_keys=True, default=str)
+    return f'{instruction.Name}:{instruction.Output is None}:{parameters}'
+
+
+def compile_transformations(node: 'Node', columns: Sequence[str]) -> CompiledTransformations:
+    """Compile the transformations of a node into an execution plan.
+
+    Parameters
+    ----------
+    node
+        A node, with or without :py:attr:`Node.Transformations
+        <bsmschema.models.Node.Transformations>`.
+    columns
+        Names of the variables of the input tables, such as the columns of the events
+        and confounds files.
+
+    Reads of undefined variables are reported in
+    :py:attr:`CompiledTransformations.errors`, with locations relative to the node.
+    Wildcards in inputs that match no variable are reported as well; wildcards in
+    :py:attr:`Model.X <bsmschema.models.Model.X>` are not.
+
+    Raises :py:class:`ValueError` if the :py:attr:`Transformer
+    <bsmschema.models.Transformations.Transformer>` is not ``"pybids-transforms-v1"``, or
+    if the instructions are invalid (see :py:func:`parse_instructions`).
+    """
+    transformations = node.Transformations
+    if transformations is not None and transformations.Transformer != 'pybids-transforms-v1':
+        raise ValueError(f'Unsupported transformer: {transformations.Transformer!r}')
+    instructions = (
+        [] if transformations is None else parse_instructions(transformations.Instructions)
+    )
+    scope = _Scope(columns)
+    errors: list[dict[str, Any]] = []
+    reads: list[list[tuple[str, int]]] = []
+    writes: list[set[str]] = []
+    # Wildcards and families read by each instruction
+    patterns: list[list[str]] = []
+    # Names removed by each instruction that removes variables
+    removals: list[tuple[int, set[str]]] = []
+
+    for i, instruction in enumerate(instructions):
+        read: list[tuple[str, int]] = []
+        resolved: list[list[str]] = []
+        read_patterns: list[str] = []
+        for field in ('Input', *instruction.arguments):
+            for j, name in enumerate(getattr(instruction, field) or ()):
+                if is_pattern(name):
+                    read_patterns.append(name)
+                hits = scope.resolve(name)
+                if not hits:
+                    errors.append(
+                        {
+                            'loc': ['Transformations', 'Instructions', i, field, j],
+                            'msg': f'Variable {name!r} is not defined before {instruction.Name}',
+                            'type': 'undefined_variable',
+                        }
+                    )
+                read.extend(hits)
+                resolved.append([variable for variable, _ in hits])
+        inputs = resolved[: len(instruction.Input)]
+        written: list[str] = []
+        removed: set[str] = set()
+        kind = instruction.kind
+        if kind in ('map', 'reduce') or (kind == 'assign' and instruction.Output):
+            written = list(instruction.Output or (var for names in inputs for var in names))
+            suffixes = instruction.suffixes()
+            if suffixes != ('',):
+                # Families already include the variables named after their members
+                written = list(
+                    dict.fromkeys(
+                        var if is_pattern(var) else var + suffix
+                        for var in written
+                        for suffix in suffixes
+                    )
+                )
+        elif kind == 'assign':
+            written = [var for names in resolved[len(instruction.Input) :] for var in names]
+        elif kind == 'family':
+            sep = getattr(instruction, 'Sep', '.')
+            for k, names in enumerate(inputs):
+                bases = [instruction.Output[k]] if instruction.Output else names
+                written.extend(base if is_pattern(base) else base + sep + '*' for base in bases)
+        elif kind == 'delete':
+            for name, names in zip(instruction.Input, inputs):
+                removed |= scope.remove(name, names, i)
+        elif kind == 'select':
+            kept = {var for names in inputs for var in names}
+            removed |= scope.remove('*', [var for var in scope.defined if var not in kept], i)
+            removed.update(family + '*' for family in scope.families if family + '*' not in kept)
+            scope.families = {
+                family: producer
+                for family, producer in scope.families.items()
+                if family + '*' in kept
+            }
+        if isinstance(instruction, Rename):
+            for name, names in zip(instruction.Input, inputs):
+                removed |= scope.remove(name, names, i)
+        for variable in written:
+            scope.write(variable, i)
+        reads.append(read)
+        writes.append(set(written) | removed)
+        patterns.append(read_patterns)
+        if removed:
+            removals.append((i, removed))
+
+    dependencies = [
+        tuple(sorted({producer for _, producer in read if producer >= 0})) for read in reads
+    ]
+
+    # Variables read by the node
+    outputs: list[str] = []
+    needed: list[int] = []
+    used_columns: set[str] = set()
+    for k, name in enumerate(node.Model.X):
+        if not isinstance(name, str):
+            continue
+        hits = scope.resolve(name)
+        if not hits and not is_pattern(name):
+            errors.append(
+                {
+                    'loc': ['Model', 'X', k],
+                    'msg': f'Variable {name!r} is not defined by the transformations',
+                    'type': 'undefined_variable',
+                }
+            )
+        for variable, producer in hits:
+            if variable not in outputs:
+                outputs.append(variable)
+            if producer >= 0:
+                needed.append(producer)
+            else:
+                used_columns.add(variable)
+
+    def narrowing(read_patterns: list[str], before: int) -> list[int]:
+        """Earlier removals of variables that the patterns would otherwise match."""
+        return [
+            k
+            for k, removed in removals
+            if k < before
+            and any(_narrows(pattern, name) for pattern in read_patterns for name in removed)
+        ]
+
+    # Instructions that the node depends on
+    keep = [False] * len(instructions)
+    needed.extend(
+        narrowing(
+            [name for name in node.Model.X if isinstance(name, str) and is_pattern(name)],
+            len(instructions),
+        )
+    )
+    while needed:
+        i = needed.pop()
+        if not keep[i]:
+            keep[i] = True
+            needed.extend(dependencies[i])
+            if patterns[i]:
+                needed.extend(narrowing(patterns[i], i))
+
+    steps: list[_Fused] = []
+    for i, instruction in enumerate(instructions):
+        if not keep[i]:
+            continue
+        used_columns.update(variable for variable, producer in reads[i] if producer == _INPUT)
+        access = _Access({variable for variable, _ in reads[i]}, writes[i])
+        key = _fusion_key(instruction)
+        target = None
+        # Hoist the instruction into the latest step it may be fused with
+        for position in range(len(steps) - 1, -1, -1):
+            step = steps[position]
+            if step.access.conflicts(access):
+                break
+            if key is not None and step.key == key:
+                target = position
+                break
+        if target is None:
+            target = len(steps)
+            steps.append(_Fused(instruction, i, key))
+        else:
+            steps[target].fuse(instruction, i)
+        steps[target].access.update(access)
+
+    return CompiledTransformations(
+        instructions=instructions,
+        dependencies=dependencies,
+        steps=[
+            Step(instruction=step.instruction, indices=tuple(step.indices), depends=depends)
+            for step, depends in zip(steps, _order(steps))
+        ],
+        pruned=[i for i, kept in enumerate(keep) if not kept],
+        inputs=[column for column in columns if column in used_columns],
+        outputs=outputs,
+        errors=errors,
+    )
@@ -0,0 +1,189 @@
+"""Expansion of wildcard variable names against a namespace of columns.
+
+Variable lists such as :py:attr:`Model.X <bsmschema.models.Model.X>` may contain
+Unix-style wildcards: ``"*"`` matches zero or more alphanumeric (word) characters,
+and ``"?"`` matches exactly one.
+Each entry is replaced by the columns it matches, in namespace order, and
+columns that were already included by an earlier entry are skipped.
+The intercept ``1`` is passed through unchanged.
+
+Column lists are indexed once, by sorting names so that each pattern only examines
+the columns that share its literal prefix.
+Indexes and expansions are cached on the content of the column list, so that runs
+with identical columns reuse the work.
+
+Examples
+--------
+
+>>> columns = ['trial_type.A', 'trial_type.B', 'aroma_motion_01', 'aroma_motion_02', 'rot_x']
+>>> expand([1, 'trial_type.*', 'aroma_motion_??'], columns)
+[1, 'trial_type.A', 'trial_type.B', 'aroma_motion_01', 'aroma_motion_02']
+>>> expand(['rot_x', 'rot_?', 'rot_*'], columns)
+['rot_x']
+"""
+
+import re
+from bisect import bisect_left
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .models import Node
+
+__all__ = [
+    'ExpandedNode',
+    'Namespace',
+    'expand',
+    'expand_node',
+    'is_pattern',
+    'match',
+    'namespace',
+]
+
+Variable = Union[int, str]
+
+
+def is_pattern(variable: Variable) -> bool:
+    """Whether a variable name contains wildcards."""
+    return isinstance(variable, str) and ('*' in variable or '?' in variable)
+
+
+@lru_cache(maxsize=1024)
+def _compile(pattern: str) -> tuple[str, 're.Pattern[str]']:
+    prefix_len = min(i for i in (pattern.find('*'), pattern.find('?'), len(pattern)) if i >= 0)
+    regex = ''.join(
+        r'\w*' if char == '*' else r'\w' if char == '?' else re.escape(char) for char in pattern
+    )
+    return pattern[:prefix_len], re.compile(regex)
+
+
+def match(pattern: str, name: str) -> bool:
+    """Whether a column name matches a wildcard pattern.
+
+    >>> match('aroma_motion_??', 'aroma_motion_01')
+    True
+    """
+    return _compile(pattern)[1].fullmatch(name) is not None
+
+
+class Namespace:
+    """An indexed list of columns.
+
+    Use :py:func:`namespace` to obtain a cached instance for a column list.
+    """
+
+    columns: tuple[Variable, ...]
+    """Columns, in order."""
+    positions: dict[str, int]
+    """Map of column names to their (first) position in :py:attr:`columns`."""
+
+    def __init__(self, columns: Sequence[Variable]) -> None:
+        self.columns = tuple(columns)
+        self.positions = {}
+        for i, column in enumerate(self.columns):
+            if isinstance(column, str):
+                self.positions.setdefault(column, i)
+        self._sorted = sorted(self.positions)
+        self._matches: dict[str, list[int]] = {}
+
+    def match(self, pattern: str) -> list[int]:
+        """Positions of the columns matching a wildcard pattern, in namespace order."""
+        hits = self._matches.get(pattern)
+        if hits is None:
+            prefix, regex = _compile(pattern)
+            names = self._sorted
+            hits = []
+            for i in range(bisect_left(names, prefix), len(names)):
+                name = names[i]
+                if not name.startswith(prefix):
+                    break
+                if regex.fullmatch(name):
+                    hits.append(self.positions[name])
+            hits.sort()
+            self._matches[pattern] = hits
+        return hits
+
+
+@lru_cache(maxsize=128)
+def namespace(columns: tuple[Variable, ...]) -> Namespace:
+    """Return the (cached) :py:class:`Namespace` for a column list."""
+    return Namespace(columns)
+
+
+@lru_cache(maxsize=1024)
+def _expand(
+    variables: tuple[Variable, ...],
+    columns: tuple[Variable, ...],
+) -> tuple[Variable, ...]:
+    space = namespace(columns)
+    result: list[Variable] = []
+    seen: set[Variable] = set()
+
+    def add(variable: Variable) -> None:
+        if variable not in seen:
+            seen.add(variable)
+            result.append(variable)
+
+    for variable in variables:
+        if not isinstance(variable, str):
+            add(variable)
+        elif is_pattern(variable):
+            for pos in space.match(variable):
+                add(columns[pos])
+        elif variable in space.positions:
+            add(variable)
+        else:
+            raise ValueError(f'Variable {variable!r} not found in available columns')
+    return tuple(result)
+
+
+def expand(variables: Sequence[Variable], columns: Sequence[Variable]) -> list[Variable]:
+    """Expand a list of variables, which may contain wildcards, against a list of columns.
+
+    Raises :py:class:`ValueError` if a variable without wildcards is not a column.
+    Patterns that match no columns expand to nothing.
+    """
+    return list(_expand(tuple(variables), tuple(columns)))
+
+
+@dataclass(frozen=True)
+class ExpandedNode:
+    """Variable lists of a :py:class:`~bsmschema.models.Node` with wildcards expanded."""
+
+    columns: list[Variable]
+    """Expanded :py:attr:`Model.X <bsmschema.models.Model.X>`; the design matrix columns."""
+    hrf_variables: list[Variable]
+    """Expanded :py:attr:`HRF.Variables <bsmschema.models.HRF.Variables>`."""
+    condition_lists: dict[str, list[Variable]]
+    """Expanded :py:attr:`Contrast.ConditionList <bsmschema.models.Contrast.ConditionList>`,
+    by contrast name."""
+    dummy_contrasts: Optional[list[Variable]]
+    """Expanded :py:attr:`DummyContrasts.Contrasts
+    <bsmschema.models.DummyContrasts.Contrasts>`, or ``None`` if all of ``X`` is to be used."""
+
+
+def expand_node(node: 'Node', columns: Sequence[Variable]) -> ExpandedNode:
+    """Expand the variable lists of a node against the available columns.
+
+    :py:attr:`Model.X <bsmschema.models.Model.X>` is expanded against ``columns``.
+    The remaining lists are expanded against the expanded ``X``, so a variable
+    that is not in the design matrix raises :py:class:`ValueError`.
+    """
+    X = _expand(tuple(node.Model.X), tuple(columns))
+    hrf = node.Model.HRF
+    dummy = node.DummyContrasts
+    return ExpandedNode(
+        columns=list(X),
+        hrf_variables=[] if hrf is None else list(_expand(tuple(hrf.Variables), X)),
+        condition_lists={
+            contrast.Name: list(_expand(tuple(contrast.ConditionList), X))
+            for contrast in node.Contrasts or ()
+        },
+        dummy_contrasts=(
+            None
+            if dummy is None or dummy.Contrasts is None
+            else list(_expand(tuple(dummy.Contrasts), X))
+        ),
+    )
@@ -0,0 +1,35 @@
+"""Factories for the nodes used across the test suite."""
+
+from bsmschema.models import Node
+
+GROUP_BY = {
+    'Run': ['run', 'subject'],
+    'Session': ['session', 'subject'],
+    'Subject': ['subject', 'contrast'],
+    'Dataset': ['contrast'],
+}
+
+
+def node_fields(
+    X=(1,), *, level='Run', name=None, group_by=None, model_type=None, model=None, **fields
+):
+    """Return the fields of a node with design matrix ``X``.
+
+    ``Name``, ``GroupBy`` and ``Model.Type`` default to values that suit ``level``;
+    ``model`` adds fields to ``Model``, and the remaining keywords are node fields.
+    """
+    if model_type is None:
+        model_type = 'glm' if level == 'Run' else 'meta'
+    node = {
+        'Level': level,
+        'Name': level.lower() if name is None else name,
+        'GroupBy': list(GROUP_BY[level] if group_by is None else group_by),
+        'Model': {'Type': model_type, 'X': list(X), **(model or {})},
+    }
+    node.update(fields)
+    return node
+
+
+def make_node(X=(1,), **kwargs):
+    """Validate the fields from :func:`node_fields` as a :class:`Node`."""
+    return Node.model_validate(node_fields(X, **kwargs))
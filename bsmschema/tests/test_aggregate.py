@@ -0,0 +1,121 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.aggregate import aggregate
+
+
+def make_images(shape=(6, 7, 5), n_times=40, n_labels=9, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, n_labels + 1, shape)
+    data = rng.standard_normal((*shape, n_times))
+    return labels, data
+
+
+def exact_component(matrix):
+    centered = matrix - matrix.mean(axis=0)
+    u, s, vt = np.linalg.svd(centered, full_matrices=False)
+    return u[:, 0] * s[0] * np.sign(vt[0].sum())
+
+
+def test_mean():
+    labels, data = make_images()
+    result = aggregate(labels, data, 'mean')
+    assert result.labels.tolist() == list(range(1, 10))
+    assert result.values.shape == (40, 9)
+    for j, label in enumerate(result.labels):
+        assert result.values[:, j] == pytest.approx(data[labels == label].mean(axis=0))
+    chunked = aggregate(labels, data, 'mean', chunk_size=11)
+    assert chunked.values == pytest.approx(result.values)
+
+
+def test_mean_memory_mapped(tmp_path):
+    labels, data = make_images(n_times=12)
+    np.save(tmp_path / 'data.npy', data.astype(np.float32))
+    mapped = np.load(tmp_path / 'data.npy', mmap_mode='r')
+    result = aggregate(labels, mapped, 'mean', chunk_size=17)
+    expected = aggregate(labels, data.astype(np.float32).astype(float), 'mean')
+    assert result.values == pytest.approx(expected.values)
+
+
+def test_pca():
+    labels, data = make_images()
+    result = aggregate(labels, data, 'pca', max_workers=3)
+    assert result.labels.tolist() == list(range(1, 10))
+    for j, label in enumerate(result.labels):
+        assert result.values[:, j] == pytest.approx(exact_component(data[labels == label].T))
+    single = aggregate(labels, data, 'pca', max_workers=1)
+    assert single.values == pytest.approx(result.values)
+
+
+def test_pca_randomized():
+    # Labels larger than the exact threshold in both dimensions use a randomized SVD
+    rng = np.random.default_rng(1)
+    n_times, n_voxels = 150, 400
+    signal = rng.standard_normal(n_times)
+    loadings = rng.uniform(0.5, 1.5, n_voxels)
+    data = np.outer(signal, loadings) + 0.5 * rng.standard_normal((n_times, n_voxels))
+    labels = np.ones(n_voxels, dtype=int)
+    result = aggregate(labels, data.T, 'pca')
+    expected = exact_component(data)
+    assert result.values[:, 0] == pytest.approx(expected, rel=1e-6, abs=1e-6)
+    # Positively correlated with the mean time series
+    assert np.corrcoef(result.values[:, 0], data.mean(axis=1))[0, 1] > 0.9
+
+
+def test_none():
+    labels, data = make_images(n_times=10)
+    data[0, 0, 0] = 0
+    labels[0, 0, 0] = 3
+    result = aggregate(labels, data, 'none')
+    expected = np.flatnonzero(labels)
+    assert result.voxels.tolist() == expected[1:].tolist()
+    assert len(result) == len(expected) - 1
+    assert result.labels.tolist() == labels.ravel()[expected[1:]].tolist()
+    assert all(np.shares_memory(row, data) for row in result)
+    assert result[0].tolist() == data.reshape(-1, 10)[expected[1]].tolist()
+    assert result.values.shape == (10, len(expected) - 1)
+
+
+def test_fortran_order(tmp_path):
+    labels, data = make_images(n_times=10)
+    fortran = np.asfortranarray(data)
+    expected = aggregate(labels, data, 'mean')
+    assert aggregate(labels, fortran, 'mean', chunk_size=13).values == pytest.approx(
+        expected.values
+    )
+    mapped = np.memmap(tmp_path / 'data.bin', dtype=float, mode='w+', shape=data.shape, order='F')
+    mapped[:] = data
+    for image in (fortran, mapped):
+        result = aggregate(labels, image, 'none')
+        # Voxels are views of the image, in its memory order
+        assert np.shares_memory(result.data, image)
+        assert result.voxels.tolist() == np.flatnonzero(labels.ravel(order='F')).tolist()
+        assert result.labels.tolist() == labels.ravel(order='F')[result.voxels].tolist()
+        assert result[0].tolist() == data.reshape(-1, 10, order='F')[result.voxels[0]].tolist()
+        pca = aggregate(labels, image, 'pca', max_workers=1)
+        assert pca.values == pytest.approx(aggregate(labels, data, 'pca').values)
+
+
+def test_empty():
+    labels = np.zeros((2, 2), dtype=int)
+    data = np.ones((2, 2, 5))
+    assert aggregate(labels, data, 'mean').values.shape == (5, 0)
+    assert aggregate(labels, data, 'pca').values.shape == (5, 0)
+    assert len(aggregate(labels, data, 'none')) == 0
+
+
+def test_errors():
+    labels, data = make_images()
+    with pytest.raises(ValueError, match='do not match'):
+        aggregate(labels[:-1], data, 'mean')
+    with pytest.raises(ValueError, match='Unknown'):
+        aggregate(labels, data, 'median')
+
+
+def test_pca_short():
+    # Few time points and many voxels decompose the time by time Gram matrix
+    rng = np.random.default_rng(2)
+    data = rng.standard_normal((100, 12))
+    result = aggregate(np.ones(100, dtype=int), data, 'pca')
+    assert result.values[:, 0] == pytest.approx(exact_component(data.T))
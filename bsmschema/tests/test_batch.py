@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from bsmschema.__main__ import main
+from bsmschema.batch import iter_model_paths, validate_paths
+
+from . import data
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    example = data.load.readable('examples', 'model-example_smdl.json').read_text()
+    (tmp_path / 'sub').mkdir()
+    for i in range(5):
+        (tmp_path / 'sub' / f'model-good{i}_smdl.json').write_text(example)
+    (tmp_path / 'model-bad_smdl.json').write_text('{"Name": "bad", "Nodes": []}')
+    (tmp_path / 'model-broken_smdl.json').write_text('{')
+    (tmp_path / 'notes.json').write_text('{}')
+    return tmp_path
+
+
+def test_iter_model_paths(corpus):
+    paths = list(iter_model_paths([corpus]))
+    assert len(paths) == 7
+    assert corpus / 'notes.json' not in paths
+
+    globbed = list(iter_model_paths([str(corpus / '**' / 'model-good*.json'), corpus / 'sub']))
+    assert len(globbed) == 5
+
+    unmatched = []
+    targets = [corpus / 'typo_smdl.json', str(corpus / '*.txt'), corpus / 'sub', corpus / 'sub']
+    assert len(list(iter_model_paths(targets, unmatched=unmatched))) == 5
+    assert unmatched == targets[:2]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_validate_paths(corpus, workers):
+    results = {res.path: res for res in validate_paths([corpus], workers=workers, chunksize=2)}
+    assert len(results) == 7
+    assert sum(res.ok for res in results.values()) == 5
+
+    bad = results[str(corpus / 'model-bad_smdl.json')]
+    assert ['BIDSModelVersion'] in [err['loc'] for err in bad.errors]
+    broken = results[str(corpus / 'model-broken_smdl.json')]
+    assert broken.errors[0]['type'] == 'json_invalid'
+
+
+def test_validate_cli(corpus, tmp_path, capsys):
+    outfile = tmp_path / 'results.jsonl'
+    assert main(['validate', '-j', '1', '-o', str(outfile), str(corpus)]) == 1
+    records = [json.loads(line) for line in outfile.read_text().splitlines()]
+    assert len(records) == 7
+    assert '7 files, 5 valid, 2 invalid' in capsys.readouterr().err
+
+    assert main(['validate', '-j', '1', str(corpus / 'sub')]) == 0
+
+    # Targets that match nothing fail the run
+    capsys.readouterr()
+    assert main(['validate', '-j', '1', str(corpus / 'typo_smdl.json')]) == 1
+    err = capsys.readouterr().err
+    assert '0 files, 0 valid, 0 invalid' in err
+    assert f'No files match: {corpus / "typo_smdl.json"}' in err
+    assert main(['validate', '-j', '1', str(corpus / 'sub'), str(corpus / 'typo')]) == 1
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_validate_cli_cache(corpus, tmp_path, capsys, workers):
+    cache = tmp_path / 'cache.sqlite'
+    args = ['validate', '-j', workers, '-q', '--cache', str(cache), str(corpus)]
+    assert main(args) == 1
+    # The good files are identical, so only the first is validated
+    assert '7 files, 5 valid, 2 invalid, 4 cached' in capsys.readouterr().err
+    assert main(args) == 1
+    captured = capsys.readouterr()
+    assert '7 files, 5 valid, 2 invalid, 7 cached' in captured.err
+    records = [json.loads(line) for line in captured.out.splitlines()]
+    assert [(record['ok'], record['cached']) for record in records] == [(False, True)] * 2
+
+
+def test_schema_cli(tmp_path):
+    assert main([str(tmp_path / 'schema')]) == 0
+    assert (tmp_path / 'schema' / 'BIDSStatsModel.json').exists()
+    assert (tmp_path / 'schema' / 'BIDSStatsModel_validator.py').exists()
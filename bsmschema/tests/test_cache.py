@@ -0,0 +1,46 @@
+import json
+
+from bsmschema import cache as cache_module
+from bsmschema.cache import ValidationCache
+
+from . import data
+
+
+def test_validation_cache(tmp_path):
+    example = data.load.readable('examples', 'model-example_smdl.json').read_bytes()
+    with ValidationCache(tmp_path / 'cache.sqlite') as cache:
+        first = cache.validate(example)
+        assert first.ok and not first.cached
+        assert json.loads(first.normalized)['Name'] == 'my_first_model'
+
+        second = cache.validate(example)
+        assert second.cached
+        assert second.normalized == first.normalized
+
+        bad = b'{"Name": "bad", "Nodes": []}'
+        assert not cache.validate(bad).cached
+        errors = cache.validate(bad).errors
+        assert ['BIDSModelVersion'] in [err['loc'] for err in errors]
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert len(cache) == 2
+
+    # Entries persist across connections
+    with ValidationCache(tmp_path / 'cache.sqlite') as cache:
+        assert cache.validate(example).cached
+
+
+def test_cache_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, 'EVICT_INTERVAL', 1)
+    with ValidationCache(tmp_path / 'cache.sqlite', max_entries=3) as cache:
+        keys = []
+        for i in range(5):
+            payload = f'{{"Name": "bad{i}"}}'.encode()
+            cache.validate(payload)
+            keys.append(cache.key(payload))
+        assert len(cache) == 3
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[4]) is not None
+
+        cache.max_age = 60
+        assert cache.evict(now=cache_module.time.time() + 120) == 3
+        assert len(cache) == 0
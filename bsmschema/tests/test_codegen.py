@@ -0,0 +1,179 @@
+import copy
+import json
+import subprocess
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+from bsmschema.codegen import compile_validator, generate_validator, write_validator
+from bsmschema.models import BIDSStatsModel
+
+from . import data
+
+EXAMPLES = ['model-example_smdl.json', 'model-walkthrough_smdl.json']
+# Values of every JSON type, to substitute throughout documents
+REPLACEMENTS = [None, True, 1, 1.0, 2, 0.5, 'x', '1', [], ['x'], [1], [[1]], {}, {'x': []}]
+
+
+@pytest.fixture(scope='module')
+def validator():
+    return compile_validator(BIDSStatsModel.model_json_schema())
+
+
+def load(name):
+    return json.loads(data.load.readable('examples', name).read_text())
+
+
+def paths(document, path=()):
+    """Locations of all values in a document."""
+    yield path
+    if isinstance(document, dict):
+        for key, value in document.items():
+            yield from paths(value, (*path, key))
+    elif isinstance(document, list):
+        for index, value in enumerate(document):
+            yield from paths(value, (*path, index))
+
+
+def replace(document, path, value):
+    document = copy.deepcopy(document)
+    if not path:
+        return value
+    parent = document
+    for key in path[:-1]:
+        parent = parent[key]
+    if value is KeyError:
+        del parent[path[-1]]
+    else:
+        parent[path[-1]] = value
+    return document
+
+
+def mutations(document):
+    for path in paths(document):
+        for value in REPLACEMENTS:
+            yield replace(document, path, value)
+        if path and isinstance(path[-1], str):
+            yield replace(document, path, KeyError)
+        if path and isinstance(path[-1], str):
+            yield replace(document, (*path[:-1], 'Extra'), 1)
+
+
+def document_path(document, loc):
+    """The elements of a pydantic error location that index into the document."""
+    path = []
+    for key in loc:
+        if isinstance(document, dict) and key in document:
+            document = document[key]
+        elif isinstance(document, list) and isinstance(key, int) and key < len(document):
+            document = document[key]
+        else:
+            if isinstance(document, dict) and isinstance(key, str) and not key[0].islower():
+                # A missing field
+                path.append(key)
+            break
+        path.append(key)
+    return path
+
+
+def get(document, loc):
+    for key in loc:
+        document = document[key]
+    return document
+
+
+def lax(document, error):
+    """Whether pydantic accepts a value that the schema rejects."""
+    value = get(document, error['loc'])
+    if error['type'] == 'any_of' and value is True:
+        # The intercept 1 (also in ConditionList or DummyContrasts)
+        return True
+    return error['loc'][-1:] in (['HighPassFilterCutoffHz'], ['LowPassFilterCutoffHz']) and (
+        isinstance(value, bool) or (isinstance(value, str) and value.replace('.', '').isdigit())
+    )
+
+
+def check_parity(validator, document):
+    errors = validator.validation_errors(document)
+    assert validator.is_valid(document) == (not errors)
+    try:
+        BIDSStatsModel.model_validate(document)
+    except ValidationError as e:
+        expected = [document_path(document, err['loc']) for err in e.errors()]
+        assert errors, e
+        for error in errors:
+            # Each error is at, or above, an error found by pydantic
+            assert any(loc[: len(error['loc'])] == error['loc'] for loc in expected) or lax(
+                document, error
+            ), error
+    else:
+        assert all(lax(document, error) for error in errors), errors
+
+
+def test_examples(validator):
+    document = load('model-example_smdl.json')
+    assert validator.validation_errors(document) == []
+    assert validator.validate(document) is document
+    # The walkthrough example is not valid, having a string filter value
+    assert validator.validation_errors(load('model-walkthrough_smdl.json')) == [
+        {'loc': ['Input', 'task'], 'msg': 'Input should be a valid list', 'type': 'list_type'}
+    ]
+
+
+@pytest.mark.parametrize('name', EXAMPLES)
+def test_parity(validator, name):
+    count = 0
+    for document in mutations(load(name)):
+        check_parity(validator, document)
+        count += 1
+    assert count > 500
+
+
+def test_lax(validator):
+    document = load('model-example_smdl.json')
+    options = {'HighPassFilterCutoffHz': '0.01', 'LowPassFilterCutoffHz': True}
+    document['Nodes'][0]['Model']['Options'] = options
+    document['Nodes'][0]['Model']['X'].append(True)
+    BIDSStatsModel.model_validate(document)
+    assert {tuple(error['loc'][-2:]) for error in validator.validation_errors(document)} == {
+        ('Options', 'HighPassFilterCutoffHz'),
+        ('Options', 'LowPassFilterCutoffHz'),
+        ('X', 5),
+    }
+
+
+def test_errors(validator):
+    document = load('model-example_smdl.json')
+    document['Nodes'][0]['Contrasts'][0]['Test'] = 'z'
+    del document['Nodes'][1]['Model']['X']
+    document['Edges'] = 'run'
+    assert validator.validation_errors(document) == [
+        {
+            'loc': ['Nodes', 0, 'Contrasts', 0, 'Test'],
+            'msg': "Input should be 'pass', 't' or 'F'",
+            'type': 'literal_error',
+        },
+        {'loc': ['Nodes', 1, 'Model', 'X'], 'msg': 'Field required', 'type': 'missing'},
+        {'loc': ['Edges'], 'msg': 'Input should be a valid list or null', 'type': 'any_of'},
+    ]
+    with pytest.raises(ValueError, match='3 validation error'):
+        validator.validate(document)
+
+
+def test_unsupported():
+    with pytest.raises(NotImplementedError, match='pattern'):
+        generate_validator({'type': 'string', 'pattern': '^a'})
+    with pytest.raises(NotImplementedError, match='reference'):
+        generate_validator({'$ref': 'https://example.com/schema.json'})
+
+
+def test_standalone(tmp_path):
+    write_validator(tmp_path / 'smdl_validator.py')
+    example = data.load.readable('examples', 'model-example_smdl.json')
+    code = (
+        'import json, sys, smdl_validator; '
+        f'smdl_validator.validate(json.load(open({str(example)!r}))); '
+        "assert not any(name.startswith(('pydantic', 'bsmschema')) for name in sys.modules)"
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=tmp_path, check=True)
@@ -0,0 +1,105 @@
+import copy
+import json
+import pickle
+import sys
+
+import pytest
+
+from bsmschema.compact import (
+    CompactBIDSStatsModel,
+    CompactContrast,
+    FrozenDict,
+    WeightArray,
+    compact,
+)
+from bsmschema.models import BIDSStatsModel, Contrast
+
+from . import data
+
+EXAMPLE = data.load.readable('examples', 'model-example_smdl.json')
+
+
+@pytest.fixture
+def model():
+    return BIDSStatsModel.model_validate_json(EXAMPLE.read_bytes())
+
+
+def test_round_trip(model):
+    frozen = compact(model)
+    assert frozen.to_model() == model
+    assert frozen.to_dict() == model.model_dump(exclude_none=True)
+    assert CompactBIDSStatsModel.from_dict(json.loads(EXAMPLE.read_bytes())) == frozen
+
+    for copied in (copy.deepcopy(frozen), pickle.loads(pickle.dumps(frozen))):
+        assert copied == frozen
+        assert hash(copied) == hash(frozen)
+
+
+def test_immutable(model):
+    frozen = compact(model)
+    with pytest.raises(AttributeError):
+        frozen.Name = 'other'
+    with pytest.raises(AttributeError):
+        frozen.extra = 1
+    assert not hasattr(frozen, '__dict__')
+    assert isinstance(frozen.Nodes, tuple)
+    assert isinstance(frozen.Input, FrozenDict)
+
+
+def test_dedup(model):
+    copies = {compact(model.model_copy(deep=True)): i for i in range(3)}
+    assert len(copies) == 1
+
+    other = model.model_copy(deep=True)
+    other.Nodes[0].Contrasts[0].Weights[0] = 2
+    assert compact(other) != compact(model)
+    assert len({compact(model), compact(other)}) == 2
+
+
+def test_interning(model):
+    first, second = compact(model), compact(model.model_copy(deep=True))
+    assert first.Nodes[0].Model.X is second.Nodes[0].Model.X
+    assert first.Nodes[0].GroupBy is second.Nodes[0].GroupBy
+    name = ''.join(['sub', 'ject'])
+    assert first.Nodes[0].GroupBy[-1] == name
+    assert first.Nodes[0].GroupBy[-1] is sys.intern(name)
+
+
+@pytest.mark.parametrize(
+    ('weights', 'packed'),
+    [
+        ([1, -1], ('q', (2,))),
+        ([0.5, -0.25], ('d', (2,))),
+        ([[1, 0], [0, 1]], ('q', (2, 2))),
+        ([1, -0.5, -0.5], ('d', (3,))),
+        ([[1, 0.5], [0, 1]], ('d', (2, 2))),
+        ([2**53 + 1, 0.5], None),
+        ([1, '-1/3'], None),
+        ([2**64], None),
+        ([[1], [0, 1]], None),
+    ],
+)
+def test_weights(weights, packed):
+    frozen = WeightArray.pack(weights)
+    if packed is None:
+        assert isinstance(frozen, tuple)
+    else:
+        assert (frozen.typecode, frozen.shape) == packed
+        assert frozen.tolist() == weights
+        assert repr(frozen.tolist()) == repr(weights)
+        assert pickle.loads(pickle.dumps(frozen)) == frozen
+    contrast = Contrast(Name='c', ConditionList=['A', 'B'], Weights=weights, Test='F')
+    compact_contrast = CompactContrast.from_model(contrast)
+    assert compact_contrast.to_model() == contrast
+    assert compact_contrast.to_model().Weights == weights
+
+
+def test_frozen_dict():
+    mapping = FrozenDict({'a': [1, {'b': 2}], 'c': None})
+    assert mapping['a'] == (1, FrozenDict({'b': 2}))
+    assert mapping == {'a': (1, {'b': 2}), 'c': None}
+    assert FrozenDict({'c': None, 'a': [1, {'b': 2}]}) == mapping
+    assert hash(FrozenDict({'c': None, 'a': [1, {'b': 2}]})) == hash(mapping)
+    assert mapping.todict() == {'a': [1, {'b': 2}], 'c': None}
+    with pytest.raises(KeyError):
+        mapping['d']
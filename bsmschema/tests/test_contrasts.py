@@ -0,0 +1,77 @@
+import pytest
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.contrasts import compile_contrasts, parse_weight
+
+COLUMNS = (1, 'A', 'B', 'C')
+
+
+def test_parse_weight():
+    assert parse_weight('1/3') == pytest.approx(1 / 3)
+    assert parse_weight(' -2/4 ') == -0.5
+    assert parse_weight('0.25') == 0.25
+    assert parse_weight(-1) == -1.0
+    with pytest.raises(ValueError):
+        parse_weight('one')
+    with pytest.raises(ValueError):
+        parse_weight('1/0')
+
+
+def test_compile_contrasts():
+    node = make_node(
+        COLUMNS,
+        Contrasts=[
+            {'Name': 'AvB', 'ConditionList': ['A', 'B'], 'Weights': [1, -1], 'Test': 't'},
+            {'Name': 'mean', 'ConditionList': [1], 'Weights': [1], 'Test': 'pass'},
+            {
+                'Name': 'effects',
+                'ConditionList': ['A', 'B', 'C'],
+                'Weights': [[1, 0, 0], [0, '1/2', '1/2']],
+                'Test': 'F',
+            },
+            {'Name': 'Conly', 'ConditionList': ['C'], 'Weights': [2], 'Test': 'F'},
+        ],
+        DummyContrasts={'Test': 't'},
+    )
+    compiled = compile_contrasts(node)
+    assert compiled.columns == (1, 'A', 'B', 'C')
+    assert set(compiled.groups) == {'t', 'pass', 'F'}
+    assert compiled.names == ['AvB', 'intercept', 'A', 'B', 'C', 'mean', 'effects', 'Conly']
+
+    t = compiled['t']
+    assert t.matrix.shape == (5, 4)
+    np.testing.assert_array_equal(t['AvB'], [[0, 1, -1, 0]])
+    np.testing.assert_array_equal(t.matrix[1:], np.eye(4))
+
+    F = compiled['F']
+    assert F.slices == (slice(0, 2), slice(2, 3))
+    np.testing.assert_array_equal(F['effects'], [[0, 1, 0, 0], [0, 0, 0.5, 0.5]])
+    assert dict(F)['Conly'].tolist() == [[0, 0, 0, 2]]
+
+    assert not t.matrix.flags.writeable
+    assert compile_contrasts(node) is compiled
+    assert compile_contrasts(make_node(COLUMNS, DummyContrasts={'Test': 't'}))['t'] is not t
+
+
+def test_compile_expanded_columns():
+    node = make_node([1, 'motion_*'], DummyContrasts={'Contrasts': ['motion_?'], 'Test': 't'})
+    compiled = compile_contrasts(node, columns=[1, 'motion_1', 'motion_2'])
+    assert compiled['t'].names == ('motion_1', 'motion_2')
+    np.testing.assert_array_equal(compiled['t'].matrix, [[0, 1, 0], [0, 0, 1]])
+
+
+@pytest.mark.parametrize(
+    'contrast',
+    [
+        {'Name': 'bad', 'ConditionList': ['D'], 'Weights': [1], 'Test': 't'},
+        {'Name': 'bad', 'ConditionList': ['A', 'B'], 'Weights': [1], 'Test': 't'},
+        {'Name': 'bad', 'ConditionList': ['A'], 'Weights': [[1], [1]], 'Test': 't'},
+        {'Name': 'bad', 'ConditionList': ['A', 'B'], 'Weights': [[1, 0], [1]], 'Test': 'F'},
+    ],
+)
+def test_compile_errors(contrast):
+    with pytest.raises(ValueError, match="'bad'"):
+        compile_contrasts(make_node(COLUMNS, Contrasts=[contrast]))
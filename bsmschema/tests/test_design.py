@@ -0,0 +1,164 @@
+import pytest
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.design import Run, design_matrices, design_matrix, hrf_kernel
+
+COLUMNS = (1, 'A', 'B', 'rot_x')
+
+
+def hrf(model='spm', variables=('A', 'B'), parameters=None):
+    return {'HRF': {'Variables': list(variables), 'Model': model, 'Parameters': parameters}}
+
+
+def make_run(n_scans=120, tr=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return Run(
+        n_scans=n_scans,
+        tr=tr,
+        events={
+            'A': [(onset, 4.0, 1.0) for onset in range(10, int(n_scans * tr) - 20, 30)],
+            'B': [(onset, 0.0, 2.0) for onset in range(25, int(n_scans * tr) - 20, 40)],
+        },
+        regressors={'rot_x': rng.standard_normal(n_scans)},
+    )
+
+
+def reference(events, n_scans, tr, kernel, oversampling=50):
+    """Direct convolution of a boxcar on the oversampled grid."""
+    dt = tr / oversampling
+    signal = np.zeros(n_scans * oversampling)
+    for onset, duration, amplitude in events:
+        start = round(onset / dt)
+        stop = max(round((onset + duration) / dt), start + 1)
+        signal[start:stop] += amplitude
+    return np.convolve(signal, kernel)[: len(signal)][::oversampling]
+
+
+def test_hrf_kernel():
+    kernel = hrf_kernel('spm', tr=2.0)
+    assert kernel is hrf_kernel('SPM', tr=2)
+    assert kernel.suffixes == ('',)
+    assert not kernel.matrix.flags.writeable
+    assert kernel.matrix.sum() == pytest.approx(1)
+    # Peak at about 5 seconds, with an undershoot
+    assert kernel.matrix[0].argmax() * 2.0 / 50 == pytest.approx(5, abs=0.5)
+    assert kernel.matrix.min() < 0
+
+    glover = hrf_kernel('glover + derivative + dispersion', tr=2.0)
+    assert glover.suffixes == ('', '_derivative', '_dispersion')
+    longer = hrf_kernel('glover', tr=2.0, parameters={'time_length': 40})
+    assert longer.matrix.shape[1] == 1000
+
+    fir = hrf_kernel('fir', tr=1.0, oversampling=10, parameters={'fir_delays': [0, 2]})
+    assert fir.suffixes == ('_delay_0', '_delay_2')
+    assert fir.matrix.sum(axis=1) == pytest.approx([1, 1])
+    assert fir.matrix[1, 20:30].tolist() == [0.1] * 10
+
+    for model, parameters in [
+        ('afni', None),
+        ('spm + dispersion', None),
+        ('spm', {'peak': 5}),
+        ('fir', None),
+        ('fir', {'fir_delays': [-1]}),
+    ]:
+        with pytest.raises(ValueError):
+            hrf_kernel(model, tr=2.0, parameters=parameters)
+
+
+def test_design_matrix():
+    run = make_run()
+    design = design_matrix(make_node(COLUMNS, model=hrf()), run)
+    assert design.columns == (1, 'A', 'B', 'rot_x')
+    assert design.matrix.shape == (120, 4)
+    assert design[1].tolist() == [1.0] * 120
+    assert design['rot_x'].tolist() == run.regressors['rot_x'].tolist()
+    kernel = hrf_kernel('spm', tr=2.0).matrix[0]
+    for name in ('A', 'B'):
+        expected = reference(run.events[name], 120, 2.0, kernel)
+        assert design[name] == pytest.approx(expected, abs=1e-10)
+
+
+def test_sustained_block():
+    # Kernels are normalized, so a sustained unit block reaches a plateau of one
+    run = Run(n_scans=100, tr=1.0, events={'A': [(0.0, 100.0, 1.0)]})
+    design = design_matrix(make_node(['A'], model=hrf(variables=['A'])), run)
+    assert design['A'][40:] == pytest.approx(1, abs=1e-3)
+
+
+def test_unconvolved():
+    run = Run(n_scans=10, tr=2.0, events={'A': [(2.0, 4.0, 3.0), (30.0, 1.0, 1.0)]})
+    design = design_matrix(make_node(['A'], model=hrf(variables=[])), run)
+    assert design['A'].tolist() == [0, 3, 3, 0, 0, 0, 0, 0, 0, 0]
+
+
+def test_derivatives():
+    run = make_run()
+    node = make_node(COLUMNS, model=hrf('glover + derivative + dispersion'))
+    design = design_matrix(node, run)
+    assert design.columns == (
+        1,
+        'A',
+        'A_derivative',
+        'A_dispersion',
+        'B',
+        'B_derivative',
+        'B_dispersion',
+        'rot_x',
+    )
+    kernel = hrf_kernel('glover + derivative + dispersion', tr=2.0).matrix
+    for row, suffix in enumerate(('', '_derivative', '_dispersion')):
+        expected = reference(run.events['B'], 120, 2.0, kernel[row])
+        assert design[f'B{suffix}'] == pytest.approx(expected, abs=1e-10)
+
+
+def test_fir():
+    run = Run(n_scans=20, tr=1.0, events={'A': [(2.0, 1.0, 1.0)]})
+    node = make_node([1, 'A'], model=hrf('fir', ['A'], {'fir_delays': [0, 1, 3]}))
+    design = design_matrix(node, run)
+    assert design.columns == (1, 'A_delay_0', 'A_delay_1', 'A_delay_3')
+    assert design['A_delay_0'].argmax() == 3
+    assert design['A_delay_1'].argmax() == 4
+    assert design['A_delay_3'].argmax() == 6
+
+
+def test_dense_convolved():
+    values = np.zeros(50)
+    values[10] = 1.0
+    run = Run(n_scans=50, tr=1.0, regressors={'A': values})
+    design = design_matrix(make_node(['A'], model=hrf(variables=['A'])), run)
+    # Held constant for one scan, like an event of one scan
+    expected = design_matrix(
+        make_node(['A'], model=hrf(variables=['A'])),
+        Run(n_scans=50, tr=1.0, events={'A': [(10.0, 1.0, 1.0)]}),
+    )
+    assert design['A'] == pytest.approx(expected['A'])
+
+
+def test_batched():
+    runs = [make_run(120, 2.0, 0), make_run(90, 2.0, 1), make_run(200, 1.5, 2)]
+    node = make_node([1, 'A', 'B', 'rot_*'], model=hrf('spm + derivative'))
+    batched = design_matrices(node, runs)
+    for run, design in zip(runs, batched):
+        single = design_matrix(node, run)
+        assert design.columns == single.columns
+        assert design.matrix.shape == (run.n_scans, 6)
+        assert design.matrix == pytest.approx(single.matrix, abs=1e-10)
+
+
+def test_errors():
+    node = make_node(COLUMNS, model=hrf())
+    with pytest.raises(ValueError, match='not found'):
+        design_matrix(node, Run(n_scans=10, tr=2.0, events={'A': []}))
+    run = make_run()
+    with pytest.raises(ValueError, match='both events and regressors'):
+        design_matrix(node, Run(10, 2.0, events=run.events, regressors={'A': np.zeros(10)}))
+    with pytest.raises(ValueError, match='one per scan'):
+        design_matrix(node, Run(10, 2.0, events=run.events, regressors={'rot_x': np.zeros(9)}))
+    with pytest.raises(ValueError, match='negative'):
+        design_matrix(
+            node,
+            Run(10, 2.0, events={'A': [(0, -1, 1)], 'B': []}, regressors={'rot_x': np.zeros(10)}),
+        )
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from bsmschema import models
+from bsmschema.__main__ import main
+from bsmschema.codegen import compile_validator
+from bsmschema.export import bundled_schema, class_schemas, export_schemas
+
+from . import data
+
+
+def test_class_schemas():
+    schemas = class_schemas(bundled_schema())
+    assert list(schemas) == models.__all__
+    for name, schema in schemas.items():
+        # Identical, including key order, to generating each schema separately
+        expected = getattr(models, name).model_json_schema()
+        assert json.dumps(schema) == json.dumps(expected)
+
+
+def test_bundle():
+    validator = compile_validator(bundled_schema())
+    example = data.load.readable('examples', 'model-example_smdl.json')
+    assert validator.is_valid(json.loads(example.read_text()))
+    assert not validator.is_valid({'Name': 'x'})
+
+
+def test_incremental(tmp_path):
+    first = export_schemas(tmp_path)
+    assert 'BIDSStatsModel.json' in first.changed
+    assert 'BIDSStatsModel_validator.py' in first.changed
+    assert first.unchanged == []
+    mtimes = {path.name: path.stat().st_mtime_ns for path in tmp_path.iterdir()}
+
+    second = export_schemas(tmp_path)
+    assert second.current
+    assert second.changed == []
+    assert {path.name: path.stat().st_mtime_ns for path in tmp_path.iterdir()} == mtimes
+
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    assert set(manifest) == set(first.changed) - {'manifest.json'}
+
+
+def test_existing_files(tmp_path):
+    # Unchanged files written without a manifest are not rewritten
+    export_schemas(tmp_path)
+    (tmp_path / 'manifest.json').unlink()
+    result = export_schemas(tmp_path)
+    assert result.changed == ['manifest.json']
+
+
+def test_check(tmp_path):
+    assert export_schemas(tmp_path, check=True).changed
+    assert list(tmp_path.iterdir()) == []
+
+    export_schemas(tmp_path)
+    assert export_schemas(tmp_path, check=True).current
+    (tmp_path / 'Edge.json').write_text('{}')
+    check = export_schemas(tmp_path, check=True)
+    assert check.changed == ['Edge.json']
+    assert (tmp_path / 'Edge.json').read_text() == '{}'
+
+    result = export_schemas(tmp_path)
+    assert result.changed == ['Edge.json']
+    assert json.loads((tmp_path / 'Edge.json').read_text()) == models.Edge.model_json_schema()
+
+
+def test_bundle_files(tmp_path):
+    result = export_schemas(tmp_path, bundle=True)
+    assert {'bundle.json', 'bundle.min.json'} <= set(result.changed)
+    bundle = json.loads((tmp_path / 'bundle.json').read_text())
+    assert json.loads((tmp_path / 'bundle.min.json').read_text()) == bundle
+    assert b'\n' not in (tmp_path / 'bundle.min.json').read_bytes()
+
+    # The bundle is kept unless it is no longer requested
+    assert export_schemas(tmp_path, check=True).current
+    assert export_schemas(tmp_path).current
+    assert (tmp_path / 'bundle.json').exists()
+
+    # Files no longer requested are removed
+    result = export_schemas(tmp_path, bundle=False)
+    assert result.removed == ['bundle.json', 'bundle.min.json']
+    assert not (tmp_path / 'bundle.json').exists()
+    assert 'bundle.json' not in export_schemas(tmp_path).changed
+
+
+@pytest.mark.parametrize('bundle', [None, False, True])
+def test_check_predicts_export(tmp_path, bundle):
+    export_schemas(tmp_path, bundle=True)
+    (tmp_path / 'bundle.min.json').write_text('{}')
+    (tmp_path / 'Edge.json').unlink()
+    check = export_schemas(tmp_path, bundle=bundle, check=True)
+    result = export_schemas(tmp_path, bundle=bundle)
+    assert (check.changed, check.removed) == (result.changed, result.removed)
+    assert export_schemas(tmp_path, bundle=bundle, check=True).current
+
+
+def test_manifest_outside(tmp_path):
+    (tmp_path / 'outside.json').write_text('{}')
+    schemadir = tmp_path / 'schema'
+    schemadir.mkdir()
+    (schemadir / 'manifest.json').write_text(json.dumps({'../outside.json': 'x'}))
+    assert export_schemas(schemadir).removed == []
+    assert (tmp_path / 'outside.json').exists()
+
+
+def test_cli(tmp_path, capsys):
+    schemadir = str(tmp_path / 'schema')
+    assert main(['schema', '--check', schemadir]) == 1
+    assert 'Out of date' in capsys.readouterr().err
+    assert main(['schema', '--bundle', schemadir]) == 0
+    assert main(['schema', '--check', '--bundle', schemadir]) == 0
+    # The bundle is checked when the last export wrote it
+    assert main(['schema', '--check', schemadir]) == 0
+    (tmp_path / 'schema' / 'bundle.min.json').write_text('{}')
+    assert main(['schema', '--check', schemadir]) == 1
+    assert 'Out of date' in capsys.readouterr().err
+    assert main(['schema', schemadir]) == 0
+    assert main(['schema', '--check', schemadir]) == 0
+    assert main(['schema', '--check', '--no-bundle', schemadir]) == 1
+    assert 'No longer generated' in capsys.readouterr().err
+    assert main(['schema', '--no-bundle', schemadir]) == 0
+    assert main(['schema', '--check', schemadir]) == 0
+    assert not (tmp_path / 'schema' / 'bundle.json').exists()
+
+
+@pytest.mark.parametrize('bundle', [False, True])
+def test_legacy_cli(tmp_path, bundle):
+    assert main([str(tmp_path)]) == 0
+    assert (tmp_path / 'BIDSStatsModel.json').exists()
@@ -0,0 +1,88 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.filters import ColumnIndex, IndexedTable, compile_filter, select
+
+
+def make_table():
+    subjects = np.repeat(['01', '02', '03', '04'], 6)
+    runs = np.tile(np.repeat([1, 2], 3), 4)
+    contrasts = np.tile(['A', 'B', 'AvB'], 8)
+    return IndexedTable({'subject': subjects, 'run': runs, 'contrast': contrasts})
+
+
+def brute_force(table, filter):
+    return [
+        i
+        for i in range(len(table))
+        if all(table.columns[entity][i] in values for entity, values in filter.items())
+    ]
+
+
+@pytest.mark.parametrize(
+    'filter',
+    [
+        {'contrast': ['A']},
+        {'contrast': ['AvB', 'A']},
+        {'contrast': ['B'], 'subject': ['03', '01']},
+        {'contrast': ['B'], 'subject': ['03'], 'run': [2]},
+        {'run': [1.0]},
+        {'contrast': ['C']},
+        {'contrast': []},
+    ],
+)
+def test_select(filter):
+    table = make_table()
+    assert select(table, filter).tolist() == brute_force(table, filter)
+    mask = compile_filter(filter).mask(table)
+    assert np.flatnonzero(mask).tolist() == brute_force(table, filter)
+
+
+def test_empty_and_missing():
+    table = make_table()
+    assert select(table, None).tolist() == list(range(24))
+    assert select(table, {}).tolist() == list(range(24))
+    assert select(table, {'session': ['1']}).tolist() == []
+
+
+def test_chained_rows():
+    table = make_table()
+    rows = select(table, {'subject': ['02', '04']})
+    assert select(table, {'contrast': ['A']}, rows).tolist() == [6, 9, 18, 21]
+    assert select(table, None, rows).tolist() == rows.tolist()
+    assert select(table, {'contrast': ['A']}, []).tolist() == []
+
+
+def test_indexes_are_shared():
+    table = make_table()
+    select(table, {'contrast': ['A']})
+    index = table.index('contrast')
+    select(table, {'contrast': ['B'], 'run': [1]})
+    assert table.index('contrast') is index
+    assert table.index('missing') is None
+    assert compile_filter({'contrast': ['A']}) is compile_filter({'contrast': ['A']})
+
+
+def test_unhashable_values():
+    table = make_table()
+    filter = {'contrast': [{'name': 'A', 'levels': [1, 2]}, 'B'], 'run': [[1]]}
+    assert compile_filter(filter) is compile_filter(
+        {'run': [[1]], 'contrast': [{'levels': [1, 2], 'name': 'A'}, 'B']}
+    )
+    assert select(table, {'contrast': [{'name': 'A'}, 'B']}).tolist() == brute_force(
+        table, {'contrast': ['B']}
+    )
+
+
+def test_mixed_column():
+    index = ColumnIndex(np.array(['a', None, 'b', None, 'a'], dtype=object))
+    assert index.rows([None]).tolist() == [1, 3]
+    assert index.rows(['a', 'b']).tolist() == [0, 2, 4]
+    assert index.count(['a', [1]]) == 2
+
+
+def test_length_mismatch():
+    table = IndexedTable({'a': np.arange(3), 'b': np.arange(4)})
+    with pytest.raises(ValueError, match="'b'"):
+        table.index('b')
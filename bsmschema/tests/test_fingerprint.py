@@ -0,0 +1,113 @@
+import pytest
+
+from bsmschema.fingerprint import (
+    duplicate_subtrees,
+    fingerprint,
+    subtree_fingerprint,
+    subtree_fingerprints,
+)
+from bsmschema.models import BIDSStatsModel, Contrast, Node
+
+from . import data
+from .helpers import node_fields
+
+EXAMPLE = data.load.readable('examples', 'model-example_smdl.json')
+
+
+@pytest.fixture
+def model():
+    return BIDSStatsModel.model_validate_json(EXAMPLE.read_bytes())
+
+
+def contrast(**kwargs):
+    return Contrast.model_validate(
+        {'Name': 'c', 'ConditionList': ['A', 'B'], 'Weights': [1, -1], 'Test': 't', **kwargs}
+    )
+
+
+def test_contrast():
+    base = fingerprint(contrast())
+    assert fingerprint(contrast(Description='note')) == base
+    assert fingerprint(contrast(ConditionList=['B', 'A'], Weights=[-1, 1])) == base
+    assert fingerprint(contrast(Weights=[1.0, '-2/2'])) == base
+    assert fingerprint(contrast(Weights=[-1, 1])) != base
+    assert fingerprint(contrast(Name='d')) != base
+    assert fingerprint(contrast(Test='F')) != base
+
+    f_test = contrast(Weights=[[1, 0], [0, 1]], Test='F')
+    swapped = contrast(ConditionList=['B', 'A'], Weights=[[1, 0], [0, 1]], Test='F')
+    assert fingerprint(swapped) == fingerprint(f_test)
+    assert fingerprint(contrast(Weights=[[1, 1], [0, 1]], Test='F')) != fingerprint(f_test)
+
+
+def test_node(model):
+    node = model.Nodes[0]
+    base = fingerprint(node)
+    assert fingerprint(node.model_copy(update={'Name': 'other', 'Description': 'x'})) == base
+    assert fingerprint(node.model_copy(update={'GroupBy': node.GroupBy[::-1]})) == base
+    assert fingerprint(node.model_copy(update={'Level': 'Session'})) != base
+    assert fingerprint(node.Model) != fingerprint(model.Nodes[1].Model)
+
+    reordered = Node.model_validate(
+        {
+            **node.model_dump(exclude_none=True),
+            'Model': {**node.Model.model_dump(exclude_none=True), 'X': node.Model.X[::-1]},
+        }
+    )
+    assert fingerprint(reordered) != base
+
+
+def test_subtrees(model):
+    subtrees = subtree_fingerprints(model)
+    assert list(subtrees) == ['run', 'subject', 'dataset']
+    assert subtree_fingerprint(model, 'dataset') == subtrees['dataset']
+    assert len(set(subtrees.values())) == 3
+
+    # Changing a node changes the subtrees that include it
+    changed = model.model_copy(deep=True)
+    changed.Nodes[1].Model.X = [1, 'age']
+    changed_subtrees = subtree_fingerprints(changed)
+    assert changed_subtrees['run'] == subtrees['run']
+    assert changed_subtrees['subject'] != subtrees['subject']
+    assert changed_subtrees['dataset'] != subtrees['dataset']
+
+    filtered = model.model_copy(deep=True)
+    filtered.Input = {'subject': ['01']}
+    assert subtree_fingerprints(filtered)['run'] != subtrees['run']
+
+
+def test_model(model):
+    text = EXAMPLE.read_text()
+    for field in ('Name', 'Source', 'Destination'):
+        text = text.replace(f'"{field}": "subject"', f'"{field}": "subject_level"')
+    renamed = BIDSStatsModel.model_validate_json(text)
+    assert renamed.graph.nodes['subject_level']
+    renamed.Name = 'renamed'
+    renamed.Description = None
+    assert fingerprint(renamed) == fingerprint(model)
+
+    explicit = model.model_copy(deep=True)
+    explicit.Edges = explicit.Edges[::-1]
+    assert fingerprint(explicit) == fingerprint(model)
+
+    duplicates = duplicate_subtrees([model, renamed, explicit])
+    assert sorted(duplicates[subtree_fingerprint(model, 'run')]) == [
+        (0, 'run'),
+        (1, 'run'),
+        (2, 'run'),
+    ]
+    assert len(duplicates) == 3
+
+
+def test_cycle():
+    model = BIDSStatsModel.model_validate(
+        {
+            'Name': 'cycle',
+            'BIDSModelVersion': '1.0.0',
+            'Nodes': [node_fields(name='a', group_by=[]), node_fields(name='b', group_by=[])],
+            'Edges': [{'Source': 'a', 'Destination': 'b'}, {'Source': 'b', 'Destination': 'a'}],
+        }
+    )
+    with pytest.raises(ValueError, match='cycle'):
+        subtree_fingerprints(model)
+    assert duplicate_subtrees([model, model]) == {}
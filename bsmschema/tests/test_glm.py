@@ -0,0 +1,160 @@
+import tracemalloc
+
+import pytest
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema import glm
+from bsmschema.design import DesignMatrix
+from bsmschema.glm import fit_glm, fit_glm_groups
+
+COLUMNS = (1, 'A', 'B', 'C')
+
+
+CONTRASTS = {
+    'Contrasts': [
+        {'Name': 'AvB', 'ConditionList': ['A', 'B'], 'Weights': [1, -1], 'Test': 't'},
+        {
+            'Name': 'effects',
+            'ConditionList': ['A', 'B', 'C'],
+            'Weights': [[1, 0, 0], [0, 1, '-1/2']],
+            'Test': 'F',
+        },
+        {'Name': 'Conly', 'ConditionList': ['C'], 'Weights': [1], 'Test': 'F'},
+        {'Name': 'mean', 'ConditionList': [1], 'Weights': [1], 'Test': 'pass'},
+    ],
+    'DummyContrasts': {'Contrasts': ['C'], 'Test': 't'},
+}
+NODE = make_node(COLUMNS, **CONTRASTS)
+
+
+def make_data(n=80, voxels=50, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([np.ones(n), rng.standard_normal((n, 3))])
+    betas = rng.standard_normal((4, voxels))
+    return DesignMatrix(COLUMNS, X), X @ betas + rng.standard_normal((n, voxels))
+
+
+def rss(X, Y):
+    residuals = Y - X @ np.linalg.lstsq(X, Y, rcond=None)[0]
+    return (residuals**2).sum(axis=0)
+
+
+def test_fit_glm():
+    design, Y = make_data()
+    X = design.matrix
+    result = fit_glm(NODE, design, Y)
+    betas = np.linalg.lstsq(X, Y, rcond=None)[0]
+    assert result.columns == COLUMNS
+    assert result.dof == 76
+    assert result.betas == pytest.approx(betas)
+    sigma2 = rss(X, Y) / 76
+    assert result.residual_variance == pytest.approx(sigma2)
+    assert set(result.contrasts) == {'AvB', 'effects', 'Conly', 'mean', 'C'}
+
+    xtx_inv = np.linalg.inv(X.T @ X)
+    c = np.array([0, 1, -1, 0])
+    t = result['AvB']
+    assert t.test == 't'
+    assert t.effect == pytest.approx(c @ betas)
+    assert t.variance == pytest.approx(c @ xtx_inv @ c * sigma2)
+    assert t.stat == pytest.approx(c @ betas / np.sqrt(c @ xtx_inv @ c * sigma2))
+    assert result['C'].effect == pytest.approx(betas[3])
+
+    mean = result['mean']
+    assert mean.stat is None
+    assert mean.effect == pytest.approx(betas[0])
+
+    # F statistics agree with the comparison of full and restricted models
+    effects = result['effects']
+    assert effects.variance is None
+    assert effects.effect.shape == (2, 50)
+    restricted = np.column_stack([np.ones(80), X[:, 2] * 0.5 + X[:, 3]])
+    expected = (rss(restricted, Y) - rss(X, Y)) / 2 / sigma2
+    assert effects.stat == pytest.approx(expected)
+    expected = (rss(X[:, :3], Y) - rss(X, Y)) / sigma2
+    assert result['Conly'].stat == pytest.approx(expected)
+    assert result['Conly'].effect.shape == (50,)
+
+
+def test_chunks_and_threads():
+    design, Y = make_data(voxels=103)
+    single = fit_glm(NODE, design, Y, max_workers=1)
+    chunked = fit_glm(NODE, design, Y, chunk_size=10, max_workers=4)
+    assert chunked.betas == pytest.approx(single.betas)
+    for name, estimate in single.contrasts.items():
+        assert chunked[name].effect == pytest.approx(estimate.effect)
+        if estimate.stat is not None:
+            assert chunked[name].stat == pytest.approx(estimate.stat)
+
+
+def test_memory_mapped(tmp_path):
+    design, Y = make_data(voxels=60)
+    volume = Y.reshape(80, 3, 4, 5)
+    np.save(tmp_path / 'data.npy', volume)
+    result = fit_glm(NODE, design, tmp_path / 'data.npy', chunk_size=7)
+    expected = fit_glm(NODE, design, Y)
+    assert result.betas.shape == (4, 3, 4, 5)
+    assert result['effects'].effect.shape == (2, 3, 4, 5)
+    assert result['AvB'].stat.shape == (3, 4, 5)
+    assert result.betas.reshape(4, -1) == pytest.approx(expected.betas)
+
+
+def test_fortran_order(tmp_path):
+    design, Y = make_data(n=80, voxels=6000)
+    volume = np.asfortranarray(Y.reshape(80, 20, 30, 10))
+    np.save(tmp_path / 'data.npy', volume)
+    mapped = np.load(tmp_path / 'data.npy', mmap_mode='r')
+    assert mapped.flags.f_contiguous
+    tracemalloc.start()
+    try:
+        result = fit_glm(NODE, design, mapped, chunk_size=100, max_workers=1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Only chunks of the data are read into memory
+    assert peak < volume.nbytes / 2
+    expected = fit_glm(NODE, design, np.ascontiguousarray(volume))
+    assert result.betas == pytest.approx(expected.betas)
+    assert result['effects'].effect == pytest.approx(expected['effects'].effect)
+
+
+def test_groups(monkeypatch):
+    prepared = []
+    init = glm._PreparedDesign.__init__
+
+    def counting_init(self, *args):
+        prepared.append(self)
+        init(self, *args)
+
+    monkeypatch.setattr(glm._PreparedDesign, '__init__', counting_init)
+    shared, Y1 = make_data(seed=0)
+    other, Y2 = make_data(seed=1)
+    Y3 = Y1[:, ::-1]
+    designs = [shared, other, DesignMatrix(COLUMNS, shared.matrix.copy())]
+    results = fit_glm_groups(NODE, designs, [Y1, Y2, Y3], chunk_size=16)
+    assert len(prepared) == 2
+    for design, Y, result in zip(designs, [Y1, Y2, Y3], results):
+        assert result.betas == pytest.approx(np.linalg.lstsq(design.matrix, Y, rcond=None)[0])
+
+
+def test_rank_deficient():
+    design, Y = make_data()
+    X = np.column_stack([design.matrix[:, :3], design.matrix[:, 1] + design.matrix[:, 2]])
+    result = fit_glm(NODE, DesignMatrix(COLUMNS, X), Y)
+    assert result.dof == 77
+    assert result.residual_variance == pytest.approx(rss(X, Y) / 77)
+
+
+def test_errors():
+    design, Y = make_data()
+    with pytest.raises(ValueError, match='glm'):
+        fit_glm(make_node(COLUMNS, model_type='meta', **CONTRASTS), design, Y)
+    with pytest.raises(ValueError, match='rows'):
+        fit_glm(NODE, design, Y[:-1])
+    with pytest.raises(ValueError, match='not found'):
+        fit_glm(NODE, DesignMatrix((1, 'A', 'B', 'D'), design.matrix), Y)
+    with pytest.raises(ValueError, match='one data array per design'):
+        fit_glm_groups(NODE, [design], [])
@@ -0,0 +1,77 @@
+import pytest
+
+from bsmschema.models import BIDSStatsModel
+
+from .helpers import node_fields
+
+
+def make_model(names, edges=None):
+    return BIDSStatsModel.model_validate(
+        {
+            'Name': 'graph',
+            'BIDSModelVersion': '1.0.0',
+            'Nodes': [node_fields(name=name, group_by=[]) for name in names],
+            'Edges': None
+            if edges is None
+            else [{'Source': src, 'Destination': dst} for src, dst in edges],
+        }
+    )
+
+
+def test_implicit_edges():
+    graph = make_model(['a', 'b', 'c']).graph
+    assert graph.implicit
+    assert [(e.Source, e.Destination) for e in graph.edges] == [('a', 'b'), ('b', 'c')]
+    assert graph.roots == ['a']
+    assert graph.leaves == ['c']
+    assert graph.topological_order == ['a', 'b', 'c']
+    assert list(graph.levels) == ['Run']
+
+
+def test_branching_graph():
+    model = make_model(['d', 'b', 'a', 'c'], [('a', 'b'), ('a', 'c'), ('b', 'd'), ('c', 'd')])
+    graph = model.graph
+    assert not graph.implicit
+    assert graph.children['a'] == ['b', 'c']
+    assert graph.parents['d'] == ['b', 'c']
+    assert [e.Source for e in graph.incoming['d']] == ['b', 'c']
+    order = graph.topological_order
+    assert order[0] == 'a' and order[-1] == 'd'
+    assert graph.ancestors('d') == ['b', 'c', 'a']
+    assert graph.descendants('b') == ['d']
+
+
+def test_cycles_and_dangling():
+    graph = make_model(['a', 'b', 'c'], [('a', 'b'), ('b', 'c'), ('c', 'b'), ('c', 'x')]).graph
+    assert not graph.is_acyclic
+    assert graph.cyclic == ['b', 'c']
+    assert [e.Destination for e in graph.dangling] == ['x']
+    with pytest.raises(ValueError, match='cycle'):
+        graph.topological_order
+
+    graph = make_model(['a', 'a', 'b']).graph
+    assert graph.duplicates == ['a']
+
+
+def test_graph_cache():
+    model = make_model(['a', 'b'])
+    graph = model.graph
+    assert model.graph is graph
+
+    copied = model.model_copy(update={'Edges': []})
+    assert copied.graph is not graph
+    assert copied.graph.roots == ['a', 'b']
+    assert model.model_copy(deep=True).graph is not graph
+
+    model.Edges = []
+    assert model.graph is not graph
+    assert model.graph.edges == []
+
+
+def test_graph_cache_equality():
+    a, b = make_model(['a', 'b']), make_model(['a', 'b'])
+    assert a == b
+    a.graph
+    assert a == b
+    assert b == a
+    assert a != make_model(['a', 'c'])
@@ -0,0 +1,89 @@
+import itertools
+
+import pytest
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.filters import IndexedTable, select
+from bsmschema import groupby
+from bsmschema.groupby import partition
+
+
+def make_table():
+    rng = np.random.default_rng(0)
+    return IndexedTable(
+        {
+            'subject': rng.choice(['01', '02', '03'], 60),
+            'run': rng.choice([1, 2], 60),
+            'contrast': rng.choice(['A', 'B'], 60),
+        }
+    )
+
+
+def brute_force(table, variables, rows=None):
+    groups = {}
+    for i in range(len(table)) if rows is None else rows:
+        key = tuple(table.columns[name][i].item() for name in variables)
+        groups.setdefault(key, []).append(i)
+    return sorted(groups.items())
+
+
+@pytest.mark.parametrize('variables', [['subject'], ['run', 'subject'], ['subject', 'contrast']])
+def test_partition(variables):
+    table = make_table()
+    groups = partition(table, variables)
+    expected = brute_force(table, variables)
+    assert len(groups) == len(expected)
+    assert groups.counts.tolist() == [len(rows) for _, rows in expected]
+    assert [(tuple(g.key.values()), g.rows.tolist()) for g in groups] == expected
+    assert [tuple(key.values()) for key in groups.keys] == [key for key, _ in expected]
+    assert groups[1].rows.tolist() == expected[1][1]
+
+
+def test_partition_node_and_rows():
+    table = make_table()
+    node = make_node(level='Subject', group_by=['subject', 'contrast', 'session'])
+    rows = select(table, {'run': [1]})
+    groups = partition(table, node, rows)
+    expected = brute_force(table, ['subject', 'contrast'], rows)
+    assert [g.rows.tolist() for g in groups] == [rows for _, rows in expected]
+    assert all(g.key['session'] is None for g in groups)
+
+
+def test_partition_trivial():
+    table = make_table()
+    groups = partition(table, [])
+    assert len(groups) == 1
+    assert groups[0].key == {}
+    assert groups[0].rows.tolist() == list(range(60))
+
+    groups = partition(table, ['subject'], rows=[])
+    assert len(groups) == 0
+    assert list(groups) == []
+
+
+def test_partition_single_variable():
+    table = make_table()
+    groups = partition(table, 'subject')
+    assert groups.groupby == ('subject',)
+    assert [group.key for group in groups] == [
+        group.key for group in partition(table, ['subject'])
+    ]
+
+
+def test_key_compression(monkeypatch):
+    monkeypatch.setattr(groupby, '_MAX_KEY', 4)
+    table = make_table()
+    variables = ['subject', 'run', 'contrast']
+    groups = partition(table, variables)
+    assert [g.rows.tolist() for g in groups] == [rows for _, rows in brute_force(table, variables)]
+
+
+def test_partition_is_lazy():
+    table = make_table()
+    groups = iter(partition(table, ['subject', 'run']))
+    first = next(groups)
+    assert first.key == {'subject': '01', 'run': 1}
+    assert len(list(itertools.islice(groups, 2))) == 2
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+
+def import_time(statement):
+    """Run a statement in a fresh interpreter, returning cumulative import times in us."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+
+def test_lazy_import():
+    times = import_time('import bsmschema')
+    # Generous bound; the package alone should import in about a millisecond
+    assert times['bsmschema'] < 50_000
+    assert not any(name.startswith(('pydantic', 'bsmschema.models')) for name in times)
+
+
+def test_deferred_validators():
+    code = (
+        'import bsmschema; '
+        'assert not bsmschema.models.BIDSStatsModel.__pydantic_complete__; '
+        'bsmschema.models.BIDSStatsModel.model_validate('
+        "{'Name': 'x', 'BIDSModelVersion': '1.0.0', 'Nodes': []}); "
+        'assert bsmschema.models.BIDSStatsModel.__pydantic_complete__'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -0,0 +1,115 @@
+import copy
+import json
+import pickle
+
+import pytest
+from pydantic import ValidationError
+
+from bsmschema.lazy import RawJSON, validate_json
+from bsmschema.models import BIDSStatsModel, Transformations
+
+INSTRUCTIONS = (
+    b'[ {"Name": "Factor", "Input": ["trial_type"]},\n  {"Name": "Scale", "Input": ["a]{"]} ]'
+)
+SOFTWARE = b'{"FSL": {"Nested": [[{"x": 1e-3}]]},  "SPM": {}}'
+
+
+def make_document(instructions=INSTRUCTIONS, software=SOFTWARE):
+    return b"""{
+  "Name": "lazy",
+  "BIDSModelVersion": "1.0.0",
+  "Description": "Instructions",
+  "Nodes": [
+    {"Level": "Run", "Name": "run", "GroupBy": ["run", "subject"],
+     "Transformations": {"Transformer": "pybids-transforms-v1", "Instructions": %s},
+     "Model": {"Type": "glm", "X": [1, "trial_type.*"], "Software": %s}},
+    {"Level": "Subject", "Name": "subject", "GroupBy": ["subject"],
+     "Model": {"Type": "meta", "X": [1]}}
+  ]
+}""" % (instructions, software)
+
+
+def test_validate_json():
+    data = make_document()
+    lazy = validate_json(data)
+    eager = BIDSStatsModel.model_validate_json(data)
+
+    instructions = lazy.Nodes[0].Transformations.Instructions
+    software = lazy.Nodes[0].Model.Software
+    assert isinstance(instructions, RawJSON)
+    assert bytes(instructions.raw) == INSTRUCTIONS
+    assert list(software) == ['FSL', 'SPM']
+    assert bytes(software['FSL'].raw) == b'{"Nested": [[{"x": 1e-3}]]}'
+
+    # Undecoded payloads are emitted verbatim
+    assert not instructions.decoded
+    dumped = lazy.model_dump_json(exclude_unset=True)
+    assert INSTRUCTIONS.decode() in dumped
+    assert json.loads(dumped) == json.loads(eager.model_dump_json(exclude_unset=True))
+    assert not instructions.decoded
+
+    assert lazy == eager
+    assert lazy.model_dump() == eager.model_dump()
+    assert len(instructions) == 2
+    assert instructions[1]['Input'] == ['a]{']
+    assert instructions.decoded
+
+    # Decoded payloads may be modified
+    instructions.value.pop()
+    assert json.loads(lazy.model_dump_json())['Nodes'][0]['Transformations']['Instructions'] == [
+        {'Name': 'Factor', 'Input': ['trial_type']}
+    ]
+
+
+def test_copy():
+    lazy = validate_json(make_document())
+    for copied in (copy.deepcopy(lazy), pickle.loads(pickle.dumps(lazy))):
+        assert copied == lazy
+        assert copied.model_dump_json() == lazy.model_dump_json()
+    model = Transformations(Transformer='pybids-transforms-v1', Instructions=RawJSON(b'[1]'))
+    assert model.model_dump() == {
+        'Description': None,
+        'Transformer': 'pybids-transforms-v1',
+        'Instructions': [1],
+    }
+
+
+@pytest.mark.parametrize(
+    ('instructions', 'software'),
+    [
+        (b'{"Name": "Factor"}', SOFTWARE),
+        (INSTRUCTIONS, b'{"FSL": [1]}'),
+        (INSTRUCTIONS, b'{"FSL": {"Option": [1}}'),
+        (b'[1, 2', SOFTWARE),
+    ],
+)
+def test_invalid(instructions, software):
+    data = make_document(instructions, software)
+    with pytest.raises(ValidationError) as eager:
+        BIDSStatsModel.model_validate_json(data)
+    with pytest.raises(ValidationError) as lazy:
+        validate_json(data)
+    assert lazy.value.errors() == eager.value.errors()
+
+
+def test_schema_unchanged():
+    schema = Transformations.model_json_schema()
+    assert schema['properties']['Instructions'] == {
+        'items': {},
+        'title': 'Instructions',
+        'type': 'array',
+    }
+
+
+@pytest.mark.parametrize('size', [16, 200])
+def test_deeply_nested(size):
+    names = ', '.join(f'"name{k}"' for k in range(size))
+    instructions = b'[{"Name": "Factor", "Input": [[[[[[[%s]]]]]]]}]' % names.encode()
+    model = validate_json(make_document(instructions))
+    assert bytes(model.Nodes[0].Transformations.Instructions.raw) == instructions
+
+
+@pytest.mark.parametrize('payload', [b'[%s}' % b'1,' * 5000, b'[[[[[[[%s' % b'1,' * 5000])
+def test_unclosed(payload):
+    with pytest.raises(ValidationError):
+        validate_json(make_document(software=b'{"FSL": %s}' % payload))
@@ -0,0 +1,182 @@
+import tracemalloc
+from functools import partial
+
+import pytest
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.meta import MetaEstimator
+
+
+dataset_node = partial(make_node, level='Dataset', DummyContrasts={'Test': 't'})
+
+
+def make_inputs(k=12, voxels=30, seed=0):
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(20, 40, k)
+    variances = rng.uniform(0.5, 2, (k, voxels))
+    effects = 1 + 0.1 * age[:, None] + rng.standard_normal((k, voxels)) * np.sqrt(variances)
+    return effects, variances, age
+
+
+def test_fixed_intercept():
+    effects, variances, _ = make_inputs()
+    estimator = MetaEstimator(dataset_node())
+    for effect, variance in zip(effects, variances):
+        estimator.add(effect, variance)
+    result = estimator.result()
+    assert result.count == 12
+    assert result.dof == float('inf')
+    weights = 1 / variances
+    expected = (weights * effects).sum(axis=0) / weights.sum(axis=0)
+    intercept = result['intercept']
+    assert intercept.effect == pytest.approx(expected)
+    assert intercept.variance == pytest.approx(1 / weights.sum(axis=0))
+    assert intercept.stat == pytest.approx(expected * np.sqrt(weights.sum(axis=0)))
+    assert result.betas.shape == (1, 30)
+
+
+def test_fixed_covariates():
+    effects, variances, age = make_inputs()
+    node = dataset_node(
+        [1, 'age'],
+        Contrasts=[
+            {'Name': 'both', 'ConditionList': [1, 'age'], 'Weights': [[1, 0], [0, 1]], 'Test': 'F'}
+        ],
+    )
+    estimator = MetaEstimator(node, chunk_size=7, max_workers=3)
+    estimator.add_batch(effects[:5], variances[:5], {'age': age[:5]})
+    for i in range(5, 12):
+        estimator.add(effects[i], variances[i], {'age': age[i]})
+    result = estimator.result()
+
+    X = np.column_stack([np.ones(12), age])
+    for voxel in range(30):
+        W = np.diag(1 / variances[:, voxel])
+        covariance = np.linalg.inv(X.T @ W @ X)
+        beta = covariance @ X.T @ W @ effects[:, voxel]
+        assert result.betas[:, voxel] == pytest.approx(beta)
+        assert result['age'].variance[voxel] == pytest.approx(covariance[1, 1])
+        assert result['both'].effect[:, voxel] == pytest.approx(beta)
+        assert result['both'].stat[voxel] == pytest.approx(
+            beta @ np.linalg.inv(covariance) @ beta / 2
+        )
+
+
+def test_mixed():
+    effects, _, age = make_inputs(voxels=50)
+    node = dataset_node([1, 'age'])
+    streamed = MetaEstimator(node, method='mixed')
+    for effect, value in zip(effects, age):
+        # Variances are not needed
+        streamed.add(effect, covariates={'age': value})
+    batched = MetaEstimator(node, method='mixed', chunk_size=8, max_workers=2)
+    batched.add_batch(effects, covariates={'age': age})
+
+    X = np.column_stack([np.ones(12), age])
+    betas, rss = np.linalg.lstsq(X, effects, rcond=None)[:2]
+    sigma2 = rss / 10
+    xtx_inv = np.linalg.inv(X.T @ X)
+    for result in (streamed.result(), batched.result()):
+        assert result.method == 'mixed'
+        assert result.dof == 10
+        assert result.betas == pytest.approx(betas)
+        assert result['age'].variance == pytest.approx(xtx_inv[1, 1] * sigma2)
+        assert result['age'].stat == pytest.approx(betas[1] / np.sqrt(xtx_inv[1, 1] * sigma2))
+
+
+def test_invalid_variances():
+    estimator = MetaEstimator(dataset_node())
+    estimator.add([1.0, 1.0, 1.0], [1.0, 0.0, np.nan])
+    estimator.add([3.0, 3.0, 5.0], [1.0, 1.0, 0.0])
+    result = estimator.result()
+    effect = result['intercept'].effect
+    assert effect[:2].tolist() == [2.0, 3.0]
+    assert np.isnan(effect[2])
+
+
+def test_memory_mapped(tmp_path):
+    effects, variances, _ = make_inputs(k=4, voxels=24)
+    estimator = MetaEstimator(dataset_node())
+    for i in range(4):
+        np.save(tmp_path / f'effect{i}.npy', effects[i].reshape(2, 3, 4))
+        np.save(tmp_path / f'variance{i}.npy', variances[i].reshape(2, 3, 4))
+        estimator.add(tmp_path / f'effect{i}.npy', tmp_path / f'variance{i}.npy')
+    result = estimator.result()
+    assert result['intercept'].effect.shape == (2, 3, 4)
+    assert result.betas.shape == (1, 2, 3, 4)
+    weights = 1 / variances
+    expected = (weights * effects).sum(axis=0) / weights.sum(axis=0)
+    assert result['intercept'].effect.ravel() == pytest.approx(expected)
+
+
+def test_fortran_order(tmp_path):
+    effects, variances, _ = make_inputs(k=40, voxels=6000)
+    for name, values in (('effects', effects), ('variances', variances)):
+        np.save(tmp_path / f'{name}.npy', np.asfortranarray(values.reshape(40, 20, 30, 10)))
+    mapped = np.load(tmp_path / 'effects.npy', mmap_mode='r')
+    estimator = MetaEstimator(dataset_node(), chunk_size=100, max_workers=1)
+    tracemalloc.start()
+    try:
+        estimator.add_batch(mapped, tmp_path / 'variances.npy')
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Only chunks of the inputs are read into memory
+    assert peak < mapped.nbytes / 2
+    # Inputs of another layout are flattened in the same order
+    estimator.add_batch(effects[:2].reshape(2, 20, 30, 10), variances[:2].reshape(2, 20, 30, 10))
+    result = estimator.result()
+    assert result['intercept'].effect.shape == (20, 30, 10)
+    weights = 1 / np.concatenate([variances, variances[:2]])
+    expected = (weights * np.concatenate([effects, effects[:2]])).sum(axis=0) / weights.sum(axis=0)
+    assert result['intercept'].effect.ravel() == pytest.approx(expected)
+
+
+def test_errors():
+    with pytest.raises(ValueError, match='meta'):
+        MetaEstimator(dataset_node(model_type='glm'))
+    with pytest.raises(ValueError, match='method'):
+        MetaEstimator(dataset_node(), method='random')
+    estimator = MetaEstimator(dataset_node())
+    with pytest.raises(ValueError, match='No inputs'):
+        estimator.result()
+    with pytest.raises(ValueError, match='requires variances'):
+        estimator.add([1.0, 2.0])
+    with pytest.raises(ValueError, match='do not match'):
+        estimator.add([1.0, 2.0], [1.0])
+    estimator.add([1.0, 2.0], [1.0, 1.0])
+    with pytest.raises(ValueError, match='shape'):
+        estimator.add([1.0, 2.0, 3.0], [1.0, 1.0, 1.0])
+    with pytest.raises(ValueError, match="Missing covariate 'age'"):
+        MetaEstimator(dataset_node([1, 'age']), method='mixed').add([1.0])
+
+
+@pytest.mark.parametrize(
+    ('method', 'arguments'),
+    [('fixed', ([1.0, 2.0],)), ('fixed', ([1.0, 2.0], [1.0])), ('mixed', ([1.0],))],
+)
+def test_invalid_first_inputs(method, arguments):
+    # Invalid inputs leave the estimator empty
+    X = [1, 'age'] if method == 'mixed' else [1]
+    estimator = MetaEstimator(dataset_node(X), method=method)
+    with pytest.raises(ValueError):
+        estimator.add(*arguments)
+    with pytest.raises(ValueError, match='No inputs'):
+        estimator.result()
+    assert estimator.count == 0
+
+
+def test_singular():
+    # Constant covariates make the design singular; pseudoinverses are used instead
+    effects, variances, _ = make_inputs(k=4, voxels=5)
+    estimator = MetaEstimator(dataset_node([1, 'age']))
+    estimator.add_batch(effects, variances, {'age': 1.0})
+    result = estimator.result()
+    weights = 1 / variances
+    expected = (weights * effects).sum(axis=0) / weights.sum(axis=0)
+    # The minimum norm solution splits the mean equally between the identical columns
+    assert result.betas.sum(axis=0) == pytest.approx(expected)
+    assert result.betas[0] == pytest.approx(result.betas[1])
@@ -0,0 +1,162 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from bsmschema.batch import _format_errors
+from bsmschema.models import BIDSStatsModel
+from bsmschema.patch import ModelEditor, apply_patch
+from bsmschema.semantics import check_model
+
+from . import data
+
+EXAMPLE = data.load.readable('examples', 'model-example_smdl.json')
+
+
+@pytest.fixture
+def editor():
+    return ModelEditor(EXAMPLE.read_bytes())
+
+
+def expected_errors(document):
+    try:
+        model = BIDSStatsModel.model_validate(document)
+    except ValidationError as e:
+        return {(tuple(err['loc']), err['type']) for err in _format_errors(e)}
+    return {(tuple(err['loc']), err['type']) for err in check_model(model)}
+
+
+def keys(errors):
+    return {(tuple(err['loc']), err['type']) for err in errors}
+
+
+def test_apply_patch():
+    document = {'a': {'b': [1, 2]}, 'c': {'d': 1}, 'e/f': 0, 'g~h': 0}
+    patched = apply_patch(
+        document,
+        [
+            {'op': 'add', 'path': '/a/b/-', 'value': 3},
+            {'op': 'add', 'path': '/a/b/0', 'value': 0},
+            {'op': 'replace', 'path': '/e~1f', 'value': 1},
+            {'op': 'remove', 'path': '/g~0h'},
+            {'op': 'copy', 'from': '/a/b', 'path': '/x'},
+            {'op': 'move', 'from': '/x/0', 'path': '/y'},
+            {'op': 'test', 'path': '/y', 'value': 0},
+        ],
+    )
+    assert patched == {'a': {'b': [0, 1, 2, 3]}, 'c': {'d': 1}, 'e/f': 1, 'x': [1, 2, 3], 'y': 0}
+    # The original is unchanged, and unmodified objects are shared
+    assert document == {'a': {'b': [1, 2]}, 'c': {'d': 1}, 'e/f': 0, 'g~h': 0}
+    assert patched['c'] is document['c']
+    assert apply_patch(document, [{'op': 'replace', 'path': '', 'value': 1}]) == 1
+
+
+@pytest.mark.parametrize(
+    'operation',
+    [
+        {'op': 'remove', 'path': '/missing'},
+        {'op': 'replace', 'path': '/a/b/2', 'value': 0},
+        {'op': 'add', 'path': '/a/b/01', 'value': 0},
+        {'op': 'add', 'path': 'a', 'value': 0},
+        {'op': 'add', 'path': '/c/d/e', 'value': 0},
+        {'op': 'move', 'from': '/a', 'path': '/a/b/0'},
+        {'op': 'test', 'path': '/c/d', 'value': True},
+        {'op': 'frobnicate', 'path': '/a'},
+        {'op': 'add', 'path': '/a'},
+    ],
+)
+def test_invalid_patch(operation):
+    document = {'a': {'b': [1, 2]}, 'c': {'d': 1}}
+    with pytest.raises(ValueError):
+        apply_patch(document, [operation])
+    assert document == {'a': {'b': [1, 2]}, 'c': {'d': 1}}
+
+
+def test_editor_initial(editor):
+    assert editor.errors == []
+    expected = BIDSStatsModel.model_validate_json(EXAMPLE.read_bytes())
+    assert editor.model.model_dump() == expected.model_dump()
+
+
+def test_editor_reuses_unchanged(editor):
+    before = editor.model
+    result = editor.apply([{'op': 'replace', 'path': '/Nodes/1/Model/X/0', 'value': 'x'}])
+    assert result.model is editor.model
+    assert result.model.Nodes[0] is before.Nodes[0]
+    assert result.model.Nodes[2] is before.Nodes[2]
+    assert result.model.Nodes[1] is not before.Nodes[1]
+    assert result.model.Edges[0] is before.Edges[0]
+    assert result.model.Nodes[1].Model.X == ['x']
+
+    # Unchanged contrasts of a changed node are reused as well
+    contrast = result.model.Nodes[0].Contrasts[0]
+    result = editor.apply([{'op': 'replace', 'path': '/Nodes/0/Name', 'value': 'first'}])
+    assert result.model.Nodes[0].Contrasts[0] is contrast
+
+
+def test_editor_failure_leaves_state(editor):
+    document, model = editor.document, editor.model
+    with pytest.raises(ValueError):
+        editor.apply([{'op': 'remove', 'path': '/Nodes/5'}])
+    assert editor.document is document
+    assert editor.model is model
+
+
+@pytest.mark.parametrize(
+    'patch',
+    [
+        [{'op': 'replace', 'path': '/Nodes/0/Contrasts/0/ConditionList/0', 'value': 'other'}],
+        [{'op': 'add', 'path': '/Nodes/0/Contrasts/0/Weights/-', 'value': 1}],
+        [{'op': 'replace', 'path': '/Nodes/1/Name', 'value': 'run'}],
+        [{'op': 'replace', 'path': '/Edges/0/Source', 'value': 'missing'}],
+        [{'op': 'add', 'path': '/Edges/-', 'value': {'Source': 'dataset', 'Destination': 'run'}}],
+        [{'op': 'replace', 'path': '/Nodes/0/Contrasts/0/Test', 'value': 'F'}],
+        [{'op': 'replace', 'path': '/Nodes/0/Level', 'value': 'Nowhere'}],
+        [{'op': 'remove', 'path': '/Nodes/0/Model'}],
+        [{'op': 'replace', 'path': '/BIDSModelVersion', 'value': 1}],
+        [{'op': 'remove', 'path': '/Edges'}],
+        [{'op': 'replace', 'path': '/Nodes', 'value': {}}],
+        [{'op': 'move', 'from': '/Nodes/2', 'path': '/Nodes/0'}],
+    ],
+)
+def test_editor_matches_full_validation(editor, patch):
+    result = editor.apply(patch)
+    expected = expected_errors(editor.document)
+    assert keys(result.errors) == expected
+    assert keys(result.added) == expected
+    assert result.removed == []
+    try:
+        BIDSStatsModel.model_validate(editor.document)
+    except ValidationError:
+        assert result.model is None
+    else:
+        expected_model = BIDSStatsModel.model_validate(editor.document)
+        assert result.model.model_dump() == expected_model.model_dump()
+
+    # Undoing the patch resolves all errors
+    undo = ModelEditor(EXAMPLE.read_bytes()).document
+    result = editor.apply([{'op': 'replace', 'path': '', 'value': undo}])
+    assert result.errors == []
+    assert keys(result.removed) == expected
+
+
+def test_editor_error_diff(editor):
+    result = editor.apply(
+        [{'op': 'add', 'path': '/Nodes/0/Contrasts/0/ConditionList/-', 'value': 'x'}]
+    )
+    assert keys(result.added) == {
+        (('Nodes', 0, 'Contrasts', 0, 'ConditionList', 2), 'unknown_variable'),
+        (('Nodes', 0, 'Contrasts', 0, 'Weights'), 'weights_length'),
+    }
+    result = editor.apply([{'op': 'add', 'path': '/Nodes/0/Contrasts/0/Weights/-', 'value': 0}])
+    assert result.added == []
+    assert keys(result.removed) == {(('Nodes', 0, 'Contrasts', 0, 'Weights'), 'weights_length')}
+    assert len(result.errors) == 1
+
+
+def test_editor_not_semantic():
+    document = json.loads(EXAMPLE.read_bytes())
+    editor = ModelEditor(document, semantic=False)
+    result = editor.apply([{'op': 'replace', 'path': '/Nodes/1/Name', 'value': 'run'}])
+    assert result.errors == []
+    assert result.model.Nodes[1].Name == 'run'
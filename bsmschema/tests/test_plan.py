@@ -0,0 +1,155 @@
+import threading
+
+import pytest
+
+from bsmschema.models import BIDSStatsModel
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.plan import output_contrasts, plan_model, run_plan
+
+
+def make_model(edges=None):
+    return BIDSStatsModel.model_validate(
+        {
+            'Name': 'plan',
+            'BIDSModelVersion': '1.0.0',
+            'Input': {'task': ['stroop']},
+            'Nodes': [
+                {
+                    'Level': 'Run',
+                    'Name': 'run',
+                    'GroupBy': ['run', 'subject'],
+                    'Model': {'Type': 'glm', 'X': [1, 'A', 'B']},
+                    'Contrasts': [
+                        {
+                            'Name': 'AvB',
+                            'ConditionList': ['A', 'B'],
+                            'Weights': [1, -1],
+                            'Test': 't',
+                        },
+                        {
+                            'Name': 'any',
+                            'ConditionList': ['A', 'B'],
+                            'Weights': [[1, 0], [0, 1]],
+                            'Test': 'F',
+                        },
+                    ],
+                    'DummyContrasts': {'Contrasts': ['A', 'B'], 'Test': 't'},
+                },
+                {
+                    'Level': 'Subject',
+                    'Name': 'subject',
+                    'GroupBy': ['subject', 'contrast'],
+                    'Model': {'Type': 'meta', 'X': [1]},
+                    'DummyContrasts': {'Test': 't'},
+                },
+                {
+                    'Level': 'Dataset',
+                    'Name': 'dataset',
+                    'GroupBy': ['contrast'],
+                    'Model': {'Type': 'glm', 'X': [1]},
+                    'DummyContrasts': {'Test': 't'},
+                },
+            ],
+            'Edges': edges,
+        }
+    )
+
+
+def make_table(nsub=3, nrun=2):
+    subjects = [f'{i:02d}' for i in range(1, nsub + 1)]
+    return {
+        'subject': np.repeat(subjects, nrun + 1),
+        'run': np.tile(list(range(1, nrun + 1)) + [1], nsub),
+        'task': np.tile(['stroop'] * nrun + ['rest'], nsub),
+    }
+
+
+def test_output_contrasts():
+    model = make_model()
+    assert output_contrasts(model.Nodes[0]) == ['AvB', 'A', 'B']
+    assert output_contrasts(model.Nodes[1]) == ['intercept']
+
+    node = make_node(['trial_type.*'], group_by=['run'], DummyContrasts={'Test': 't'})
+    with pytest.raises(ValueError, match='wildcards'):
+        output_contrasts(node)
+    assert output_contrasts(node, ['trial_type.a', 'trial_type.b', 'rot_x']) == [
+        'trial_type.a',
+        'trial_type.b',
+    ]
+
+
+def test_plan_model():
+    plan = plan_model(make_model(), make_table())
+    assert plan.counts == {'run': 6, 'subject': 9, 'dataset': 3}
+    assert len(plan) == 18
+    assert [len(wave) for wave in plan.waves] == [6, 9, 3]
+
+    run = plan.nodes['run']
+    assert run.inputs.num_rows == 9
+    assert all(run.inputs.columns['task'][plan.fits[i].rows] == 'stroop' for i in run.fits)
+    assert run.outputs.num_rows == 18
+    assert sorted(run.outputs.names) == ['contrast', 'run', 'subject', 'task']
+
+    for i in plan.nodes['subject'].fits:
+        fit = plan.fits[i]
+        assert fit.contrasts == (fit.key['contrast'],)
+        assert len(fit.depends) == 2
+        assert all(plan.fits[dep].key['subject'] == fit.key['subject'] for dep in fit.depends)
+
+    dataset = [plan.fits[i] for i in plan.nodes['dataset'].fits]
+    assert [fit.key for fit in dataset] == [{'contrast': c} for c in ['A', 'AvB', 'B']]
+    assert all(len(fit.depends) == 3 for fit in dataset)
+    assert plan.nodes['dataset'].inputs.names == ['subject', 'task', 'contrast']
+
+
+def test_plan_edge_filter():
+    edges = [
+        {'Source': 'run', 'Destination': 'subject', 'Filter': {'contrast': ['AvB']}},
+        {'Source': 'subject', 'Destination': 'dataset'},
+    ]
+    plan = plan_model(make_model(edges), make_table(nsub=4))
+    assert plan.counts == {'run': 8, 'subject': 4, 'dataset': 1}
+    assert plan.fits[-1].contrasts == ('AvB',)
+
+
+def test_run_plan():
+    plan = plan_model(make_model(), make_table())
+    lock = threading.Lock()
+    finished = set()
+    progress = []
+
+    def fit(item, inputs):
+        with lock:
+            assert set(inputs) == set(item.depends)
+            assert finished.issuperset(item.depends)
+        value = 1 + sum(inputs.values())
+        with lock:
+            finished.add(item.id)
+        return value
+
+    results = run_plan(
+        plan,
+        fit,
+        max_workers=3,
+        max_pending=2,
+        progress=lambda done, total, item: progress.append((done, total)),
+    )
+    # Each dataset fit combines 3 subjects, each combining 2 runs
+    assert results == {i: 10 for i in plan.nodes['dataset'].fits}
+    assert progress[-1] == (18, 18)
+
+
+def test_run_plan_errors():
+    plan = plan_model(make_model(), make_table())
+
+    def fail(item, inputs):
+        raise RuntimeError(item.node)
+
+    with pytest.raises(RuntimeError, match='run'):
+        run_plan(plan, {'run': fail}, max_workers=2)
+    with pytest.raises(ValueError, match='executor'):
+        run_plan(plan, fail, executor='cluster')
@@ -0,0 +1,77 @@
+from bsmschema.models import BIDSStatsModel
+from bsmschema.semantics import check_model
+
+from . import data
+from .helpers import node_fields
+
+
+def make_model(nodes, edges=None):
+    return BIDSStatsModel.model_validate(
+        {'Name': 'semantics', 'BIDSModelVersion': '1.0.0', 'Nodes': nodes, 'Edges': edges}
+    )
+
+
+def test_example_is_valid():
+    example = data.load.readable('examples', 'model-example_smdl.json')
+    model = BIDSStatsModel.model_validate_json(example.read_text())
+    assert check_model(model) == []
+
+
+def test_node_rules():
+    model = make_model(
+        [
+            node_fields(
+                [1, 'A', 'B', 'motion_*'],
+                Contrasts=[
+                    {'Name': 'AvB', 'ConditionList': ['A', 'B'], 'Weights': [1, -1], 'Test': 't'},
+                    {'Name': 'AvB', 'ConditionList': ['A', 'C'], 'Weights': [1], 'Test': 't'},
+                    {
+                        'Name': 'A',
+                        'ConditionList': ['A', 'motion_01'],
+                        'Weights': [[1, 0], [0, 1]],
+                        'Test': 't',
+                    },
+                ],
+                DummyContrasts={'Contrasts': ['A', 'D', 'motion_*'], 'Test': 't'},
+            ),
+            node_fields([1, 'A'], model={'HRF': {'Variables': ['A', 'B'], 'Model': 'spm'}}),
+        ]
+    )
+    errors = {(tuple(err['loc']), err['type']) for err in check_model(model)}
+    assert errors == {
+        (('Nodes', 0, 'DummyContrasts', 'Contrasts', 1), 'unknown_variable'),
+        (('Nodes', 0, 'Contrasts', 1, 'Name'), 'duplicate_contrast'),
+        (('Nodes', 0, 'Contrasts', 1, 'ConditionList', 1), 'unknown_variable'),
+        (('Nodes', 0, 'Contrasts', 1, 'Weights'), 'weights_length'),
+        (('Nodes', 0, 'Contrasts', 2, 'Name'), 'contrast_conflict'),
+        (('Nodes', 0, 'Contrasts', 2, 'Weights'), 'weights_dimension'),
+        (('Nodes', 1, 'Name'), 'duplicate_node'),
+        (('Nodes', 1, 'Model', 'HRF', 'Variables', 1), 'unknown_variable'),
+    }
+
+
+def test_graph_rules():
+    contrasts = [
+        {'Name': 'AvB', 'ConditionList': ['A', 'B'], 'Weights': [1, -1], 'Test': 't'},
+        {'Name': 'all', 'ConditionList': ['A', 'B'], 'Weights': [[1, 0], [0, 1]], 'Test': 'F'},
+    ]
+    model = make_model(
+        [
+            node_fields([1, 'A', 'B'], name='a', Contrasts=contrasts),
+            node_fields([1, 'A', 'B'], name='b'),
+            node_fields([1, 'A', 'B'], name='c'),
+        ],
+        [
+            {'Source': 'a', 'Destination': 'b', 'Filter': {'contrast': ['AvB', 'all']}},
+            {'Source': 'b', 'Destination': 'c'},
+            {'Source': 'c', 'Destination': 'b'},
+            {'Source': 'x', 'Destination': 'c'},
+        ],
+    )
+    errors = [(err['loc'], err['type']) for err in check_model(model)]
+    assert errors == [
+        (['Edges', 0, 'Filter', 'contrast', 1], 'terminal_contrast'),
+        (['Edges', 3, 'Source'], 'unknown_node'),
+        (['Nodes', 1, 'Name'], 'cycle'),
+        (['Nodes', 2, 'Name'], 'cycle'),
+    ]
@@ -0,0 +1,129 @@
+import hashlib
+import io
+
+import pytest
+
+from bsmschema.models import BIDSStatsModel
+from bsmschema.serialize import ModelWriter, dumps, dumps_json, loads, read_models
+
+from . import data
+
+EXAMPLE = data.load.readable('examples', 'model-example_smdl.json')
+
+
+@pytest.fixture
+def model():
+    return BIDSStatsModel.model_validate_json(EXAMPLE.read_bytes())
+
+
+def make_model(**node):
+    return BIDSStatsModel.model_validate(
+        {
+            'Name': 'weights',
+            'BIDSModelVersion': '1.0.0',
+            'Description': None,
+            'Nodes': [
+                {
+                    'Level': 'Run',
+                    'Name': 'run',
+                    'GroupBy': ['run', 'subject'],
+                    'Model': {'Type': 'glm', 'X': [1, 'A', 'B', 'C']},
+                    'Contrasts': [
+                        {
+                            'Name': 'c',
+                            'ConditionList': [1, 'A', 'B'],
+                            'Weights': ['1/3', -0.5, 2],
+                            'Test': 't',
+                        }
+                    ],
+                    **node,
+                }
+            ],
+        }
+    )
+
+
+def test_round_trip(model):
+    assert loads(dumps(model)) == model
+    assert loads(dumps(model)).model_dump_json() == model.model_dump_json()
+
+
+def test_round_trip_exact():
+    model = make_model(
+        Transformations={
+            'Transformer': 'pybids-transforms-v1',
+            'Instructions': [{'Name': 'Scale', 'Input': ['A']}],
+        }
+    )
+    restored = loads(dumps(model))
+    assert restored == model
+    contrast = restored.Nodes[0].Contrasts[0]
+    assert contrast.Weights == ['1/3', -0.5, 2]
+    assert [type(w) for w in contrast.Weights] == [str, float, int]
+    assert type(contrast.ConditionList[0]) is int
+    # Explicit nulls and unset fields are preserved
+    assert restored.model_fields_set == model.model_fields_set
+    assert restored.Nodes[0].model_fields_set == model.Nodes[0].model_fields_set
+
+
+def test_canonical_json(model):
+    shuffled = BIDSStatsModel.model_validate(
+        {key: value for key, value in reversed(model.model_dump(exclude_unset=True).items())}
+    )
+    assert dumps_json(shuffled) == dumps_json(model)
+    assert b'\n' not in dumps_json(model)
+    assert dumps_json(model).startswith(b'{"BIDSModelVersion":"1.0.0","Description":')
+    # Explicit nulls and defaults do not change the bytes of equal models
+    explicit = make_model()
+    implicit = explicit.model_copy()
+    implicit.__pydantic_fields_set__.discard('Description')
+    assert explicit == implicit
+    assert dumps_json(explicit) == dumps_json(implicit)
+    assert b'"Description"' not in dumps_json(explicit)
+    assert b'"Description"' in loads(dumps(explicit)).model_dump_json(exclude_unset=True).encode()
+    assert BIDSStatsModel.model_validate_json(dumps_json(model)) == model
+    digest = hashlib.sha256(dumps_json(model)).hexdigest()
+    assert digest != hashlib.sha256(dumps_json(make_model())).hexdigest()
+
+
+def test_compact(model):
+    assert len(dumps(model)) < len(dumps_json(model)) < len(model.model_dump_json(indent=2))
+
+
+def test_stream(model):
+    models = [model, make_model(), model.model_copy(update={'Name': 'other'})]
+    stream = io.BytesIO()
+    writer = ModelWriter(stream)
+    header = stream.tell()
+    assert writer.write_all(models) == 3
+    # Records after the first do not repeat the header
+    assert stream.tell() - header < 3 * (len(dumps(model)) - header) + 100
+    stream.seek(0)
+    assert list(read_models(stream)) == models
+
+    empty = io.BytesIO()
+    ModelWriter(empty)
+    empty.seek(0)
+    assert list(read_models(empty)) == []
+
+
+def test_corrupt(model):
+    data = dumps(model)
+    with pytest.raises(ValueError, match='Not a bsmschema'):
+        loads(b'{}' + data)
+    with pytest.raises(ValueError):
+        loads(data[:-5])
+    with pytest.raises(ValueError):
+        loads(data[:-5] + bytes(5))
+    with pytest.raises(ValueError, match='version'):
+        loads(data[:4] + b'\x09' + data[5:])
+    stream = io.BytesIO()
+    ModelWriter(stream).write_all([model, model])
+    with pytest.raises(ValueError, match='Expected one model'):
+        loads(stream.getvalue())
+
+    # Truncated and endless length prefixes
+    with pytest.raises(ValueError, match='Unexpected end'):
+        loads(data + b'\x80')
+    with pytest.raises(ValueError, match='too long'):
+        loads(data + b'\xff' * 20)
@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+import json
+import socket
+import threading
+
+import pytest
+
+from bsmschema.__main__ import main
+from bsmschema.client import request
+from bsmschema.server import ValidationServer, validate_request
+
+from . import data
+
+EXAMPLE = data.load.readable('examples', 'model-example_smdl.json')
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = tmp_path / 'bsm.sock'
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    tasks = []
+
+    async def serve():
+        started = asyncio.Event()
+        tasks.append(
+            asyncio.ensure_future(
+                ValidationServer(workers=2, executor='thread').serve(path, ready=started)
+            )
+        )
+        await started.wait()
+        ready.set()
+        with contextlib.suppress(asyncio.CancelledError):
+            await tasks[0]
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),))
+    thread.start()
+    assert ready.wait(30)
+    yield path
+    loop.call_soon_threadsafe(tasks[0].cancel)
+    thread.join()
+    loop.close()
+    assert not path.exists()
+
+
+def test_validate_request():
+    result = validate_request({'id': 3, 'path': str(EXAMPLE)})
+    assert result['ok'] and result['id'] == 3
+
+    document = json.loads(EXAMPLE.read_text())
+    document['Nodes'][0]['Contrasts'][0]['ConditionList'].append('missing')
+    result = validate_request({'document': document, 'semantic': True})
+    assert [err['type'] for err in result['errors']] == ['unknown_variable', 'weights_length']
+    assert validate_request({'document': document})['ok']
+
+    assert validate_request({'text': '{'})['errors'][0]['type'] == 'json_invalid'
+    assert validate_request([])['errors'][0]['type'] == 'bad_request'
+    assert validate_request({'path': '/nonexistent'})['errors'][0]['type'] == 'os_error'
+
+
+def test_server(server):
+    results = request(
+        [{'path': str(EXAMPLE), 'id': i} for i in range(5)] + [{'text': '{}'}],
+        socket_path=server,
+        timeout=10,
+    )
+    assert [res['ok'] for res in results] == [True] * 5 + [False]
+    assert [res.get('id') for res in results] == [0, 1, 2, 3, 4, None]
+
+    # Pipelined lines are answered in order
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(str(server))
+        sock.sendall(b'{"text": "{"}\nnot json\n{"path": "%s"}\n' % str(EXAMPLE).encode())
+        sock.shutdown(socket.SHUT_WR)
+        lines = sock.makefile('rb').read().splitlines()
+    answers = [json.loads(line) for line in lines]
+    assert [ans['ok'] for ans in answers] == [False, False, True]
+    assert answers[1]['errors'][0]['type'] == 'json_invalid'
+
+
+def start(path, **kwargs):
+    """Serve on a socket in the running loop, returning the task once it is ready."""
+
+    async def started():
+        ready = asyncio.Event()
+        task = asyncio.ensure_future(
+            ValidationServer(workers=1, executor='thread').serve(path, ready=ready, **kwargs)
+        )
+        waiter = asyncio.ensure_future(ready.wait())
+        await asyncio.wait([task, waiter], return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            waiter.cancel()
+            task.result()
+        return task
+
+    return started()
+
+
+async def stop(task):
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def test_socket_path(server, tmp_path):
+    # A regular file is not replaced
+    path = tmp_path / 'file.sock'
+    path.write_text('data')
+    with pytest.raises(FileExistsError, match='not a socket'):
+        asyncio.run(start(path))
+    assert path.read_text() == 'data'
+
+    # Nor is the socket of a running server
+    with pytest.raises(FileExistsError, match='already listening'):
+        asyncio.run(start(server))
+    assert request([{'text': '{}'}], socket_path=server, timeout=10)
+
+    # The socket of a server that stopped is replaced
+    stale = tmp_path / 'stale.sock'
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.bind(str(stale))
+
+    async def replace_stale():
+        task = await start(stale)
+        try:
+            answers = await asyncio.to_thread(request, [{'text': '{}'}], socket_path=stale)
+            assert len(answers) == 1
+            # A socket replaced while serving is left in place
+            stale.unlink()
+            stale.write_text('other')
+        finally:
+            await stop(task)
+
+    asyncio.run(replace_stale())
+    assert stale.read_text() == 'other'
+
+
+def test_client_cli(server, tmp_path, capsys):
+    bad = tmp_path / 'model-bad_smdl.json'
+    bad.write_text('{"Name": "bad", "Nodes": []}')
+    assert main(['client', '--socket', str(server), str(EXAMPLE)]) == 0
+    assert main(['client', '--socket', str(server), '-q', str(EXAMPLE), str(tmp_path)]) == 1
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[-1]['path'] == str(bad)
+    assert len(records) == 2
+
+    assert main(['client', '--socket', str(server), str(EXAMPLE), str(tmp_path / 'typo')]) == 1
+    assert f'No files match: {tmp_path / "typo"}' in capsys.readouterr().err
+
+    assert main(['client', '--socket', str(tmp_path / 'missing.sock'), str(EXAMPLE)]) == 2
+    assert main(['serve', '--socket', str(server)]) == 2
+    assert 'already listening' in capsys.readouterr().err
@@ -0,0 +1,137 @@
+import tracemalloc
+
+import pytest
+
+from .helpers import make_node
+
+np = pytest.importorskip('numpy')
+
+from bsmschema.design import DesignMatrix
+from bsmschema.temporal import filter_basis, node_filter_basis
+
+
+def dct(n_scans):
+    """The full orthonormal DCT-II basis, as columns."""
+    scans = np.arange(n_scans)[:, None] + 0.5
+    basis = np.sqrt(2 / n_scans) * np.cos(np.pi / n_scans * scans * np.arange(n_scans))
+    basis[:, 0] = 1 / np.sqrt(n_scans)
+    return basis
+
+
+def reference(data, n_scans, tr, high_pass=None, low_pass=None):
+    frequencies = np.arange(n_scans) / (2 * n_scans * tr)
+    removed = np.zeros(n_scans, dtype=bool)
+    if high_pass:
+        removed |= (frequencies > 0) & (frequencies < high_pass)
+    if low_pass:
+        removed |= frequencies > low_pass
+    basis = dct(n_scans)[:, removed]
+    return data - basis @ (basis.T @ data)
+
+
+def test_dct():
+    basis = dct(50)
+    assert basis.T @ basis == pytest.approx(np.eye(50), abs=1e-12)
+
+
+@pytest.mark.parametrize(
+    ('high_pass', 'low_pass'), [(1 / 128, None), (None, 0.1), (0.01, 0.15), (None, None)]
+)
+def test_apply(high_pass, low_pass):
+    data = np.random.default_rng(0).standard_normal((160, 37))
+    basis = filter_basis(160, 1.5, high_pass, low_pass)
+    expected = reference(data, 160, 1.5, high_pass, low_pass)
+    assert basis.apply(data) == pytest.approx(expected, abs=1e-10)
+    assert basis.apply(data, chunk_size=5) == pytest.approx(expected, abs=1e-10)
+    # Filtering is idempotent
+    assert basis.apply(expected) == pytest.approx(expected, abs=1e-10)
+
+
+def test_basis():
+    basis = filter_basis(200, 2.0, high_pass=1 / 128)
+    assert basis is filter_basis(200, 2, high_pass=1 / 128)
+    assert basis is not filter_basis(200, 2.0, high_pass=1 / 100)
+    assert basis.removed.tolist() == [1, 2, 3, 4, 5, 6]
+    assert basis.subtract
+    assert basis.regressor_names == [f'cosine0{k}' for k in range(6)]
+    assert not basis.regressors.flags.writeable
+    assert basis.regressors == pytest.approx(dct(200)[:, 1:7])
+
+    # Low-pass filters remove most components, so the kept ones are projected onto
+    band = filter_basis(200, 2.0, high_pass=1 / 128, low_pass=0.05)
+    assert not band.subtract
+    assert band.components.shape == (200, 41 - 6)
+    assert band.regressors == pytest.approx(basis.regressors)
+    assert filter_basis(200, 2.0, low_pass=0.05).regressors.shape == (200, 0)
+
+
+def test_apply_out(tmp_path):
+    basis = filter_basis(100, 2.0, high_pass=0.01)
+    data = np.random.default_rng(1).standard_normal((100, 4, 5))
+    expected = reference(data.reshape(100, -1), 100, 2.0, 0.01).reshape(100, 4, 5)
+    assert basis.apply(data) == pytest.approx(expected)
+
+    mapped = np.lib.format.open_memmap(tmp_path / 'out.npy', 'w+', shape=data.shape)
+    assert basis.apply(data, out=mapped) is mapped
+    assert np.load(tmp_path / 'out.npy') == pytest.approx(expected)
+
+    # Non-contiguous outputs
+    out = np.empty((100, 5, 4)).transpose(0, 2, 1)
+    basis.apply(data, chunk_size=3, out=out)
+    assert out == pytest.approx(expected)
+
+    assert basis.apply(data, out=data) is data
+    assert data == pytest.approx(expected)
+
+
+def test_fortran_order(tmp_path):
+    basis = filter_basis(100, 2.0, high_pass=0.01)
+    data = np.random.default_rng(1).standard_normal((100, 20, 30, 10))
+    expected = reference(data.reshape(100, -1), 100, 2.0, 0.01).reshape(data.shape)
+    np.save(tmp_path / 'data.npy', np.asfortranarray(data))
+    mapped = np.load(tmp_path / 'data.npy', mmap_mode='r')
+    out = np.lib.format.open_memmap(
+        tmp_path / 'out.npy', 'w+', shape=data.shape, fortran_order=True
+    )
+    tracemalloc.start()
+    try:
+        assert basis.apply(mapped, chunk_size=100, out=out) is out
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Only chunks of the data are read into memory
+    assert peak < data.nbytes / 2
+    assert np.load(tmp_path / 'out.npy') == pytest.approx(expected)
+    assert basis.apply(mapped).flags.f_contiguous
+    assert basis.apply(mapped) == pytest.approx(expected)
+
+
+def test_filter_design():
+    basis = filter_basis(120, 2.0, high_pass=1 / 128)
+    matrix = np.random.default_rng(2).standard_normal((120, 3))
+    design = basis.filter_design(DesignMatrix((1, 'A', 'B'), matrix))
+    assert design.columns == (1, 'A', 'B')
+    assert design.matrix == pytest.approx(reference(matrix, 120, 2.0, 1 / 128))
+    assert not design.matrix.flags.writeable
+    again = basis.filter_design(DesignMatrix((1, 'A', 'B'), matrix.copy()))
+    assert again.matrix is design.matrix
+
+
+def test_node_filter_basis():
+    assert node_filter_basis(make_node(), 100, 2.0) is None
+    masked = make_node(model={'Options': {'Mask': {'suffix': ['mask']}}})
+    assert node_filter_basis(masked, 100, 2.0) is None
+    options = {'HighPassFilterCutoffHz': 0.008, 'LowPassFilterCutoffHz': 0.1}
+    node = make_node(model={'Options': options})
+    assert node_filter_basis(node, 100, 2.0) is filter_basis(100, 2.0, 0.008, 0.1)
+
+
+def test_errors():
+    for args in [(0, 2.0), (100, 0.0), (100, 2.0, -1.0), (100, 2.0, None, 0.0)]:
+        with pytest.raises(ValueError):
+            filter_basis(*args)
+    basis = filter_basis(100, 2.0, high_pass=0.01)
+    with pytest.raises(ValueError, match='scans'):
+        basis.apply(np.zeros((99, 2)))
+    with pytest.raises(ValueError, match='does not match'):
+        basis.apply(np.zeros((100, 2)), out=np.zeros((100, 3)))
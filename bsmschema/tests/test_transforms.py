@@ -0,0 +1,295 @@
+import pytest
+
+from bsmschema.lazy import validate_json
+from bsmschema.transforms import (
+    Convolve,
+    Factor,
+    Scale,
+    compile_transformations,
+    parse_instructions,
+)
+
+from .helpers import make_node
+
+
+def transform_node(instructions, X):
+    transformations = {'Transformer': 'pybids-transforms-v1', 'Instructions': instructions}
+    return make_node(X, Transformations=transformations)
+
+
+def plan(compiled):
+    return [(step.instruction.Name, step.indices) for step in compiled.steps]
+
+
+def error_locs(compiled):
+    return [error['loc'] for error in compiled.errors]
+
+
+def test_parse_instructions():
+    instructions = parse_instructions(
+        [
+            {'Name': 'Factor', 'Input': 'trial_type'},
+            {'Name': 'Convolve', 'Input': ['trial_type.A'], 'Model': 'glover'},
+            {'Name': 'Scale', 'Input': ['rt'], 'Rescale': False},
+        ]
+    )
+    assert [type(instruction) for instruction in instructions] == [Factor, Convolve, Scale]
+    assert instructions[0].Input == ['trial_type']
+    assert instructions[0].Sep == '.'
+    assert instructions[1].parameters()['Model'] == 'glover'
+    assert instructions[2].Demean and not instructions[2].Rescale
+
+
+def test_parse_raw_instructions():
+    model = validate_json(b"""{
+        "Name": "lazy", "BIDSModelVersion": "1.0.0",
+        "Nodes": [{
+            "Level": "Run", "Name": "run", "GroupBy": ["run", "subject"],
+            "Transformations": {"Transformer": "pybids-transforms-v1",
+                                "Instructions": [{"Name": "Factor", "Input": ["trial_type"]}]},
+            "Model": {"Type": "glm", "X": ["trial_type.*"]}
+        }]
+    }""")
+    raw = model.Nodes[0].Transformations.Instructions
+    instructions = parse_instructions(raw)
+    assert not raw.decoded
+    assert isinstance(instructions[0], Factor)
+    assert parse_instructions(raw.value) == instructions
+
+
+@pytest.mark.parametrize(
+    'instruction',
+    [
+        {'Name': 'Unknown', 'Input': ['a']},
+        {'Name': 'Scale', 'Input': ['a', 'b'], 'Output': ['c']},
+        {'Name': 'Scale', 'Input': ['a*'], 'Output': ['c']},
+        {'Name': 'Sum', 'Input': ['a', 'b']},
+        {'Name': 'Sum', 'Input': ['a', 'b'], 'Output': ['c', 'd']},
+        {'Name': 'Copy', 'Input': ['a']},
+    ],
+)
+def test_invalid_instructions(instruction):
+    with pytest.raises(ValueError):
+        parse_instructions([instruction])
+
+
+def test_prune_unused():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Copy', 'Input': ['a'], 'Output': ['b']},
+                {'Name': 'Scale', 'Input': ['b']},
+                {'Name': 'Sum', 'Input': ['a', 'c'], 'Output': ['s']},
+                {'Name': 'Delete', 'Input': ['c']},
+                {'Name': 'Threshold', 'Input': ['s'], 'Output': ['t']},
+            ],
+            X=[1, 't'],
+        ),
+        ['a', 'c', 'd'],
+    )
+    assert compiled.errors == []
+    assert compiled.dependencies == [(), (0,), (), (), (2,)]
+    assert compiled.pruned == [0, 1, 3]
+    assert plan(compiled) == [('Sum', (2,)), ('Threshold', (4,))]
+    assert compiled.steps[1].depends == (0,)
+    assert compiled.inputs == ['a', 'c']
+    assert compiled.outputs == ['t']
+
+
+def test_undefined_variables():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Rename', 'Input': ['a'], 'Output': ['b']},
+                {'Name': 'Scale', 'Input': ['a']},
+                {'Name': 'Delete', 'Input': ['c']},
+                {'Name': 'Orthogonalize', 'Input': ['b'], 'Other': ['c', 'e']},
+                {'Name': 'Convolve', 'Input': ['x_*']},
+            ],
+            X=[1, 'b', 'missing', 'none_*'],
+        ),
+        ['a', 'c', 'e'],
+    )
+    assert error_locs(compiled) == [
+        ['Transformations', 'Instructions', 1, 'Input', 0],
+        ['Transformations', 'Instructions', 3, 'Other', 0],
+        ['Transformations', 'Instructions', 4, 'Input', 0],
+        ['Model', 'X', 2],
+    ]
+    assert compiled.pruned == [1, 2, 4]
+    assert plan(compiled) == [('Rename', (0,)), ('Orthogonalize', (3,))]
+    assert compiled.inputs == ['a', 'e']
+
+
+def test_families():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Factor', 'Input': ['trial_type']},
+                {'Name': 'Split', 'Input': ['rt'], 'By': ['trial_type']},
+                {'Name': 'Delete', 'Input': ['trial_type.C']},
+                {'Name': 'Convolve', 'Input': ['trial_type.A', 'trial_type.C', 'rt.*']},
+            ],
+            X=[1, 'trial_type.*', 'rt.A'],
+        ),
+        ['trial_type', 'rt'],
+    )
+    assert error_locs(compiled) == [['Transformations', 'Instructions', 3, 'Input', 1]]
+    assert compiled.dependencies[3] == (0, 1)
+    # Deleting trial_type.C narrows trial_type.* in X
+    assert compiled.pruned == []
+    assert compiled.steps[3].depends == (0, 1, 2)
+    assert compiled.outputs == ['trial_type.*', 'rt.*']
+    assert compiled.inputs == ['trial_type', 'rt']
+
+
+def test_removals():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Factor', 'Input': ['trial_type']},
+                {'Name': 'Delete', 'Input': ['trial_type.C']},
+                {'Name': 'Delete', 'Input': ['rt']},
+                {'Name': 'Select', 'Input': ['trial_type.*', 'confound_1']},
+                {'Name': 'Rename', 'Input': ['confound_1'], 'Output': ['nuisance']},
+            ],
+            X=[1, 'trial_type.*', 'confound_*'],
+        ),
+        ['trial_type', 'rt', 'confound_1', 'confound_2'],
+    )
+    assert compiled.errors == []
+    # Removals matched by wildcards of X are kept, and others pruned
+    assert compiled.pruned == [2]
+    assert plan(compiled) == [
+        ('Factor', (0,)),
+        ('Delete', (1,)),
+        ('Select', (3,)),
+        ('Rename', (4,)),
+    ]
+    assert [step.depends for step in compiled.steps] == [(), (0,), (0, 1), (2,)]
+    assert compiled.outputs == ['trial_type.*']
+
+
+def test_removals_before_reads():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Delete', 'Input': ['motion_2']},
+                {'Name': 'Sum', 'Input': ['motion_*'], 'Output': ['motion']},
+                {'Name': 'Delete', 'Input': ['motion_1']},
+            ],
+            X=['motion'],
+        ),
+        ['motion_1', 'motion_2'],
+    )
+    assert compiled.pruned == [2]
+    assert plan(compiled) == [('Delete', (0,)), ('Sum', (1,))]
+
+
+def test_unsupported_transformer():
+    node = transform_node([{'Name': 'Factor', 'Input': ['trial_type']}], X=['trial_type.*'])
+    node.Transformations = node.Transformations.model_construct(
+        Transformer='other', Instructions=[]
+    )
+    with pytest.raises(ValueError, match='Unsupported transformer'):
+        compile_transformations(node, ['trial_type'])
+
+
+def test_convolve_outputs():
+    compiled = compile_transformations(
+        transform_node(
+            [{'Name': 'Convolve', 'Input': ['A'], 'Derivative': True}],
+            X=[1, 'A', 'A_derivative'],
+        ),
+        ['A'],
+    )
+    assert compiled.errors == []
+    assert compiled.outputs == ['A', 'A_derivative']
+
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Convolve', 'Input': ['A'], 'Model': 'fir', 'FIRDelays': [0, 1]},
+                {'Name': 'Convolve', 'Input': ['B'], 'Output': ['hrf_B'], 'Dispersion': True},
+            ],
+            X=[1, 'A_delay_0', 'hrf_B_dispersion'],
+        ),
+        ['A', 'B'],
+    )
+    assert compiled.errors == []
+    assert compiled.pruned == []
+    assert compiled.outputs == ['A_delay_0', 'hrf_B_dispersion']
+
+
+def test_fusion():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Scale', 'Input': ['a']},
+                {'Name': 'Copy', 'Input': ['a'], 'Output': ['a2']},
+                {'Name': 'Scale', 'Input': ['b']},
+                {'Name': 'Sum', 'Input': ['a', 'c'], 'Output': ['s']},
+                {'Name': 'Scale', 'Input': ['c']},
+                {'Name': 'Scale', 'Input': ['d'], 'Rescale': False},
+                {'Name': 'Scale', 'Input': ['e']},
+            ],
+            X=['a2', 'b', 's', 'c', 'd', 'e'],
+        ),
+        ['a', 'b', 'c', 'd', 'e'],
+    )
+    # Scale of c cannot move before the Sum that reads c
+    assert plan(compiled) == [
+        ('Scale', (0, 2)),
+        ('Copy', (1,)),
+        ('Sum', (3,)),
+        ('Scale', (4, 6)),
+        ('Scale', (5,)),
+    ]
+    assert compiled.steps[0].instruction.Input == ['a', 'b']
+    assert [step.depends for step in compiled.steps] == [(), (0,), (0,), (2,), ()]
+
+
+def test_fusion_with_outputs():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Threshold', 'Input': ['a'], 'Output': ['ta']},
+                {'Name': 'Threshold', 'Input': ['b']},
+                {'Name': 'Threshold', 'Input': ['c'], 'Output': ['tc']},
+                {'Name': 'Threshold', 'Input': ['ta'], 'Output': ['tta']},
+            ],
+            X=['ta', 'b', 'tc', 'tta'],
+        ),
+        ['a', 'b', 'c'],
+    )
+    assert plan(compiled) == [
+        ('Threshold', (0, 2)),
+        ('Threshold', (1,)),
+        ('Threshold', (3,)),
+    ]
+    assert compiled.steps[0].instruction.Output == ['ta', 'tc']
+
+
+def test_select_and_assign():
+    compiled = compile_transformations(
+        transform_node(
+            [
+                {'Name': 'Assign', 'Input': ['rt'], 'Target': ['trial'], 'Output': ['weighted']},
+                {'Name': 'Select', 'Input': ['trial', 'weighted']},
+                {'Name': 'Scale', 'Input': ['rt']},
+            ],
+            X=['weighted', 'trial'],
+        ),
+        ['rt', 'trial'],
+    )
+    assert error_locs(compiled) == [['Transformations', 'Instructions', 2, 'Input', 0]]
+    assert compiled.pruned == [1, 2]
+    assert plan(compiled) == [('Assign', (0,))]
+
+
+def test_no_transformations():
+    node = make_node([1, 'a', 'motion_*'])
+    compiled = compile_transformations(node, ['motion_2', 'a', 'motion_1', 'b'])
+    assert compiled.steps == []
+    assert compiled.inputs == ['motion_2', 'a', 'motion_1']
+    assert compiled.outputs == ['a', 'motion_2', 'motion_1']
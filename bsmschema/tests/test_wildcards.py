@@ -0,0 +1,87 @@
+import pytest
+
+from bsmschema.models import Node
+from bsmschema.wildcards import expand, expand_node, is_pattern, namespace
+
+COLUMNS = [
+    'trial_type.congruent',
+    'trial_type.incongruent',
+    'rot_x',
+    'rot_y',
+    'trans_x',
+    'trans_x_derivative1',
+    'aroma_motion_10',
+    'aroma_motion_02',
+    'rot-z',
+]
+
+
+def test_is_pattern():
+    assert is_pattern('aroma_*')
+    assert is_pattern('rot_?')
+    assert not is_pattern('rot_x')
+    assert not is_pattern(1)
+
+
+@pytest.mark.parametrize(
+    ('variables', 'expected'),
+    [
+        (['rot_*'], ['rot_x', 'rot_y']),
+        (['rot*'], ['rot_x', 'rot_y']),
+        (['trans_?'], ['trans_x']),
+        (['trans_x*'], ['trans_x', 'trans_x_derivative1']),
+        (['aroma_motion_??', 1], ['aroma_motion_10', 'aroma_motion_02', 1]),
+        (['rot_y', 'rot_*', 'rot_y'], ['rot_y', 'rot_x']),
+        (['*'], [c for c in COLUMNS if c.isidentifier()]),
+        (['nothing_*'], []),
+        (['trial_type.*'], ['trial_type.congruent', 'trial_type.incongruent']),
+    ],
+)
+def test_expand(variables, expected):
+    assert expand(variables, COLUMNS) == expected
+
+
+def test_expand_missing():
+    with pytest.raises(ValueError, match='rot_w'):
+        expand(['rot_w'], COLUMNS)
+
+
+def test_namespace_cache():
+    space = namespace(tuple(COLUMNS))
+    assert namespace(tuple(COLUMNS)) is space
+    assert space.match('rot_?') == [2, 3]
+    assert space.match('rot_?') is space.match('rot_?')
+
+
+def test_expand_node():
+    node = Node.model_validate(
+        {
+            'Level': 'Run',
+            'Name': 'run',
+            'GroupBy': ['run', 'subject'],
+            'Model': {
+                'Type': 'glm',
+                'X': [1, 'trial_type.*', 'rot_?'],
+                'HRF': {'Variables': ['trial_type.*'], 'Model': 'spm'},
+            },
+            'Contrasts': [
+                {
+                    'Name': 'IvC',
+                    'ConditionList': ['trial_type.incongruent', 'trial_type.congruent'],
+                    'Weights': [1, -1],
+                    'Test': 't',
+                }
+            ],
+            'DummyContrasts': {'Contrasts': ['trial_type.*'], 'Test': 't'},
+        }
+    )
+    expanded = expand_node(node, COLUMNS)
+    trials = ['trial_type.congruent', 'trial_type.incongruent']
+    assert expanded.columns == [1, *trials, 'rot_x', 'rot_y']
+    assert expanded.hrf_variables == trials
+    assert expanded.condition_lists == {'IvC': trials[::-1]}
+    assert expanded.dummy_contrasts == trials
+
+    node.Model.X = [1, 'rot_?']
+    with pytest.raises(ValueError, match='trial_type.incongruent'):
+        expand_node(node, COLUMNS)